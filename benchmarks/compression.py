@@ -0,0 +1,36 @@
+# Size and time of compressing a `getMessages` response page, per encoding
+# Call it with `python -m benchmarks.compression`
+import time
+from src.api import compression
+from src.api.graphql.base import encoders
+from benchmarks import encoding
+
+RUNS = 200
+
+
+def main() -> None:
+    body = encoders.OrjsonEncoder().dumps_bytes(encoding.get_page())
+    print(f"identity: {len(body)} bytes")
+
+    for name, compress in compression.compressors.items():
+        started_at = time.perf_counter()
+
+        for _ in range(RUNS):
+            compressed_body = compress(body)
+
+        elapsed = (time.perf_counter() - started_at) / RUNS * 1_000_000
+        print(f"{name}: {len(compressed_body)} bytes, {elapsed:.0f} µs to compress")
+
+    bodies = compression.CompressedBodies(max_size=1)
+    bodies.compress("gzip", body)
+    started_at = time.perf_counter()
+
+    for _ in range(RUNS):
+        bodies.compress("gzip", body)
+
+    elapsed = (time.perf_counter() - started_at) / RUNS * 1_000_000
+    print(f"gzip, precompressed: {elapsed:.0f} µs to reuse")
+
+
+if __name__ == "__main__":
+    main()
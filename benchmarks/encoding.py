@@ -0,0 +1,92 @@
+# Encoding time of a `getMessages` response page per JSON encoder, and size and
+# encoding time of a subscription frame per wire format
+# Call it with `python -m benchmarks.encoding`
+import json
+import statistics
+import time
+import typing as t
+from datetime import datetime
+from beanie import PydanticObjectId
+from src.api.graphql.base import encoders
+
+PAGE_SIZE = 100
+RUNS = 2_000
+
+
+def get_page() -> dict[str, t.Any]:
+    now = datetime.now().isoformat()
+    sender = {
+        "id": str(PydanticObjectId()),
+        "email": "jon@doe.com",
+        "createdAt": now,
+        "updatedAt": now,
+    }
+    channel = {
+        "id": str(PydanticObjectId()),
+        "createdAt": now,
+        "updatedAt": now,
+        "memberCount": 2,
+    }
+    messages = [
+        {
+            "id": str(PydanticObjectId()),
+            "createdAt": now,
+            "updatedAt": now,
+            "channel": channel,
+            "sender": sender,
+            "content": f"Message {index}, with some text and ünicode",
+            "sequence": index,
+        }
+        for index in range(PAGE_SIZE)
+    ]
+    return {"data": {"getMessages": {"data": messages, "errors": []}}}
+
+
+def measure(encoder: encoders.JsonEncoder, page: dict[str, t.Any]) -> None:
+    timings = []
+
+    for _ in range(RUNS):
+        started_at = time.perf_counter()
+        encoder.dumps_bytes(page)
+        timings.append(time.perf_counter() - started_at)
+
+    mean = statistics.mean(timings) * 1_000_000
+    p99 = statistics.quantiles(timings, n=100)[98] * 1_000_000
+    print(f"{encoder.name}: {mean:.0f} µs mean, {p99:.0f} µs p99 per page")
+
+
+def measure_frame(
+    name: str,
+    frame: dict[str, t.Any],
+    dumps: t.Callable[[t.Any], t.Union[str, bytes]],
+    loads: t.Callable[[t.Any], t.Any],
+) -> None:
+    # A `newMessage` event as sent to, and decoded by, subscribers
+    started_at = time.perf_counter()
+
+    for _ in range(RUNS):
+        loads(dumps(frame))
+
+    elapsed = (time.perf_counter() - started_at) / RUNS * 1_000_000
+    size = len(dumps(frame))
+    print(f"{name} frame: {size} bytes, {elapsed:.1f} µs to encode and decode")
+
+
+def main() -> None:
+    page = get_page()
+
+    for encoder in [encoders.JsonEncoder(), encoders.OrjsonEncoder()]:
+        measure(encoder, page)
+
+    message = page["data"]["getMessages"]["data"][0]
+    frame = {"id": "1", "type": "next", "payload": {"data": {"newMessage": message}}}
+    json_encoder = encoders.OrjsonEncoder()
+    measure_frame("JSON", frame, json_encoder.dumps, json.loads)
+    msgpack_encoder = encoders.MsgpackEncoder()
+    measure_frame(
+        "MessagePack", frame, msgpack_encoder.dumps_bytes, msgpack_encoder.loads
+    )
+
+
+if __name__ == "__main__":
+    main()
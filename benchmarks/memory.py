@@ -0,0 +1,53 @@
+# Memory of GraphQL response objects, per message and per page of messages
+# Call it with `python -m benchmarks.memory`, it only needs the database to start Beanie
+import asyncio
+import tracemalloc
+from beanie import PydanticObjectId
+from src import db
+from src.api.graphql.messages import schemas as message_schemas
+from src.db.models import user as user_models
+from src.db.models import message as message_models
+from benchmarks import parsing
+
+ROWS = 10_000
+PAGE_SIZE = 100
+
+
+def get_messages(count: int) -> list[message_models.Message]:
+    sender = user_models.User.from_db(parsing.get_user_data(0))
+    channel = message_models.Channel.from_users([sender])
+    channel.id = PydanticObjectId()
+    messages = []
+
+    for index in range(count):
+        message = message_models.Message.from_db(parsing.get_message_data(index))
+        message.channel = channel
+        messages.append(message)
+
+    return messages
+
+
+def measure(
+    messages: list[message_models.Message],
+) -> tuple[list[message_schemas.Message], int, int]:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    page = [message_schemas.Message(message) for message in messages]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    size = sum(stat.size_diff for stat in stats)
+    allocations = sum(stat.count_diff for stat in stats)
+    return page, size, allocations
+
+
+async def main() -> None:
+    await db.init_db("chatql-benchmarks")
+    page, size, _ = measure(get_messages(ROWS))
+    print(f"Message: {size / len(page):.0f} bytes/object")
+    page, size, allocations = measure(get_messages(PAGE_SIZE))
+    print(f"Page of {PAGE_SIZE}: {size} bytes, {allocations} allocations")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+# Per-row CPU of reading listed documents, validated vs. constructed as stored
+# Call it with `python -m benchmarks.parsing`, it only needs the database to start Beanie
+import asyncio
+import time
+import typing as t
+from beanie import PydanticObjectId
+from beanie.odm.utils.parsing import parse_obj
+from bson import DBRef
+from src import db, utils
+from src.db.models import user as user_models
+from src.db.models import message as message_models
+
+ROWS = 10_000
+
+
+def get_user_data(index: int) -> dict[str, t.Any]:
+    now = utils.now()
+    return {
+        "_id": PydanticObjectId(),
+        "email": f"user{index}@example.com",
+        "channel_ids": [PydanticObjectId() for _ in range(5)],
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def get_message_data(index: int) -> dict[str, t.Any]:
+    now = utils.now()
+    sender = get_user_data(index)
+    return {
+        "_id": PydanticObjectId(),
+        "sender": DBRef("users", sender["_id"]),
+        "sender_snapshot": {
+            "id": sender["_id"],
+            "email": sender["email"],
+            "created_at": now,
+            "updated_at": now,
+        },
+        "channel": DBRef("channels", PydanticObjectId()),
+        "content": f"Message {index}",
+        "sequence": index,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def measure(label: str, parse: t.Callable[[t.Any], t.Any], rows: list[t.Any]) -> None:
+    started_at = time.process_time()
+
+    for row in rows:
+        parse(row)
+
+    elapsed = time.process_time() - started_at
+    print(f"{label}: {elapsed / len(rows) * 1_000_000:.2f} µs/row")
+
+
+async def main() -> None:
+    await db.init_db("chatql-benchmarks")
+    users = [get_user_data(index) for index in range(ROWS)]
+    messages = [get_message_data(index) for index in range(ROWS)]
+    measure("User, validated", lambda row: parse_obj(user_models.User, row), users)
+    measure("User, from_db", user_models.User.from_db, users)
+    measure(
+        "Message, validated",
+        lambda row: parse_obj(message_models.Message, row),
+        messages,
+    )
+    measure("Message, from_db", message_models.Message.from_db, messages)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
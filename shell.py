@@ -2,3 +2,8 @@
 # Call it with `ipython -i shell.py`
 # Then call `await start_app()`
 from src.app import start_app  # noqa
+from src.db.migrations import (  # noqa
+    backfill_channel_members,
+    backfill_user_channel_ids,
+    backfill_sender_snapshots,
+)
@@ -1,6 +1,9 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from src import config
+from fastapi.responses import PlainTextResponse
+from src import config, metrics
+from src.api import admin
+from src.api.compression import CompressionMiddleware
 from src.api.graphql import graphql
 
 
@@ -18,6 +21,23 @@ def _setup_cors(app: FastAPI) -> None:
     )
 
 
+def _setup_compression(app: FastAPI) -> None:
+    app.add_middleware(CompressionMiddleware, minimum_size=config.COMPRESSION_MIN_SIZE)
+
+
+def _setup_metrics(app: FastAPI) -> None:
+    # Added ahead of the mounted modules, which serve every other path
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics() -> PlainTextResponse:
+        await metrics.registry.collect()
+        return PlainTextResponse(
+            metrics.registry.render(), media_type="text/plain; version=0.0.4"
+        )
+
+
 def init_app(app: FastAPI) -> None:
     _setup_cors(app)
+    _setup_compression(app)
+    _setup_metrics(app)
+    app.include_router(admin.router)
     _add_module(app, graphql, "")
@@ -0,0 +1,22 @@
+import hmac
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from src import config
+from src.db import slow_queries
+
+
+def check_admin_token(authorization: str = Header("")) -> None:
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+
+    if not hmac.compare_digest(authorization, f"Bearer {config.ADMIN_TOKEN}"):
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED)
+
+
+router = APIRouter(
+    prefix="/admin", dependencies=[Depends(check_admin_token)], include_in_schema=False
+)
+
+
+@router.get("/query-shapes")
+async def get_query_shapes(limit: int = 10) -> list[dict[str, object]]:
+    return slow_queries.query_shapes.top(max(limit, 1))
@@ -0,0 +1,205 @@
+import gzip
+import hashlib
+import typing as t
+from collections import OrderedDict
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from src import config, metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/graphql", "text/")
+
+compressed_body_hits = metrics.registry.register(
+    metrics.Counter(
+        "chatql_compressed_bodies_hits_total", "Responses sent already compressed"
+    )
+)
+compressed_body_misses = metrics.registry.register(
+    metrics.Counter(
+        "chatql_compressed_bodies_misses_total", "Shared responses compressed"
+    )
+)
+compressed_body_size = metrics.registry.register(
+    metrics.Gauge("chatql_compressed_bodies_bytes", "Compressed bodies kept")
+)
+
+
+def compress_gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=config.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def compress_brotli(body: bytes) -> bytes:
+    compressed: bytes = brotli.compress(body, quality=config.COMPRESSION_BROTLI_QUALITY)
+    return compressed
+
+
+def get_compressors() -> dict[str, t.Callable[[bytes], bytes]]:
+    # In order of preference
+    compressors: dict[str, t.Callable[[bytes], bytes]] = {}
+
+    if brotli is not None:
+        compressors["br"] = compress_brotli
+
+    compressors["gzip"] = compress_gzip
+    return compressors
+
+
+compressors = get_compressors()
+
+
+def pick_encoding(accept_encoding: str) -> t.Optional[str]:
+    accepted: dict[str, float] = {}
+
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+
+        for param in params:
+            name, _, value = param.partition("=")
+
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+
+        accepted[coding.lower()] = quality
+
+    def get_quality(encoding: str) -> float:
+        return accepted.get(encoding, accepted.get("*", 0))
+
+    candidates = [encoding for encoding in compressors if get_quality(encoding) > 0]
+
+    if not candidates:
+        return None
+
+    return max(candidates, key=get_quality)
+
+
+def is_shared(headers: Headers) -> bool:
+    # Responses any client may be sent, unlike e.g. per user GraphQL results
+    directives = {
+        directive.partition("=")[0].strip().lower()
+        for directive in headers.get("cache-control", "").split(",")
+    }
+    return "public" in directives and not directives & {"private", "no-store"}
+
+
+class CompressedBodies:
+    # Identical shared responses, e.g. polled pages, are compressed once. Keyed by
+    # the digest of their body, so any identical response may reuse them
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.bodies: OrderedDict[tuple[str, bytes], bytes] = OrderedDict()
+        self.size = 0
+
+    def compress(self, encoding: str, body: bytes) -> bytes:
+        key = (encoding, hashlib.sha256(body).digest())
+        compressed_body = self.bodies.get(key)
+
+        if compressed_body is not None:
+            compressed_body_hits.inc()
+            self.bodies.move_to_end(key)
+            return compressed_body
+
+        compressed_body_misses.inc()
+        compressed_body = compressors[encoding](body)
+
+        if len(compressed_body) > self.max_bytes:
+            return compressed_body
+
+        self.bodies[key] = compressed_body
+        self.size += len(compressed_body)
+
+        while self.size > self.max_bytes:
+            _, evicted_body = self.bodies.popitem(last=False)
+            self.size -= len(evicted_body)
+
+        return compressed_body
+
+    def clear(self) -> None:
+        self.bodies.clear()
+        self.size = 0
+
+
+compressed_bodies = CompressedBodies(max_bytes=config.COMPRESSION_CACHE_MAX_BYTES)
+
+
+@metrics.registry.add_collector
+async def collect_compressed_bodies() -> None:
+    compressed_body_size.set(compressed_bodies.size)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = pick_encoding(Headers(scope=scope).get("accept-encoding", ""))
+
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+
+        responder = CompressionResponder(send, encoding, self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+
+class CompressionResponder:
+    # Single body responses are compressed whole, streamed ones are left as they are
+    def __init__(self, send: Send, encoding: str, minimum_size: int) -> None:
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message: t.Optional[Message] = None
+
+    def is_compressible(
+        self, start_message: Message, message: Message, body: bytes
+    ) -> bool:
+        if message.get("more_body", False) or len(body) < self.minimum_size:
+            return False
+
+        headers = Headers(raw=start_message["headers"])
+
+        if "content-encoding" in headers:
+            return False
+
+        return headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self.start_message is None:
+            await self._send(message)
+            return
+
+        start_message = self.start_message
+        self.start_message = None
+        body = message.get("body", b"")
+
+        if self.is_compressible(start_message, message, body):
+            headers = MutableHeaders(raw=start_message["headers"])
+
+            if is_shared(headers):
+                body = compressed_bodies.compress(self.encoding, body)
+            else:
+                body = compressors[self.encoding](body)
+
+            headers["Content-Encoding"] = self.encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            message = {**message, "body": body}
+
+        await self._send(start_message)
+        await self._send(message)
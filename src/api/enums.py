@@ -4,3 +4,4 @@ from enum import Enum
 class TokenType(str, Enum):
     ACCESS_TOKEN = "ACCESS_TOKEN"  # nosec
     REFRESH_TOKEN = "REFRESH_TOKEN"  # nosec
+    SYNC_TOKEN = "SYNC_TOKEN"  # nosec
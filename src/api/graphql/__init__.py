@@ -1,13 +1,21 @@
-import strawberry
 from fastapi import FastAPI
-from strawberry.fastapi import GraphQLRouter
 from src import config
 from src.api.graphql import views
+from src.api.graphql.base import extensions, fanout, router
 
 
-schema = strawberry.Schema(
-    query=views.Query, mutation=views.Mutation, subscription=views.Subscription
+schema = fanout.Schema(
+    query=views.Query,
+    mutation=views.Mutation,
+    subscription=views.Subscription,
+    extensions=[
+        extensions.MetricsExtension,
+        extensions.TracingExtension,
+        extensions.QueryBudgetExtension,
+    ],
+)
+graphql_app = router.Router(
+    schema, subscription_protocols=fanout.get_subscription_protocols()
 )
-graphql_app = GraphQLRouter[object, object](schema)
 graphql = FastAPI(title=config.APP_NAME)
 graphql.include_router(graphql_app, prefix="/graphql")
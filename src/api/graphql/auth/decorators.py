@@ -1,17 +1,29 @@
 import typing as t
 from functools import wraps
+from starlette.requests import Request
 from strawberry.types import Info
 from src.api.graphql import schemas
 from src.api.graphql.auth import services
 
+VALIDATION_RESULT_KEY = "authentication"
+
 
 def login_required(f: t.Callable[..., t.Any]) -> t.Any:
     @wraps(f)
     def wrapper(*args: t.Any, **kwargs: t.Any) -> t.Any:
         info: Info[dict[t.Any, t.Any], t.Any] = kwargs["info"]
-        auth_header = info.context["request"].headers.get("Authorization") or ""
-        service = services.AuthService()
-        validation_result = service.validate_authentication_header(auth_header)
+        request = info.context["request"]
+        validation_result = info.context.get(VALIDATION_RESULT_KEY)
+
+        if validation_result is None:
+            auth_header = request.headers.get("Authorization") or ""
+            service = services.AuthService()
+            validation_result = service.validate_authentication_header(auth_header)
+
+        # Reused by the other fields and batched operations of the request. Websocket
+        # contexts outlive their token, so those validate it on every operation
+        if isinstance(request, Request):
+            info.context[VALIDATION_RESULT_KEY] = validation_result
 
         if validation_result.errors:
             errors = [
@@ -0,0 +1,81 @@
+import hashlib
+import typing as t
+from functools import wraps
+from inspect import isawaitable
+from starlette.requests import Request
+from starlette.responses import Response
+from strawberry.types import ExecutionResult, Info
+from src.api.graphql import schemas
+
+HINTS_KEY = "cacheHints"
+FAILED_KEY = "cacheFailed"
+NO_STORE = "no-store"
+
+
+def cache_control(max_age: int) -> t.Callable[[t.Callable[..., t.Any]], t.Any]:
+    # How long a query field's result may be reused by the client that requested it.
+    # Applied above other decorators, e.g. `login_required`, to see their failures
+    def decorator(f: t.Callable[..., t.Any]) -> t.Any:
+        @wraps(f)
+        async def wrapper(*args: t.Any, **kwargs: t.Any) -> t.Any:
+            info: Info[dict[t.Any, t.Any], t.Any] = kwargs["info"]
+            info.context.setdefault(HINTS_KEY, {})[info.path.key] = max_age
+            value = f(*args, **kwargs)
+
+            if isawaitable(value):  # Not when `login_required` fails
+                value = await value
+
+            # Whatever fields the client selected, e.g. without `success`
+            if isinstance(value, schemas.ApiResponse) and value.errors:
+                info.context[FAILED_KEY] = True
+
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def get_cache_control(
+    result: ExecutionResult, hints: dict[str, int], failed: bool = False
+) -> str:
+    if failed or result.errors or not result.data:
+        return NO_STORE
+
+    max_ages = [hints.get(key) for key in result.data]
+
+    if None in max_ages:  # Fields without hints can't be reused without revalidation
+        return "private, no-cache"
+
+    return f"private, max-age={min(t.cast(list[int], max_ages))}"
+
+
+def get_etag(body: bytes) -> str:
+    # Weak, as compression changes the bytes but not what they represent
+    return f'W/"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def matches_etag(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def make_conditional(
+    request: Request, response: Response, cache_control_value: str
+) -> Response:
+    if cache_control_value == NO_STORE:  # Nor revalidated
+        response.headers["Cache-Control"] = NO_STORE
+        return response
+
+    etag = get_etag(response.body)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control_value,
+        "Vary": "Authorization",
+    }
+
+    if matches_etag(request.headers.get("If-None-Match", ""), etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return response
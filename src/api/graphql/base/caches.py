@@ -0,0 +1,281 @@
+import json
+import time
+import typing as t
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from urllib.parse import urlparse
+import beanie
+from beanie.odm.fields import LinkTypes
+from src import config, metrics
+from src.api.graphql import broadcast
+
+TDocument = t.TypeVar("TDocument", bound=beanie.Document)
+
+INVALIDATION_CHANNEL = "cache-invalidations"
+
+entity_cache_hits = metrics.registry.register(
+    metrics.Counter("chatql_entity_cache_hits_total", "Entity cache hits", ["entity"])
+)
+entity_cache_misses = metrics.registry.register(
+    metrics.Counter(
+        "chatql_entity_cache_misses_total", "Entity cache misses", ["entity"]
+    )
+)
+entity_cache_hit_ratio = metrics.registry.register(
+    metrics.Gauge(
+        "chatql_entity_cache_hit_ratio", "Share of reads served cached", ["entity"]
+    )
+)
+entity_cache_size = metrics.registry.register(
+    metrics.Gauge("chatql_entity_cache_size", "Entities cached", ["entity"])
+)
+
+
+class CacheInvalidationEvent(broadcast.TracedEvent):
+    entity: str
+    key: str
+
+
+class CacheBackend(ABC):
+    # Shared backends store serialized values, in-process backends store the objects
+    shared = False
+
+    @abstractmethod
+    async def get(self, key: str) -> t.Optional[t.Any]:
+        raise NotImplementedError  # pragma: no cover
+
+    @abstractmethod
+    async def set(self, key: str, value: t.Any) -> None:
+        raise NotImplementedError  # pragma: no cover
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError  # pragma: no cover
+
+    @abstractmethod
+    async def size(self) -> int:
+        raise NotImplementedError  # pragma: no cover
+
+    @abstractmethod
+    async def clear(self) -> None:
+        raise NotImplementedError  # pragma: no cover
+
+
+class MemoryCacheBackend(CacheBackend):
+    def __init__(self, max_size: int, ttl_seconds: float) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.values: OrderedDict[str, tuple[float, t.Any]] = OrderedDict()
+
+    async def get(self, key: str) -> t.Optional[t.Any]:
+        item = self.values.get(key)
+
+        if item is None:
+            return None
+
+        expires_at, value = item
+
+        if expires_at <= time.monotonic():
+            del self.values[key]
+            return None
+
+        self.values.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: t.Any) -> None:
+        self.values[key] = (time.monotonic() + self.ttl_seconds, value)
+        self.values.move_to_end(key)
+
+        while len(self.values) > self.max_size:
+            self.values.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self.values.pop(key, None)
+
+    async def size(self) -> int:
+        return len(self.values)
+
+    async def clear(self) -> None:
+        self.values.clear()
+
+
+class RedisCacheBackend(CacheBackend):
+    shared = True
+
+    def __init__(self, client: t.Any, namespace: str, ttl_seconds: float) -> None:
+        self.client = client
+        self.prefix = f"cache:{namespace}:"
+        self.ttl_seconds = ttl_seconds
+
+    async def get(self, key: str) -> t.Optional[t.Any]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: t.Any) -> None:
+        await self.client.set(self.prefix + key, value, ex=int(self.ttl_seconds))
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+    async def keys(self) -> list[t.Any]:
+        return [key async for key in self.client.scan_iter(match=self.prefix + "*")]
+
+    async def size(self) -> int:
+        return len(await self.keys())
+
+    async def clear(self) -> None:
+        keys = await self.keys()
+
+        if keys:
+            await self.client.delete(*keys)
+
+
+def connect_redis(url: str) -> t.Any:  # pragma: no cover
+    # Optional dependency, as it is for the broadcaster
+    from redis import asyncio as redis  # type: ignore[import-untyped]
+
+    return redis.from_url(url)
+
+
+def make_backend(namespace: str) -> CacheBackend:
+    url = config.CACHE_URL
+    ttl_seconds = config.ENTITY_CACHE_TTL_SECONDS
+
+    if urlparse(url).scheme in ("redis", "rediss"):
+        return RedisCacheBackend(connect_redis(url), namespace, ttl_seconds)
+
+    return MemoryCacheBackend(config.ENTITY_CACHE_MAX_SIZE, ttl_seconds)
+
+
+def dump_link(value: t.Any) -> t.Optional[dict[str, t.Any]]:
+    if isinstance(value, beanie.Document):
+        return dump_document(value)
+
+    if isinstance(value, beanie.Link):
+        return {"id": str(value.ref.id), "collection": value.ref.collection}
+
+    return None  # Back links that weren't fetched
+
+
+def dump_document(
+    document: beanie.Document, back_links: t.Iterable[str] = ()
+) -> dict[str, t.Any]:
+    # Serializes fetched links as nested documents. Back links are skipped unless
+    # required, as they may pull whole collections
+    link_fields = document.get_link_fields() or {}
+    data: dict[str, t.Any] = document.model_dump(
+        mode="json", by_alias=True, exclude=set(link_fields)
+    )
+
+    for field, link_info in link_fields.items():
+        is_back_link = link_info.link_type in (
+            LinkTypes.BACK_DIRECT,
+            LinkTypes.BACK_LIST,
+            LinkTypes.OPTIONAL_BACK_DIRECT,
+            LinkTypes.OPTIONAL_BACK_LIST,
+        )
+
+        if is_back_link and field not in back_links:
+            continue
+
+        value = getattr(document, field)
+
+        if isinstance(value, list):
+            links = [dump_link(item) for item in value]
+            data[field] = [link for link in links if link is not None]
+        else:
+            data[field] = dump_link(value)
+
+    return data
+
+
+class EntityCache(t.Generic[TDocument]):
+    def __init__(
+        self,
+        entity: str,
+        model: type[TDocument],
+        backend: CacheBackend,
+        back_links: t.Iterable[str] = (),
+        on_evict: t.Optional[t.Callable[[str], None]] = None,
+        on_reset: t.Optional[t.Callable[[], None]] = None,
+    ) -> None:
+        self.entity = entity
+        self.model = model
+        self.backend = backend
+        self.back_links = tuple(back_links)
+        self.on_evict = on_evict
+        self.on_reset = on_reset
+        # Bumped on every eviction, so loads racing with an invalidation aren't stored
+        self.version = 0
+        entity_caches[entity] = self
+
+    def dump(self, document: TDocument) -> t.Any:
+        if not self.backend.shared:
+            return document
+
+        return json.dumps(dump_document(document, self.back_links))
+
+    def load(self, value: t.Any) -> TDocument:
+        if not self.backend.shared:
+            return t.cast(TDocument, value)
+
+        return t.cast(TDocument, self.model.model_validate(json.loads(value)))
+
+    async def get(
+        self,
+        key: str,
+        loader: t.Callable[[], t.Awaitable[t.Optional[TDocument]]],
+    ) -> t.Optional[TDocument]:
+        value = await self.backend.get(key)
+
+        if value is not None:
+            entity_cache_hits.inc(self.entity)
+            return self.load(value)
+
+        entity_cache_misses.inc(self.entity)
+        version = self.version
+        document = await loader()
+
+        if document is not None and version == self.version:
+            await self.backend.set(key, self.dump(document))
+
+        return document
+
+    async def evict(self, key: str) -> None:
+        self.version += 1
+        await self.backend.delete(key)
+
+        if self.on_evict:
+            self.on_evict(key)
+
+    async def invalidate(self, key: str) -> None:
+        # Evicts locally right away and lets every other worker know
+        await self.evict(key)
+        event = CacheInvalidationEvent(entity=self.entity, key=key)
+        await broadcast.publish(INVALIDATION_CHANNEL, event)
+
+    async def reset(self) -> None:
+        # Invalidations may have been missed. Shared backends are kept, as whoever
+        # invalidated them deleted the key from the shared store already
+        self.version += 1
+
+        if not self.backend.shared:
+            await self.backend.clear()
+
+        if self.on_reset:
+            self.on_reset()
+
+    async def clear(self) -> None:
+        self.version += 1
+        await self.backend.clear()
+
+
+entity_caches: dict[str, EntityCache[t.Any]] = {}
+
+
+@metrics.registry.add_collector
+async def collect_entity_caches() -> None:
+    for entity, cache in entity_caches.items():
+        hits = entity_cache_hits.get(entity)
+        requests = hits + entity_cache_misses.get(entity)
+        entity_cache_hit_ratio.set(hits / requests if requests else 0.0, entity)
+        entity_cache_size.set(await cache.backend.size(), entity)
@@ -0,0 +1,84 @@
+import json
+import typing as t
+from datetime import date, datetime
+from src import config
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+def encode_default(value: t.Any) -> t.Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JsonEncoder:
+    name = "json"
+
+    def dumps(self, data: t.Any) -> str:
+        # Same format Starlette uses for `send_json`
+        return json.dumps(
+            data, separators=(",", ":"), ensure_ascii=False, default=encode_default
+        )
+
+    def dumps_bytes(self, data: t.Any) -> bytes:
+        return self.dumps(data).encode()
+
+
+class OrjsonEncoder(JsonEncoder):
+    name = "orjson"
+
+    def dumps(self, data: t.Any) -> str:
+        return self.dumps_bytes(data).decode()
+
+    def dumps_bytes(self, data: t.Any) -> bytes:
+        # Datetimes are encoded natively, other unknown types as the JSON encoder
+        encoded: bytes = orjson.dumps(data, default=encode_default)
+        return encoded
+
+
+class MsgpackEncoder:
+    name = "msgpack"
+
+    def dumps_bytes(self, data: t.Any) -> bytes:
+        encoded: bytes = msgpack.packb(data, default=encode_default)
+        return encoded
+
+    def dumps_with_data(self, envelope: dict[str, t.Any], encoded_data: bytes) -> bytes:
+        # Same as encoding the envelope with `{"payload": {"data": ...}}`, reusing data
+        # that was already encoded
+        packer = msgpack.Packer(default=encode_default)
+        parts = [packer.pack_map_header(len(envelope) + 1)]
+
+        for key, value in envelope.items():
+            parts += [packer.pack(key), packer.pack(value)]
+
+        parts += [
+            packer.pack("payload"),
+            packer.pack_map_header(1),
+            packer.pack("data"),
+        ]
+        return b"".join(parts) + encoded_data
+
+    def loads(self, data: bytes) -> t.Any:
+        return msgpack.unpackb(data)
+
+
+def get_encoder(name: str) -> JsonEncoder:
+    if name == OrjsonEncoder.name and orjson is not None:
+        return OrjsonEncoder()
+
+    return JsonEncoder()
+
+
+encoder = get_encoder(config.JSON_ENCODER)
+msgpack_encoder = MsgpackEncoder() if msgpack is not None else None
@@ -0,0 +1,180 @@
+import time
+import typing as t
+from inspect import isawaitable
+from graphql import GraphQLResolveInfo
+from strawberry.extensions import SchemaExtension
+from strawberry.types import ExecutionContext
+from src import config, metrics, tracing
+from src.api.graphql import schemas
+from src.db import monitoring, query_budgets
+
+COMMAND_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+operation_seconds = metrics.registry.register(
+    metrics.Histogram(
+        "chatql_graphql_operation_seconds",
+        "GraphQL operation latency",
+        ["type", "operation"],
+    )
+)
+field_seconds = metrics.registry.register(
+    metrics.Histogram(
+        "chatql_graphql_field_seconds", "GraphQL async resolver latency", ["field"]
+    )
+)
+operation_errors = metrics.registry.register(
+    metrics.Counter(
+        "chatql_graphql_errors_total", "GraphQL errors", ["type", "operation"]
+    )
+)
+api_errors = metrics.registry.register(
+    metrics.Counter("chatql_api_errors_total", "API errors returned", ["code"])
+)
+operation_commands = metrics.registry.register(
+    metrics.Histogram(
+        "chatql_graphql_operation_mongo_commands",
+        "Mongo commands issued per GraphQL operation",
+        ["type", "operation"],
+        buckets=COMMAND_BUCKETS,
+    )
+)
+
+
+def count_api_errors(value: t.Any) -> None:
+    if isinstance(value, schemas.ApiResponse) and value.errors:
+        for error in value.errors:
+            api_errors.inc(error.code.value)
+
+
+def get_operation_labels(execution_context: ExecutionContext) -> tuple[str, str]:
+    if execution_context.graphql_document is None:
+        return "unknown", execution_context.operation_name or ""
+
+    return (
+        execution_context.operation_type.value,
+        execution_context.operation_name or "",
+    )
+
+
+def get_field_name(info: GraphQLResolveInfo) -> str:
+    return f"{info.parent_type.name}.{info.field_name}"
+
+
+class MetricsExtension(SchemaExtension):
+    def on_operation(self) -> t.Iterator[None]:
+        commands: list[str] = []
+        token = monitoring.operation_commands.set(commands)
+        started_at = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started_at
+            monitoring.operation_commands.reset(token)
+            labels = get_operation_labels(self.execution_context)
+            operation_seconds.observe(elapsed, *labels)
+            operation_commands.observe(len(commands), *labels)
+            result = self.execution_context.result
+            errors = self.execution_context.errors or (result and result.errors)
+
+            if errors:
+                operation_errors.inc(*labels, amount=len(errors))
+
+    async def time_field(
+        self, field: str, result: t.Awaitable[t.Any], started_at: float
+    ) -> t.Any:
+        value = await result
+        field_seconds.observe(time.perf_counter() - started_at, field)
+        count_api_errors(value)
+        return value
+
+    def resolve(
+        self,
+        _next: t.Callable[..., t.Any],
+        root: t.Any,
+        info: GraphQLResolveInfo,
+        *args: t.Any,
+        **kwargs: t.Any,
+    ) -> t.Any:
+        # Only async resolvers are timed, plain attributes would cost more to time
+        # than to resolve
+        started_at = time.perf_counter()
+        result = _next(root, info, *args, **kwargs)
+
+        if isawaitable(result):
+            return self.time_field(get_field_name(info), result, started_at)
+
+        count_api_errors(result)
+        return result
+
+
+class TracingExtension(SchemaExtension):
+    def get_traceparent(self) -> t.Optional[str]:
+        # Operations continue the traces of clients sending the W3C header
+        context = self.execution_context.context
+        request = context.get("request") if isinstance(context, dict) else None
+
+        if request is None:
+            return None
+
+        traceparent: t.Optional[str] = request.headers.get("traceparent")
+        return traceparent
+
+    def on_operation(self) -> t.Iterator[None]:
+        traceparent = self.get_traceparent()
+
+        with tracing.tracer.start_span(
+            "graphql.operation", traceparent=traceparent
+        ) as span:
+            yield
+            operation_type, operation_name = get_operation_labels(
+                self.execution_context
+            )
+            span.set_attribute("graphql.operation.type", operation_type)
+            span.set_attribute("graphql.operation.name", operation_name)
+            result = self.execution_context.result
+            errors = self.execution_context.errors or (result and result.errors)
+
+            if errors:
+                span.set_error("; ".join(error.message for error in errors))
+
+    async def trace_field(self, field: str, result: t.Awaitable[t.Any]) -> t.Any:
+        with tracing.tracer.start_span("graphql.resolve", {"graphql.field": field}):
+            return await result
+
+    def resolve(
+        self,
+        _next: t.Callable[..., t.Any],
+        root: t.Any,
+        info: GraphQLResolveInfo,
+        *args: t.Any,
+        **kwargs: t.Any,
+    ) -> t.Any:
+        result = _next(root, info, *args, **kwargs)
+
+        if isawaitable(result) and tracing.tracer.is_recording():
+            return self.trace_field(get_field_name(info), result)
+
+        return result
+
+
+class QueryBudgetExtension(SchemaExtension):
+    # Fails operations issuing more Mongo commands than budgeted, or the same query
+    # more times, which tells queries run in loops. Or only logs them
+    def on_operation(self) -> t.Iterator[None]:
+        mode = config.QUERY_BUDGET_MODE
+
+        if mode == query_budgets.MODE_OFF:
+            yield
+            return
+
+        with query_budgets.query_budget(
+            config.QUERY_BUDGET_MAX_COMMANDS,
+            config.QUERY_BUDGET_MAX_REPEATS,
+            log_only=mode == query_budgets.MODE_LOG,
+        ) as budget:
+            yield
+            # Named once the document is parsed
+            budget.label = (
+                self.execution_context.operation_name or "anonymous operation"
+            )
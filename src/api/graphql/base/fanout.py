@@ -0,0 +1,347 @@
+import json
+import random
+import typing as t
+from collections import OrderedDict
+from inspect import isawaitable
+import strawberry
+from graphql import (
+    DocumentNode,
+    ExecutionResult,
+    FieldNode,
+    FragmentDefinitionNode,
+    GraphQLError,
+    create_source_event_stream,
+    execute,
+    get_operation_ast,
+    parse,
+    print_ast,
+)
+from starlette.websockets import WebSocketDisconnect, WebSocketState
+from strawberry.fastapi.handlers import GraphQLTransportWSHandler, GraphQLWSHandler
+from strawberry.subscriptions import GRAPHQL_TRANSPORT_WS_PROTOCOL, GRAPHQL_WS_PROTOCOL
+from src import config, metrics
+from src.api.graphql.base import encoders
+
+# graphql-transport-ws, with messages as binary MessagePack frames
+MSGPACK_PROTOCOL = "graphql-transport-ws.msgpack"
+MSGPACK_SCOPE_KEY = "graphql_msgpack"
+
+
+EncodedT = t.TypeVar("EncodedT", str, bytes)
+
+executions = metrics.registry.register(
+    metrics.Counter(
+        "chatql_fanout_executions_total", "Subscription events executed for a shape"
+    )
+)
+shared_executions = metrics.registry.register(
+    metrics.Counter(
+        "chatql_fanout_shared_executions_total",
+        "Subscription events served from a shared execution",
+    )
+)
+encodings = metrics.registry.register(
+    metrics.Counter("chatql_fanout_encodings_total", "Shared results encoded")
+)
+shared_encodings = metrics.registry.register(
+    metrics.Counter(
+        "chatql_fanout_shared_encodings_total", "Frames reusing a shared encoding"
+    )
+)
+shared_results_size = metrics.registry.register(
+    metrics.Gauge("chatql_fanout_shared_results_size", "Shared results held")
+)
+
+
+class SharedResult:
+    def __init__(self, result: ExecutionResult) -> None:
+        self.result = result
+        self.encoded_data: dict[t.Callable[[t.Any], t.Any], t.Any] = {}  # By encoding
+
+
+class SharedResults:
+    # Subscribers selecting the same fields of the same event get the same execution
+    # result, and their frames reuse its data encoded once
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.results: OrderedDict[t.Hashable, SharedResult] = OrderedDict()
+        self.results_by_data: dict[int, SharedResult] = {}
+
+    async def get(
+        self,
+        key: t.Hashable,
+        execute_event: t.Callable[[], t.Awaitable[ExecutionResult]],
+    ) -> ExecutionResult:
+        shared_result = self.results.get(key)
+
+        if shared_result:
+            shared_executions.inc()
+            self.results.move_to_end(key)
+            return shared_result.result
+
+        executions.inc()
+        result = await execute_event()
+
+        if result.errors or result.data is None:
+            return result
+
+        shared_result = SharedResult(result)
+        self.results[key] = shared_result
+        self.results_by_data[id(result.data)] = shared_result
+
+        while len(self.results) > self.max_size:
+            _, evicted_result = self.results.popitem(last=False)
+            del self.results_by_data[id(evicted_result.result.data)]
+
+        return result
+
+    def encode(
+        self, data: t.Any, encode: t.Callable[[t.Any], EncodedT]
+    ) -> t.Optional[EncodedT]:
+        # Holding the data keeps its id from being reused while the result is cached
+        shared_result = self.results_by_data.get(id(data))
+
+        if not shared_result:
+            return None
+
+        encoded_data: t.Optional[EncodedT] = shared_result.encoded_data.get(encode)
+
+        if encoded_data is None:
+            encodings.inc()
+            encoded_data = encode(data)
+            shared_result.encoded_data[encode] = encoded_data
+        else:
+            shared_encodings.inc()
+
+        return encoded_data
+
+    def clear(self) -> None:
+        self.results.clear()
+        self.results_by_data.clear()
+
+
+shared_results = SharedResults(max_size=config.FANOUT_RESULTS_MAX_SIZE)
+
+
+@metrics.registry.add_collector
+async def collect_shared_results() -> None:
+    shared_results_size.set(len(shared_results.results))
+
+
+def dump_json(data: t.Any) -> str:
+    return encoders.encoder.dumps(data)
+
+
+def get_shape_key(
+    document: DocumentNode,
+    operation_name: t.Optional[str],
+    variable_values: t.Optional[dict[str, t.Any]],
+) -> t.Optional[str]:
+    # Prints what shapes an event's data: the subscription field's selections and
+    # the fragments they may use. Arguments only matter to the event stream
+    operation = get_operation_ast(document, operation_name)
+
+    if not operation or len(operation.selection_set.selections) != 1:
+        return None
+
+    field = operation.selection_set.selections[0]
+
+    if not isinstance(field, FieldNode):
+        return None
+
+    parts = [field.alias.value if field.alias else field.name.value]
+
+    if field.selection_set:
+        parts.append(print_ast(field.selection_set))
+
+    for definition in document.definitions:
+        if isinstance(definition, FragmentDefinitionNode):
+            parts.append(print_ast(definition))
+
+    shape = "\n".join(parts)
+
+    if "$" in shape:  # Selections using variables
+        shape += "\n" + json.dumps(variable_values or {}, sort_keys=True)
+
+    return shape
+
+
+def get_event_key(event: t.Any, shape_key: t.Optional[str]) -> t.Optional[t.Hashable]:
+    event_id = getattr(event, "id", None)
+
+    if event_id is None or shape_key is None:
+        return None
+
+    return (type(event).__name__, event_id, shape_key)
+
+
+class Schema(strawberry.Schema):
+    async def subscribe(
+        self,
+        query: str,
+        variable_values: t.Optional[dict[str, t.Any]] = None,
+        context_value: t.Optional[t.Any] = None,
+        root_value: t.Optional[t.Any] = None,
+        operation_name: t.Optional[str] = None,
+    ) -> t.Union[t.AsyncGenerator[ExecutionResult, None], ExecutionResult]:
+        # Same as GraphQL's `subscribe`, except events are executed through the
+        # shared results
+        document = parse(query)
+        event_stream = await create_source_event_stream(
+            self._schema,
+            document,
+            root_value=root_value,
+            context_value=context_value,
+            variable_values=variable_values,
+            operation_name=operation_name,
+        )
+
+        if isinstance(event_stream, ExecutionResult):
+            return event_stream
+
+        shape_key = get_shape_key(document, operation_name, variable_values)
+
+        async def get_results() -> t.AsyncGenerator[ExecutionResult, None]:
+            try:
+                async for event in event_stream:
+
+                    async def execute_event() -> ExecutionResult:
+                        result = execute(
+                            self._schema,
+                            document,
+                            root_value=event,
+                            context_value=context_value,
+                            variable_values=variable_values,
+                            operation_name=operation_name,
+                        )
+
+                        if isawaitable(result):
+                            return await t.cast(t.Awaitable[ExecutionResult], result)
+
+                        return t.cast(ExecutionResult, result)
+
+                    event_key = get_event_key(event, shape_key)
+
+                    if event_key is None:
+                        yield await execute_event()
+                    else:
+                        yield await shared_results.get(event_key, execute_event)
+            except GraphQLError as error:
+                # Ends the subscription with the error, keeping its extensions
+                yield ExecutionResult(data=None, errors=[error])
+            finally:
+                aclose = getattr(event_stream, "aclose", None)
+
+                if aclose:
+                    await aclose()
+
+        return get_results()
+
+
+def get_shared_data(
+    data: dict[str, t.Any], encode: t.Callable[[t.Any], EncodedT]
+) -> t.Optional[EncodedT]:
+    payload = data.get("payload")
+
+    if not isinstance(payload, dict) or list(payload) != ["data"]:
+        return None
+
+    return shared_results.encode(payload["data"], encode)
+
+
+def get_reconnect_delay_ms() -> int:
+    # Spreads reconnections out after deploys instead of having them all at once
+    max_delay_ms = int(config.RECONNECT_MAX_DELAY_SECONDS * 1000)
+    return random.randint(0, max_delay_ms)  # nosec
+
+
+def add_reconnect_delay(data: dict[str, t.Any]) -> dict[str, t.Any]:
+    # Acknowledgements tell clients how long to wait before reconnecting
+    if data.get("type") != "connection_ack":
+        return data
+
+    return {**data, "payload": {"reconnectDelayMs": get_reconnect_delay_ms()}}
+
+
+def encode_frame(data: dict[str, t.Any]) -> t.Optional[str]:
+    encoded_data = get_shared_data(data, dump_json)
+
+    if encoded_data is None:
+        return None
+
+    envelope = dump_json({key: data[key] for key in data if key != "payload"})
+    return envelope[:-1] + ',"payload":{"data":' + encoded_data + "}}"
+
+
+def dump_msgpack(data: t.Any) -> bytes:
+    return t.cast(encoders.MsgpackEncoder, encoders.msgpack_encoder).dumps_bytes(data)
+
+
+def encode_msgpack_frame(data: dict[str, t.Any]) -> bytes:
+    encoded_data = get_shared_data(data, dump_msgpack)
+
+    if encoded_data is None:
+        return dump_msgpack(data)
+
+    envelope = {key: data[key] for key in data if key != "payload"}
+    msgpack_encoder = t.cast(encoders.MsgpackEncoder, encoders.msgpack_encoder)
+    return msgpack_encoder.dumps_with_data(envelope, encoded_data)
+
+
+class SharedGraphQLTransportWSHandler(GraphQLTransportWSHandler):
+    @property
+    def uses_msgpack(self) -> bool:
+        return bool(self._ws.scope.get(MSGPACK_SCOPE_KEY))
+
+    async def send_json(self, data: dict[str, t.Any]) -> None:
+        data = add_reconnect_delay(data)
+
+        if self.uses_msgpack:
+            await self._ws.send_bytes(encode_msgpack_frame(data))
+            return
+
+        frame = encode_frame(data)
+        await self._ws.send_text(dump_json(data) if frame is None else frame)
+
+    async def handle_request(self) -> None:
+        if not self.uses_msgpack:
+            await super().handle_request()
+            return
+
+        # Same as the JSON protocol, with binary MessagePack messages
+        msgpack_encoder = t.cast(encoders.MsgpackEncoder, encoders.msgpack_encoder)
+        await self._ws.accept(subprotocol=MSGPACK_PROTOCOL)
+        self.on_request_accepted()
+
+        try:
+            while self._ws.application_state != WebSocketState.DISCONNECTED:
+                try:
+                    message = msgpack_encoder.loads(await self._ws.receive_bytes())
+                except (KeyError, ValueError):  # Text or malformed messages
+                    message = None
+
+                if isinstance(message, dict):
+                    await self.handle_message(message)
+                else:
+                    error_message = "WebSocket message must be a MessagePack map"
+                    await self.handle_invalid_message(error_message)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            await self.shutdown()
+
+
+class SharedGraphQLWSHandler(GraphQLWSHandler):
+    async def send_json(self, data: t.Any) -> None:
+        data = add_reconnect_delay(data)
+        frame = encode_frame(data)
+        await self._ws.send_text(dump_json(data) if frame is None else frame)
+
+
+def get_subscription_protocols() -> list[str]:
+    protocols = [GRAPHQL_TRANSPORT_WS_PROTOCOL, GRAPHQL_WS_PROTOCOL]
+
+    if encoders.msgpack_encoder:
+        protocols.append(MSGPACK_PROTOCOL)
+
+    return protocols
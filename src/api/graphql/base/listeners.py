@@ -0,0 +1,25 @@
+from src import tracing
+from src.api.graphql import broadcast
+from src.api.graphql.base import caches
+
+
+async def evict_entity(message: str) -> None:
+    invalidation = caches.CacheInvalidationEvent.model_validate_json(message)
+    cache = caches.entity_caches.get(invalidation.entity)
+
+    if cache:
+        with tracing.tracer.start_span(
+            "broadcast.deliver", traceparent=invalidation.traceparent
+        ):
+            await cache.evict(invalidation.key)
+
+
+async def reset_entity_caches() -> None:
+    for cache in caches.entity_caches.values():
+        await cache.reset()
+
+
+async def sync_entity_caches() -> None:
+    await broadcast.listen(
+        caches.INVALIDATION_CHANNEL, evict_entity, reset_entity_caches
+    )
@@ -0,0 +1,45 @@
+import hashlib
+import typing as t
+from strawberry.http.exceptions import HTTPException
+from src.api.graphql.base import caches
+
+
+class PersistedQueryNotFound(Exception):
+    pass
+
+
+class PersistedQueries:
+    # Queries sent once with their SHA-256 hash, so requests may send only the hash.
+    # Same protocol as Apollo's automatic persisted queries
+    def __init__(self, backend: caches.CacheBackend) -> None:
+        self.backend = backend
+
+    async def get_query(
+        self, query: t.Optional[str], extensions: t.Optional[dict[str, t.Any]]
+    ) -> t.Optional[str]:
+        persisted_query = (extensions or {}).get("persistedQuery")
+
+        if not isinstance(persisted_query, dict):
+            return query
+
+        query_hash = persisted_query.get("sha256Hash")
+
+        if persisted_query.get("version") != 1 or not isinstance(query_hash, str):
+            raise HTTPException(400, "Unsupported persisted query")
+
+        if query is None:
+            value = await self.backend.get(query_hash)
+
+            if value is None:
+                raise PersistedQueryNotFound()
+
+            return value.decode() if isinstance(value, bytes) else str(value)
+
+        if hashlib.sha256(query.encode()).hexdigest() != query_hash:
+            raise HTTPException(400, "Persisted query hash doesn't match the query")
+
+        await self.backend.set(query_hash, query)
+        return query
+
+
+persisted_queries = PersistedQueries(caches.make_backend("persisted-queries"))
@@ -0,0 +1,182 @@
+import asyncio
+import typing as t
+from graphql import GraphQLError
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.websockets import WebSocket
+from strawberry import UNSET
+from strawberry.exceptions import MissingQueryError
+from strawberry.fastapi import GraphQLRouter
+from strawberry.http import GraphQLHTTPResponse, GraphQLRequestData
+from strawberry.http.async_base_view import AsyncHTTPRequestAdapter
+from strawberry.http.base import BaseRequestProtocol
+from strawberry.http.exceptions import HTTPException
+from strawberry.subscriptions import GRAPHQL_TRANSPORT_WS_PROTOCOL
+from strawberry.types import ExecutionResult as StrawberryExecutionResult
+from strawberry.types.graphql import OperationType
+from src import config
+from src.api.graphql.base import cache_control, encoders, fanout, persisted_queries
+
+CACHE_CONTROL_KEY = "cacheControl"
+
+
+def get_persisted_query_not_found_result() -> StrawberryExecutionResult:
+    error = GraphQLError(
+        "PersistedQueryNotFound", extensions={"code": "PERSISTED_QUERY_NOT_FOUND"}
+    )
+    return StrawberryExecutionResult(data=None, errors=[error])
+
+
+async def is_batch_request(request: Request) -> bool:
+    # Batches are JSON arrays of operations, told apart without parsing the body
+    content_type = request.headers.get("content-type", "")
+
+    if request.method != "POST" or "application/json" not in content_type:
+        return False
+
+    return (await request.body()).lstrip().startswith(b"[")
+
+
+class Router(GraphQLRouter[object, object]):
+    graphql_transport_ws_handler_class = fanout.SharedGraphQLTransportWSHandler
+    graphql_ws_handler_class = fanout.SharedGraphQLWSHandler
+
+    def pick_preferred_protocol(self, ws: WebSocket) -> t.Optional[str]:
+        protocol = super().pick_preferred_protocol(ws)
+
+        if protocol != fanout.MSGPACK_PROTOCOL:
+            return protocol
+
+        # Served by the same handler, which then sends and receives MessagePack
+        ws.scope[fanout.MSGPACK_SCOPE_KEY] = True
+        return GRAPHQL_TRANSPORT_WS_PROTOCOL
+
+    def encode_json(  # type: ignore[override]
+        self,
+        response_data: t.Union[GraphQLHTTPResponse, list[GraphQLHTTPResponse]],
+    ) -> bytes:
+        # Responses take bytes, which spares decoding what the encoder returns
+        return encoders.encoder.dumps_bytes(response_data)
+
+    def should_render_graphql_ide(self, request: BaseRequestProtocol) -> bool:
+        # Persisted queries may be sent without the query
+        has_extensions = request.query_params.get("extensions") is not None
+        return not has_extensions and super().should_render_graphql_ide(request)
+
+    async def parse_http_body(
+        self, request: AsyncHTTPRequestAdapter
+    ) -> GraphQLRequestData:
+        # Same as Strawberry's without file uploads, along with persisted queries
+        content_type = request.content_type or ""
+
+        if "application/json" in content_type:
+            data = self.parse_json(await request.get_body())
+        elif request.method == "GET":
+            data = self.parse_query_params(request.query_params)
+            extensions = data.get("extensions")
+
+            if isinstance(extensions, str):
+                data["extensions"] = self.parse_json(extensions)
+        else:
+            raise HTTPException(400, "Unsupported content type")
+
+        return await self.get_request_data(data)
+
+    async def get_request_data(self, data: t.Any) -> GraphQLRequestData:
+        if not isinstance(data, dict):
+            raise HTTPException(400, "Unsupported request body")
+
+        query = await persisted_queries.persisted_queries.get_query(
+            data.get("query"), data.get("extensions")
+        )
+        return GraphQLRequestData(
+            query=query,
+            variables=data.get("variables"),
+            operation_name=data.get("operationName"),
+        )
+
+    async def execute_operation(
+        self, request: Request, context: t.Any, root_value: t.Any
+    ) -> StrawberryExecutionResult:
+        try:
+            result = await super().execute_operation(request, context, root_value)
+        except persisted_queries.PersistedQueryNotFound:
+            return get_persisted_query_not_found_result()
+
+        hints = context.get(cache_control.HINTS_KEY, {})
+        failed = context.get(cache_control.FAILED_KEY, False)
+        context[CACHE_CONTROL_KEY] = cache_control.get_cache_control(
+            result, hints, failed
+        )
+        return result
+
+    async def execute_batched_operation(
+        self, data: t.Any, context: t.Any, root_value: t.Any
+    ) -> StrawberryExecutionResult:
+        # Failing operations fail on their own, as errors of their result
+        try:
+            request_data = await self.get_request_data(data)
+            return await self.schema.execute(
+                request_data.query,
+                root_value=root_value,
+                variable_values=request_data.variables,
+                context_value=context,
+                operation_name=request_data.operation_name,
+                allowed_operation_types=OperationType.from_http("POST"),
+            )
+        except persisted_queries.PersistedQueryNotFound:
+            return get_persisted_query_not_found_result()
+        except HTTPException as error:
+            return StrawberryExecutionResult(
+                data=None, errors=[GraphQLError(error.reason)]
+            )
+        except MissingQueryError:
+            return StrawberryExecutionResult(
+                data=None, errors=[GraphQLError("No GraphQL query found")]
+            )
+
+    async def run_batch(
+        self, request: Request, context: t.Any, root_value: t.Any
+    ) -> Response:
+        operations = self.parse_json(await request.body())
+
+        if not isinstance(operations, list) or not operations:
+            raise HTTPException(400, "Unsupported request body")
+
+        if len(operations) > config.GRAPHQL_MAX_BATCH_SIZE:
+            raise HTTPException(400, "Too many operations in batch")
+
+        # All operations share the context, so the principal and loaders are reused
+        results = await asyncio.gather(
+            *[
+                self.execute_batched_operation(data, context, root_value)
+                for data in operations
+            ]
+        )
+        response_data = [
+            await self.process_result(request=request, result=result)
+            for result in results
+        ]
+        return self.create_response(
+            response_data=response_data,  # type: ignore[arg-type]
+            sub_response=await self.get_sub_response(request),
+        )
+
+    async def run(
+        self, request: Request, context: t.Any = UNSET, root_value: t.Any = UNSET
+    ) -> Response:
+        if await is_batch_request(request):
+            return await self.run_batch(request, context, root_value)
+
+        response = await super().run(request, context, root_value)
+        cache_control_value = (
+            context.get(CACHE_CONTROL_KEY) if isinstance(context, dict) else None
+        )
+
+        # Only query operations may be sent through GET, so those are the cacheable
+        is_cacheable = request.method == "GET" and response.status_code == 200
+
+        if not is_cacheable or not cache_control_value:
+            return response
+
+        return cache_control.make_conditional(request, response, cache_control_value)
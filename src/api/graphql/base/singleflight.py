@@ -0,0 +1,65 @@
+import asyncio
+import typing as t
+from functools import partial
+from src import config, metrics
+
+TResult = t.TypeVar("TResult")
+
+single_flight_calls = metrics.registry.register(
+    metrics.Counter("chatql_single_flight_calls_total", "Reads run by the flights")
+)
+single_flight_shared_calls = metrics.registry.register(
+    metrics.Counter(
+        "chatql_single_flight_shared_calls_total", "Reads served by another's flight"
+    )
+)
+single_flight_in_flight = metrics.registry.register(
+    metrics.Gauge("chatql_single_flight_in_flight", "Flights running or kept")
+)
+
+
+class SingleFlight:
+    def __init__(self, window_seconds: float) -> None:
+        # Results are kept for `window_seconds` after the call returns, so reads that
+        # arrive right after it are coalesced too
+        self.window_seconds = window_seconds
+        self.flights: dict[t.Hashable, asyncio.Future[t.Any]] = {}
+
+    async def do(
+        self, key: t.Hashable, fn: t.Callable[[], t.Awaitable[TResult]]
+    ) -> TResult:
+        flight = self.flights.get(key)
+
+        if flight is None:
+            single_flight_calls.inc()
+            # Runs as its own task, so a caller going away doesn't cancel the others
+            flight = asyncio.ensure_future(fn())
+            self.flights[key] = flight
+            flight.add_done_callback(partial(self.land, key))
+        else:
+            single_flight_shared_calls.inc()
+
+        return t.cast(TResult, await asyncio.shield(flight))
+
+    def land(self, key: t.Hashable, flight: asyncio.Future[t.Any]) -> None:
+        if self.window_seconds <= 0 or flight.cancelled() or flight.exception():
+            self.forget(key, flight)
+            return
+
+        loop = asyncio.get_running_loop()
+        loop.call_later(self.window_seconds, self.forget, key, flight)
+
+    def forget(self, key: t.Hashable, flight: asyncio.Future[t.Any]) -> None:
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+
+    def clear(self) -> None:
+        self.flights.clear()
+
+
+flights = SingleFlight(window_seconds=config.SINGLE_FLIGHT_WINDOW_SECONDS)
+
+
+@metrics.registry.add_collector
+async def collect_flights() -> None:
+    single_flight_in_flight.set(len(flights.flights))
@@ -1,7 +1,9 @@
 import typing as t
+from src import tracing
 from src.db.models import base as base_models
 
 
+@tracing.trace_methods
 class BaseStore:
     async def get_counter_sequence(self, type_: base_models.CounterType) -> int:
         counter = await base_models.Counter.find_one(base_models.Counter.type == type_)
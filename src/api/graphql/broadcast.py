@@ -1,5 +1,55 @@
+import asyncio
+import logging
+import typing as t
 from broadcaster import Broadcast
-from src import config
+from pydantic import BaseModel
+from src import config, tracing
 
+logger = logging.getLogger(__name__)
 
 broadcast = Broadcast(config.PUB_SUB_URL)
+
+
+class TracedEvent(BaseModel):
+    # Trace context of the publisher, so delivering the event continues its trace
+    traceparent: t.Optional[str] = None
+
+
+async def publish(channel: str, event: TracedEvent) -> None:
+    with tracing.tracer.start_span(
+        "broadcast.publish", {"messaging.destination": channel}
+    ):
+        event.traceparent = tracing.get_traceparent()
+        await broadcast.publish(channel=channel, message=event.model_dump_json())
+
+
+async def listen(
+    channel: str,
+    handle: t.Callable[[str], t.Awaitable[None]],
+    reset: t.Callable[[], t.Awaitable[None]],
+) -> None:
+    # Events failing to be handled are logged and skipped, and failed subscriptions
+    # are renewed. Either way events were missed, so `reset` drops whatever they keep
+    # in sync. Returns once the broadcast disconnects, i.e. on shutdown
+    missed_events = False
+
+    while True:
+        try:
+            async with broadcast.subscribe(channel=channel) as subscriber:
+                if missed_events:
+                    await reset()
+                    missed_events = False
+
+                async for event in subscriber:
+                    try:
+                        await handle(event.message)
+                    except Exception:
+                        logger.exception("Failed to handle an event of %s", channel)
+                        await reset()
+
+            return
+        except Exception:
+            logger.exception("Subscription to %s failed", channel)
+            missed_events = True
+
+        await asyncio.sleep(config.PUB_SUB_RETRY_SECONDS)
@@ -0,0 +1,222 @@
+import typing as t
+from collections import OrderedDict, deque
+from src import config, metrics
+from src.api.graphql.base import caches as base_caches
+from src.api.graphql.messages import events
+from src.db.models import message as message_models
+
+recent_message_hits = metrics.registry.register(
+    metrics.Counter(
+        "chatql_recent_messages_hits_total", "First pages served from the buffers"
+    )
+)
+recent_message_misses = metrics.registry.register(
+    metrics.Counter(
+        "chatql_recent_messages_misses_total", "First pages not in the buffers"
+    )
+)
+recent_message_size = metrics.registry.register(
+    metrics.Gauge("chatql_recent_messages_size", "Messages held in the buffers")
+)
+
+
+class RecentMessageCache:
+    def __init__(self, channel_size: int, max_messages: int) -> None:
+        self.channel_size = channel_size
+        self.max_messages = max_messages
+        self.size = 0
+        # Buffers are kept oldest to newest and ordered by last use for LRU eviction
+        self.buffers: OrderedDict[str, deque[message_models.Message]] = OrderedDict()
+        # Channels whose whole history fits in their buffer
+        self.complete_channels: set[str] = set()
+        # Channel ID -> [writes seen, ongoing fills] while a read is filling its buffer
+        self.fills: dict[str, list[int]] = {}
+
+    def get(
+        self, channel_id: str, limit: int
+    ) -> t.Optional[list[message_models.Message]]:
+        buffer = self.buffers.get(channel_id)
+
+        if buffer is None or (
+            len(buffer) < limit and channel_id not in self.complete_channels
+        ):
+            recent_message_misses.inc()
+            return None
+
+        recent_message_hits.inc()
+        self.buffers.move_to_end(channel_id)
+        return list(reversed(buffer))[:limit]
+
+    def has_message(self, channel_id: str, message_id: str) -> bool:
+        buffer = self.buffers.get(channel_id, deque())
+        return any(str(message.id) == message_id for message in buffer)
+
+    def begin_fill(self, channel_id: str) -> int:
+        state = self.fills.setdefault(channel_id, [0, 0])
+        state[1] += 1
+        return state[0]
+
+    def end_fill(self, channel_id: str) -> None:
+        state = self.fills[channel_id]
+        state[1] -= 1
+
+        if not state[1]:
+            del self.fills[channel_id]
+
+    def fill(
+        self,
+        channel_id: str,
+        version: int,
+        messages: list[message_models.Message],
+        limit: int,
+    ) -> None:
+        # `messages` is the first page of the channel, newest first. It's discarded if
+        # a message was added while it was being read, as it may be missing from the page
+        if self.fills[channel_id][0] != version:
+            return
+
+        self.discard(channel_id)
+        buffer = deque(reversed(messages[: self.channel_size]))
+        self.buffers[channel_id] = buffer
+        self.size += len(buffer)
+
+        if len(messages) < limit and len(messages) <= self.channel_size:
+            self.complete_channels.add(channel_id)
+
+        self.evict()
+
+    def notify_write(self, channel_id: str) -> None:
+        if channel_id in self.fills:
+            self.fills[channel_id][0] += 1
+
+    def add(self, message: message_models.Message) -> None:
+        channel_id = events.get_channel_id(message)
+        self.notify_write(channel_id)
+        buffer = self.buffers.get(channel_id)
+
+        if buffer is None or self.has_message(channel_id, str(message.id)):
+            return
+
+        # Messages may be committed out of sequence order, so insert in place
+        index = len(buffer)
+
+        while index and buffer[index - 1].sequence > message.sequence:
+            index -= 1
+
+        buffer.insert(index, message)
+        self.size += 1
+        self.buffers.move_to_end(channel_id)
+
+        if len(buffer) > self.channel_size:
+            buffer.popleft()
+            self.size -= 1
+            self.complete_channels.discard(channel_id)
+
+        self.evict()
+
+    def invalidate(self, channel_id: str) -> None:
+        # Buffered messages embed their channel, so they're dropped when it changes,
+        # along with the pages being read into them
+        self.discard(channel_id)
+        self.notify_write(channel_id)
+
+    def discard(self, channel_id: str) -> None:
+        buffer = self.buffers.pop(channel_id, None)
+        self.complete_channels.discard(channel_id)
+
+        if buffer is not None:
+            self.size -= len(buffer)
+
+    def evict(self) -> None:
+        while self.size > self.max_messages:
+            channel_id = next(iter(self.buffers))
+            self.discard(channel_id)
+
+    def reset(self) -> None:
+        # New messages may have been missed, so every buffer is dropped, along with
+        # the pages being read into them
+        for channel_id in list(self.buffers):
+            self.discard(channel_id)
+
+        for channel_id in self.fills:
+            self.notify_write(channel_id)
+
+    def clear(self) -> None:
+        self.buffers.clear()
+        self.complete_channels.clear()
+        self.fills.clear()
+        self.size = 0
+
+
+recent_messages = RecentMessageCache(
+    channel_size=config.RECENT_MESSAGES_CHANNEL_SIZE,
+    max_messages=config.RECENT_MESSAGES_MAX_SIZE,
+)
+
+
+@metrics.registry.add_collector
+async def collect_recent_messages() -> None:
+    recent_message_size.set(recent_messages.size)
+
+
+def get_member_ids(channel: message_models.Channel) -> frozenset[str]:
+    return frozenset(str(member_id) for member_id in channel.member_ids)
+
+
+class ChannelMembersIndex:
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.members: OrderedDict[str, frozenset[str]] = OrderedDict()
+        # Bumped on every discard, so members read before a change aren't stored
+        self.version = 0
+
+    def get(self, channel_id: str) -> t.Optional[frozenset[str]]:
+        member_ids = self.members.get(channel_id)
+
+        if member_ids is not None:
+            self.members.move_to_end(channel_id)
+
+        return member_ids
+
+    def set(self, channel_id: str, member_ids: frozenset[str], version: int) -> None:
+        if version != self.version:
+            return
+
+        self.members[channel_id] = member_ids
+        self.members.move_to_end(channel_id)
+
+        while len(self.members) > self.max_size:
+            self.members.popitem(last=False)
+
+    def discard(self, channel_id: str) -> None:
+        self.version += 1
+        self.members.pop(channel_id, None)
+
+    def clear(self) -> None:
+        self.version += 1
+        self.members.clear()
+
+
+channel_members = ChannelMembersIndex(max_size=config.CHANNEL_MEMBERS_INDEX_MAX_SIZE)
+
+
+def evict_channel(channel_id: str) -> None:
+    channel_members.discard(channel_id)
+    recent_messages.invalidate(channel_id)
+
+
+def reset_channels() -> None:
+    channel_members.clear()
+    recent_messages.reset()
+
+
+# Channels are cached along with their members and recent messages. Invalidating a
+# channel also drops its members from the index and its buffered messages, and
+# resetting the cache every channel's
+channels = base_caches.EntityCache(
+    "channels",
+    message_models.Channel,
+    base_caches.make_backend("channels"),
+    on_evict=evict_channel,
+    on_reset=reset_channels,
+)
@@ -0,0 +1,27 @@
+from src.api.graphql.broadcast import TracedEvent
+from src.db.models import message as message_models
+
+NEW_MESSAGE_CHANNEL = "messages"
+
+
+def get_channel_id(message: message_models.Message) -> str:
+    channel = message.channel
+
+    if isinstance(channel, message_models.Channel):
+        return str(channel.id)
+
+    return str(channel.ref.id)
+
+
+class NewMessageEvent(TracedEvent):
+    message_id: str
+    channel_id: str
+    sequence: int
+
+    @classmethod
+    def from_message(cls, message: message_models.Message) -> "NewMessageEvent":
+        return cls(
+            message_id=str(message.id),
+            channel_id=get_channel_id(message),
+            sequence=message.sequence,
+        )
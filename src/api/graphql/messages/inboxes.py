@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import typing as t
+from datetime import timedelta
+from beanie import PydanticObjectId
+from beanie.operators import In
+from beanie.odm.queries.find import FindOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+from src import config, metrics, utils
+from src.api.graphql.messages import caches, events
+from src.db.models import base as base_models
+from src.db.models import message as message_models
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+written_entries = metrics.registry.register(
+    metrics.Counter("chatql_inbox_entries_written_total", "Inbox entries written")
+)
+failed_entries = metrics.registry.register(
+    metrics.Counter("chatql_inbox_entries_failed_total", "Inbox entries not written")
+)
+next_fanned_out_sequence = metrics.registry.register(
+    metrics.Gauge("chatql_inbox_next_sequence", "Next message sequence to fan out")
+)
+
+
+def is_fanned_out(channel: message_models.Channel) -> bool:
+    # Larger channels are read on demand instead of copied to every member's inbox
+    if channel.external_members:
+        return False
+
+    return channel.count_members() <= config.INBOX_MAX_CHANNEL_MEMBERS
+
+
+def make_entries(
+    message: message_models.Message, member_ids: t.Iterable[str]
+) -> list[message_models.InboxEntry]:
+    channel_id = PydanticObjectId(events.get_channel_id(message))
+    return [
+        message_models.InboxEntry(
+            user_id=PydanticObjectId(member_id),
+            sequence=message.sequence,
+            message_id=message.id,
+            channel_id=channel_id,
+        )
+        for member_id in member_ids
+    ]
+
+
+def get_counter_query() -> FindOne[base_models.Counter]:
+    return base_models.Counter.find_one(
+        base_models.Counter.type == base_models.CounterType.INBOX
+    )
+
+
+async def get_next_sequence() -> int:
+    # Messages from this sequence on may be missing from inboxes, so they're read
+    # from the messages instead
+    counter = await get_counter_query()
+    return counter.next_value if counter else 1
+
+
+class InboxWorker:
+    def __init__(self, batch_size: int) -> None:
+        self.batch_size = batch_size
+        self.next_sequence: t.Optional[int] = None
+
+    async def write(self, entries: list[message_models.InboxEntry]) -> bool:
+        try:
+            await message_models.InboxEntry.insert_many(entries, ordered=False)
+        except BulkWriteError as error:
+            # Entries written by an earlier attempt or another instance are kept
+            write_errors = error.details.get("writeErrors", [])
+            failed_count = sum(
+                1 for _ in write_errors if _.get("code") != DUPLICATE_KEY_ERROR
+            )
+            written_entries.inc(amount=len(entries) - len(write_errors))
+            failed_entries.inc(amount=failed_count)
+            return not failed_count
+        except PyMongoError:
+            failed_entries.inc(amount=len(entries))
+            return False
+
+        written_entries.inc(amount=len(entries))
+        return True
+
+    async def get_channels(
+        self, messages: list[message_models.Message]
+    ) -> dict[str, message_models.Channel]:
+        channel_ids = {PydanticObjectId(events.get_channel_id(_)) for _ in messages}
+        channels = await message_models.Channel.find(
+            In(message_models.Channel.id, list(channel_ids)),  # type: ignore[no-untyped-call]
+        ).to_list()
+        return {str(channel.id): channel for channel in channels}
+
+    async def fan_out(self, next_sequence: int) -> int:
+        # Follows messages in sequence order, only once they're old enough for any
+        # earlier sequence to have been written
+        settled_before = utils.now() - timedelta(
+            seconds=config.INBOX_WRITE_DELAY_SECONDS
+        )
+        messages: list[message_models.Message] = []
+
+        for data in await base_models.find_raw(
+            message_models.Message.find(
+                message_models.Message.sequence >= next_sequence
+            )
+            .sort(+message_models.Message.sequence)
+            .limit(self.batch_size)
+        ):
+            if data["_id"].generation_time > settled_before:
+                break
+
+            messages.append(message_models.Message.from_db(data))
+
+        if not messages:
+            return next_sequence
+
+        channels = await self.get_channels(messages)
+        entries: list[message_models.InboxEntry] = []
+
+        for message in messages:
+            channel = channels.get(events.get_channel_id(message))
+
+            if channel and is_fanned_out(channel):
+                entries += make_entries(message, caches.get_member_ids(channel))
+
+        # Retried from the same sequence until written
+        if entries and not await self.write(entries):
+            return next_sequence
+
+        next_sequence = messages[-1].sequence + 1
+        await get_counter_query().update({"$max": {"next_value": next_sequence}})
+        return next_sequence
+
+    async def backfill(self, channel: message_models.Channel, user_id: str) -> None:
+        # History of a joined channel, newer messages are fanned out to its members
+        sequence = 0
+
+        while True:
+            messages = [
+                message_models.Message.from_db(data)
+                for data in await base_models.find_raw(
+                    message_models.Message.find(
+                        message_models.Message.channel.id == channel.id,
+                        message_models.Message.sequence > sequence,
+                    )
+                    .sort(+message_models.Message.sequence)
+                    .limit(self.batch_size)
+                )
+            ]
+
+            if not messages:
+                return
+
+            entries = [
+                entry
+                for message in messages
+                for entry in make_entries(message, [user_id])
+            ]
+
+            if not await self.write(entries):
+                logger.error("Failed to backfill the inbox of %s", user_id)
+                return
+
+            sequence = messages[-1].sequence
+
+    async def start(self) -> int:
+        counter = await get_counter_query()
+
+        if counter:
+            return counter.next_value
+
+        # Starts from new messages, older ones are read from the messages
+        message_counter = await base_models.Counter.find_one(
+            base_models.Counter.type == base_models.CounterType.MESSAGE
+        )
+        next_sequence: int = message_counter.next_value if message_counter else 1
+
+        try:
+            await base_models.Counter(
+                type=base_models.CounterType.INBOX, next_value=next_sequence
+            ).insert()
+        except DuplicateKeyError:  # Started by another instance meanwhile
+            return await get_next_sequence()
+
+        return next_sequence
+
+    async def run(self) -> None:
+        try:
+            while True:
+                try:
+                    if self.next_sequence is None:
+                        self.next_sequence = await self.start()
+
+                    # Picks up the progress of other instances
+                    next_sequence = max(self.next_sequence, await get_next_sequence())
+                    self.next_sequence = await self.fan_out(next_sequence)
+                    caught_up = self.next_sequence - next_sequence < self.batch_size
+                except PyMongoError:
+                    logger.exception("Failed to fan out messages to inboxes")
+                    caught_up = True
+
+                if caught_up:
+                    await asyncio.sleep(config.INBOX_WRITE_DELAY_SECONDS)
+        finally:
+            self.next_sequence = None
+
+
+inbox_worker = InboxWorker(batch_size=config.INBOX_WRITE_BATCH_SIZE)
+
+
+async def get_fanned_out_sequence() -> int:
+    # Kept by the worker once per tick, so pages don't read the counter themselves
+    if inbox_worker.next_sequence is not None:
+        return inbox_worker.next_sequence
+
+    return await get_next_sequence()
+
+
+@metrics.registry.add_collector
+async def collect_inbox_worker() -> None:
+    if inbox_worker.next_sequence is not None:
+        next_fanned_out_sequence.set(inbox_worker.next_sequence)
@@ -0,0 +1,34 @@
+from beanie import PydanticObjectId
+from src import tracing
+from src.api.graphql import broadcast
+from src.api.graphql.messages import caches, events, stores
+
+
+async def add_recent_message(message: str) -> None:
+    cache = caches.recent_messages
+    new_message = events.NewMessageEvent.model_validate_json(message)
+    cache.notify_write(new_message.channel_id)
+
+    if new_message.channel_id not in cache.buffers or cache.has_message(
+        new_message.channel_id, new_message.message_id
+    ):
+        return
+
+    with tracing.tracer.start_span(
+        "broadcast.deliver", traceparent=new_message.traceparent
+    ):
+        store = stores.MessageStore()
+        db_message = await store.load_message(PydanticObjectId(new_message.message_id))
+
+    if db_message:
+        cache.add(db_message)
+
+
+async def reset_recent_messages() -> None:
+    caches.recent_messages.reset()
+
+
+async def sync_recent_messages() -> None:
+    await broadcast.listen(
+        events.NEW_MESSAGE_CHANNEL, add_recent_message, reset_recent_messages
+    )
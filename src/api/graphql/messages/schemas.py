@@ -4,7 +4,9 @@ from datetime import datetime
 from beanie import PydanticObjectId
 from bson.errors import InvalidId
 from src.api.graphql import schemas
+from src.api.graphql.messages import stores
 from src.api.graphql.users import schemas as user_schemas
+from src.api.graphql.users import stores as user_stores
 from src.db.models import user as user_models
 from src.db.models import message as message_models
 
@@ -28,13 +30,8 @@ class CreateMessageInput(schemas.ApiInput):
         return None
 
     async def validate_channel_id(self) -> t.Optional[schemas.ApiError]:
-        try:
-            self.channel = await message_models.Channel.find_one(
-                message_models.Channel.id == PydanticObjectId(self.channelId),
-                fetch_links=True,
-            )
-        except InvalidId:
-            pass
+        store = stores.MessageStore()
+        self.channel = await store.get_channel(str(self.channelId))
 
         if not self.channel:
             return schemas.ApiError(
@@ -89,31 +86,95 @@ class CreateMessageInput(schemas.ApiInput):
         return filtered_errors
 
 
+@strawberry.input
+class ChannelInput(schemas.ApiInput):
+    channelId: str
+    channel: strawberry.Private[t.Optional[message_models.Channel]] = None
+
+    async def validate_channel_id(self) -> t.Optional[schemas.ApiError]:
+        store = stores.MessageStore()
+        self.channel = await store.get_channel(self.channelId)
+
+        if not self.channel:
+            return schemas.ApiError(
+                code=schemas.ErrorEnum.CHANNEL_NOT_FOUND,
+                title="Channel not found",
+                source=schemas.ApiErrorSource(pointer="/channelId"),
+            )
+
+        return None
+
+    async def validate(self) -> list[schemas.ApiError]:
+        channel_id_error = await self.validate_channel_id()
+        errors = [channel_id_error]
+        filtered_errors = [_ for _ in errors if _]
+        return filtered_errors
+
+
+@strawberry.input
+class ChannelMemberInput(ChannelInput):
+    userId: str
+    user: strawberry.Private[t.Optional[user_models.User]] = None
+
+    async def validate_user_id(self) -> t.Optional[schemas.ApiError]:
+        store = user_stores.UserStore()
+        self.user = await store.get_user(self.userId)
+
+        if not self.user:
+            return schemas.ApiError(
+                code=schemas.ErrorEnum.USER_NOT_FOUND,
+                title="User not found",
+                source=schemas.ApiErrorSource(pointer="/userId"),
+            )
+
+        return None
+
+    async def validate(self) -> list[schemas.ApiError]:
+        channel_id_error = await self.validate_channel_id()
+        user_id_error = await self.validate_user_id()
+        errors = [channel_id_error, user_id_error]
+        filtered_errors = [_ for _ in errors if _]
+        return filtered_errors
+
+
 @strawberry.type
 class Channel:
+    __slots__ = ("id", "createdAt", "updatedAt", "memberCount", "channel")
+
     id: str
     createdAt: datetime
     updatedAt: datetime
-    members: list[user_schemas.User]
+    memberCount: int
+    channel: strawberry.Private[message_models.Channel]
 
     def __init__(self, channel: message_models.Channel) -> None:
         self.id = str(channel.id)
         self.createdAt = channel.created_at
         self.updatedAt = channel.updated_at
-        self.members = []
+        self.memberCount = channel.count_members()
+        self.channel = channel
 
-        for member in channel.members:
-            if not isinstance(member, user_models.User):
-                raise RuntimeError("Failed to prefetch channel's members")
-
-            user = t.cast(user_models.User, member)
-            self.members.append(user_schemas.User(user))
-
-        self.members.sort(key=lambda member: member.id)
+    @strawberry.field
+    async def members(
+        self, limit: int = 100, after: t.Optional[str] = None
+    ) -> list[user_schemas.User]:
+        store = stores.MessageStore()
+        members = await store.get_channel_members(self.channel, limit, after)
+        return [user_schemas.User(member) for member in members]
 
 
 @strawberry.type
 class Message:
+    __slots__ = (
+        "id",
+        "createdAt",
+        "updatedAt",
+        "channel",
+        "sender",
+        "content",
+        "sequence",
+    )
+
     id: str
     createdAt: datetime
     updatedAt: datetime
@@ -135,6 +196,10 @@ class Message:
         channel = t.cast(message_models.Channel, message.channel)
         self.channel = Channel(channel)
 
+        if message.sender_snapshot:
+            self.sender = user_schemas.User(message.sender_snapshot)
+            return
+
         if not isinstance(message.sender, user_models.User):
             raise RuntimeError("Failed to prefetch message's sender")
 
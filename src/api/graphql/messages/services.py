@@ -1,9 +1,11 @@
 import typing as t
 from src.api.graphql import schemas
-from src.api.graphql.broadcast import broadcast
+from src.api.graphql import broadcast
+from src.api.graphql.messages import events
 from src.api.graphql.messages import schemas as message_schemas
 from src.api.graphql.messages import stores
 from src.db.models import user as user_models
+from src.db.models import message as message_models
 
 
 class MessageService:
@@ -20,10 +22,9 @@ class MessageService:
             recipients += [sender]
             channel = await self.store.get_or_create_channel(recipients)
 
-        channel_members = t.cast(list[user_models.User], channel.members)
-        channel_member_ids = [member.id for member in channel_members]
+        channel_member_ids = await self.store.get_channel_member_ids(str(channel.id))
 
-        if sender.id not in channel_member_ids:
+        if str(sender.id) not in channel_member_ids:
             error = schemas.ApiError(
                 code=schemas.ErrorEnum.MESSAGE_SENDER_NOT_IN_CHANNEL,
                 title="Sender is not part of selected channel",
@@ -31,6 +32,52 @@ class MessageService:
             return schemas.ApiResponse(errors=[error])
 
         message = await self.store.create_message(sender, channel, payload.content)
-        await broadcast.publish(channel="messages", message=str(message.id))
+        event = events.NewMessageEvent.from_message(message)
+        await broadcast.publish(events.NEW_MESSAGE_CHANNEL, event)
         data = message_schemas.Message(message)
         return schemas.ApiResponse(data=data)
+
+    async def check_member(
+        self, user: user_models.User, channel: message_models.Channel
+    ) -> t.Optional[schemas.ApiError]:
+        channel_member_ids = await self.store.get_channel_member_ids(str(channel.id))
+
+        if str(user.id) not in channel_member_ids:
+            return schemas.ApiError(
+                code=schemas.ErrorEnum.USER_NOT_IN_CHANNEL,
+                title="User is not part of selected channel",
+                source=schemas.ApiErrorSource(pointer="/channelId"),
+            )
+
+        return None
+
+    async def add_channel_member(
+        self, user: user_models.User, payload: message_schemas.ChannelMemberInput
+    ) -> schemas.ApiResponse[message_schemas.Channel]:
+        channel = t.cast(message_models.Channel, payload.channel)
+        error = await self.check_member(user, channel)
+
+        if error:
+            return schemas.ApiResponse(errors=[error])
+
+        member = t.cast(user_models.User, payload.user)
+        await self.store.add_channel_member(channel, member)
+        return await self.get_channel(channel)
+
+    async def leave_channel(
+        self, user: user_models.User, payload: message_schemas.ChannelInput
+    ) -> schemas.ApiResponse[message_schemas.Channel]:
+        channel = t.cast(message_models.Channel, payload.channel)
+        error = await self.check_member(user, channel)
+
+        if error:
+            return schemas.ApiResponse(errors=[error])
+
+        await self.store.remove_channel_member(channel, user)
+        return await self.get_channel(channel)
+
+    async def get_channel(
+        self, channel: message_models.Channel
+    ) -> schemas.ApiResponse[message_schemas.Channel]:
+        updated_channel = await self.store.get_channel(str(channel.id)) or channel
+        return schemas.ApiResponse(data=message_schemas.Channel(updated_channel))
@@ -1,16 +1,27 @@
 import typing as t
 from bson.errors import InvalidId
 from beanie import PydanticObjectId
-from beanie.operators import In
+from beanie.operators import And, In, Or
 from beanie.exceptions import RevisionIdWasChanged
+from beanie.odm.queries.find import FindMany
+import pymongo
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from src import config, tracing, utils
 from src.api.graphql.base import stores as base_stores
+from src.api.graphql.base.singleflight import flights
+from src.api.graphql.messages import caches, events, inboxes
+from src.api.graphql.users import caches as user_caches
+from src.api.graphql.users import stores as user_stores
 from src.db.models import base as base_models
 from src.db.models import user as user_models
 from src.db.models import message as message_models
 
 
+@tracing.trace_methods
 class MessageStore:
     MAX_CREATE_MESSAGE_ATTEMPTS = 10
+    REPLAY_BATCH_SIZE = 100
+    STREAM_MAX_LIMIT = 1000
 
     async def get_or_create_channel(
         self,
@@ -28,22 +39,271 @@ class MessageStore:
 
         deduped_members.sort(key=lambda member: str(member.id))
         deduped_member_ids = [member.id for member in deduped_members]
-        channels = (
-            await message_models.Channel.find(fetch_links=True).sort("id").to_list()
+        # The channel with exactly these members, found through the member IDs index
+        members_query = {"$size": len(deduped_member_ids), "$all": deduped_member_ids}
+        db_channel: t.Optional[message_models.Channel] = (
+            await message_models.Channel.find(
+                {"member_ids": members_query}
+            ).first_or_none()
         )
 
-        for channel in channels:
-            channel_members = channel.members
-            channel_members.sort(key=lambda member: str(member.id))
-            channel_member_ids = [member.id for member in channel_members]
+        if db_channel:
+            return db_channel
 
-            if channel_member_ids == deduped_member_ids:
-                return channel
+        version = caches.channel_members.version
+        channel: message_models.Channel = message_models.Channel.from_users(
+            deduped_members
+        )
+        await channel.save()
+        member_ids = caches.get_member_ids(channel)
+        caches.channel_members.set(str(channel.id), member_ids, version)
+
+        for member in deduped_members:  # Their channel lists changed
+            await user_caches.users.invalidate(str(member.id))
 
-        channel = message_models.Channel(members=deduped_members)
-        channel = await channel.save()
         return channel
 
+    async def get_channel(self, channel_id: str) -> t.Optional[message_models.Channel]:
+        try:
+            object_id = PydanticObjectId(channel_id)
+        except InvalidId:
+            return None
+
+        key = str(object_id)
+
+        async def load_channel() -> t.Optional[message_models.Channel]:
+            return await message_models.Channel.get(object_id)
+
+        async def load_shared_channel() -> t.Optional[message_models.Channel]:
+            return await flights.do(("channel", key), load_channel)
+
+        return await caches.channels.get(key, load_shared_channel)
+
+    async def get_channel_member_ids(self, channel_id: str) -> frozenset[str]:
+        member_ids = caches.channel_members.get(channel_id)
+
+        if member_ids is not None:
+            return member_ids
+
+        version = caches.channel_members.version
+        channel = await self.get_channel(channel_id)
+
+        if not channel:
+            return frozenset()
+
+        if channel.external_members:
+            db_member_ids = await channel.get_member_ids()
+            member_ids = frozenset(str(member_id) for member_id in db_member_ids)
+        else:
+            member_ids = caches.get_member_ids(channel)
+
+        caches.channel_members.set(channel_id, member_ids, version)
+        return member_ids
+
+    async def get_channel_members(
+        self,
+        channel: message_models.Channel,
+        limit: int,
+        after: t.Optional[str] = None,
+    ) -> list[user_models.UserSummary]:
+        # Members are paginated in ID order
+        limit = min(max(limit, 1), 100)
+
+        if not channel.external_members:
+            members = [_ for _ in channel.members if not after or str(_.id) > after]
+            members.sort(key=lambda member: str(member.id))
+            return members[:limit]
+
+        memberships = message_models.ChannelMember.find(
+            message_models.ChannelMember.channel_id == channel.id
+        )
+
+        if after:
+            try:
+                after_id = PydanticObjectId(after)
+                memberships = memberships.find(
+                    message_models.ChannelMember.user_id > after_id
+                )
+            except InvalidId:
+                pass
+
+        user_ids = [
+            membership.user_id
+            for membership in await memberships.sort(
+                +message_models.ChannelMember.user_id
+            )
+            .limit(limit)
+            .to_list()
+        ]
+        users = await base_models.find_raw(
+            user_models.User.find(
+                In(user_models.User.id, user_ids)  # type: ignore[no-untyped-call]
+            )
+        )
+        users.sort(key=lambda user: str(user["_id"]))
+        return [
+            user_models.UserSummary.from_user(user_models.User.from_db(user))
+            for user in users
+        ]
+
+    async def invalidate_membership(
+        self, channel: message_models.Channel, user: user_models.User
+    ) -> None:
+        await caches.channels.invalidate(str(channel.id))
+        await user_caches.users.invalidate(str(user.id))  # Their channel IDs changed
+
+    async def update_user_channel_ids(
+        self, user: user_models.User, operator: str, channel_id: t.Any
+    ) -> None:
+        await user_models.User.find_one(user_models.User.id == user.id).update(
+            {operator: {"channel_ids": channel_id}}
+        )
+
+    async def record_member_removal(
+        self, channel: message_models.Channel, user: user_models.User
+    ) -> None:
+        # Delta sync tells the user, who can't see the channel anymore, and the
+        # remaining members
+        await message_models.Tombstone(
+            entity=message_models.TombstoneEntity.MEMBER,
+            entity_id=user.id,
+            channel_id=channel.id,
+            member_ids=[user.id],
+        ).insert()
+
+    async def add_channel_member(
+        self, channel: message_models.Channel, user: user_models.User
+    ) -> bool:
+        channel_query = message_models.Channel.find_one(
+            message_models.Channel.id == channel.id
+        )
+
+        if not channel.external_members:
+            member_ids = list(channel.member_ids)
+
+            if user.id in member_ids:
+                return False
+
+            if len(member_ids) < config.CHANNEL_EMBEDDED_MEMBERS_MAX:
+                await message_models.Channel.find_one(
+                    message_models.Channel.id == channel.id,
+                    {"member_ids": {"$ne": user.id}},  # Unless joined meanwhile
+                ).update(
+                    {
+                        "$addToSet": {"member_ids": user.id},
+                        "$push": {"members": user_models.UserSummary.from_user(user)},
+                        "$set": {"updated_at": utils.now()},
+                    }
+                )
+                await self.update_user_channel_ids(user, "$addToSet", channel.id)
+                await self.invalidate_membership(channel, user)
+
+                if config.INBOX_TIMELINE_ENABLED and inboxes.is_fanned_out(channel):
+                    await inboxes.inbox_worker.backfill(channel, str(user.id))
+
+                return True
+
+            # Grown too large to embed, so every member moves to its own document
+            member_ids.append(t.cast(PydanticObjectId, user.id))
+            memberships = [
+                message_models.ChannelMember(channel_id=channel.id, user_id=user_id)
+                for user_id in member_ids
+            ]
+
+            try:
+                await message_models.ChannelMember.insert_many(
+                    memberships, ordered=False
+                )
+            except BulkWriteError as error:
+                # Members already moved by a concurrent join are kept
+                write_errors = error.details.get("writeErrors", [])
+
+                if any(
+                    _.get("code") != inboxes.DUPLICATE_KEY_ERROR for _ in write_errors
+                ):
+                    raise
+
+            # Counted once moved, so concurrent joins don't overwrite each other
+            member_count = await message_models.ChannelMember.find(
+                message_models.ChannelMember.channel_id == channel.id
+            ).count()
+            await channel_query.update(
+                {
+                    "$set": {
+                        "member_ids": [],
+                        "members": [],
+                        "external_members": True,
+                        "member_count": member_count,
+                        "updated_at": utils.now(),
+                    }
+                }
+            )
+            await self.update_user_channel_ids(user, "$addToSet", channel.id)
+            await self.invalidate_membership(channel, user)
+            return True
+
+        try:
+            membership = message_models.ChannelMember(
+                channel_id=channel.id, user_id=user.id
+            )
+            await membership.insert()
+        except DuplicateKeyError:
+            return False
+
+        await channel_query.update(
+            {"$inc": {"member_count": 1}, "$set": {"updated_at": utils.now()}}
+        )
+        await self.update_user_channel_ids(user, "$addToSet", channel.id)
+        await self.invalidate_membership(channel, user)
+        return True
+
+    async def remove_channel_member(
+        self, channel: message_models.Channel, user: user_models.User
+    ) -> bool:
+        channel_query = message_models.Channel.find_one(
+            message_models.Channel.id == channel.id
+        )
+
+        if not channel.external_members:
+            member_ids = list(channel.member_ids)
+
+            if user.id not in member_ids:
+                return False
+
+            await channel_query.update(
+                {
+                    "$pull": {"member_ids": user.id, "members": {"id": user.id}},
+                    "$set": {"updated_at": utils.now()},
+                }
+            )
+            await self.update_user_channel_ids(user, "$pull", channel.id)
+            await self.record_member_removal(channel, user)
+            await self.invalidate_membership(channel, user)
+            return True
+
+        result = await message_models.ChannelMember.find(
+            message_models.ChannelMember.channel_id == channel.id,
+            message_models.ChannelMember.user_id == user.id,
+        ).delete()
+
+        if not result or not result.deleted_count:
+            return False
+
+        await channel_query.update(
+            {"$inc": {"member_count": -1}, "$set": {"updated_at": utils.now()}}
+        )
+        await self.update_user_channel_ids(user, "$pull", channel.id)
+        await self.record_member_removal(channel, user)
+        await self.invalidate_membership(channel, user)
+        return True
+
+    async def get_user_channels(
+        self, user: user_models.User
+    ) -> list[message_models.Channel]:
+        return await message_models.Channel.find(
+            In(message_models.Channel.id, user.channel_ids),  # type: ignore[no-untyped-call]
+        ).to_list()
+
     async def create_message(
         self, sender: user_models.User, channel: message_models.Channel, content: str
     ) -> message_models.Message:
@@ -61,6 +321,7 @@ class MessageStore:
                     sequence=message_sequence,
                 )
                 message = await message.save()
+                caches.recent_messages.add(message)
                 return message
             except (
                 RevisionIdWasChanged
@@ -69,30 +330,80 @@ class MessageStore:
 
         raise RevisionIdWasChanged()
 
-    async def get_message(
-        self, message_id: str, user_id: str
+    async def resolve_message(
+        self, message: message_models.Message
     ) -> t.Optional[message_models.Message]:
-        try:
-            message = await message_models.Message.find_one(
-                message_models.Message.id == PydanticObjectId(message_id),
-                fetch_links=True,
-            )
+        # Channel and sender are taken from their caches instead of being looked up
+        channel = await self.get_channel(events.get_channel_id(message))
+
+        if not channel:
+            return None
 
-            if not message:
+        if message.sender_snapshot is None:  # Older messages look their sender up
+            sender_id = message_models.get_link_id(message.sender)
+            user_store = user_stores.UserStore()
+            sender = await user_store.get_user(str(sender_id))
+
+            if not sender:
                 return None
 
-            message = t.cast(message_models.Message, message)
-            channel = t.cast(message_models.Channel, message.channel)
-            members = t.cast(list[user_models.User], channel.members)
-            channel_members = [str(member.id) for member in members]
+            message.sender = sender
 
-            if user_id in channel_members:
-                return message
+        message.channel = channel
+        return message
+
+    async def resolve_messages(
+        self, documents: list[dict[str, t.Any]]
+    ) -> list[message_models.Message]:
+        resolved_messages: list[message_models.Message] = []
+
+        for data in documents:
+            message: message_models.Message = message_models.Message.from_db(data)
+            resolved_message = await self.resolve_message(message)
+
+            if resolved_message:
+                resolved_messages.append(resolved_message)
+
+        return resolved_messages
 
+    async def find_messages(
+        self, messages: FindMany[message_models.Message]
+    ) -> list[message_models.Message]:
+        return await self.resolve_messages(await base_models.find_raw(messages))
+
+    async def load_message(
+        self, message_id: PydanticObjectId
+    ) -> t.Optional[message_models.Message]:
+        message = await message_models.Message.get(message_id)
+
+        if not message:
             return None
+
+        return await self.resolve_message(message)
+
+    async def get_message(
+        self, message_id: str, user_id: str
+    ) -> t.Optional[message_models.Message]:
+        try:
+            object_id = PydanticObjectId(message_id)
         except InvalidId:
             return None
 
+        # Every subscriber of a channel reads the same message at once
+        message = await flights.do(
+            ("message", str(object_id)), lambda: self.load_message(object_id)
+        )
+
+        if not message:
+            return None
+
+        channel_id = events.get_channel_id(message)
+
+        if user_id not in await self.get_channel_member_ids(channel_id):
+            return None
+
+        return message
+
     async def get_messages(
         self,
         user: user_models.User,
@@ -102,8 +413,7 @@ class MessageStore:
         content: t.Optional[str] = None,
         last_sequence: t.Optional[int] = None,
     ) -> list[message_models.Message]:
-        channels = t.cast(list[message_models.Channel], user.channels)
-        channel_ids = [channel.id for channel in channels]
+        channel_ids = user.channel_ids
         limit = min(max(limit, 1), 100)
         filter_channel_id: t.Optional[PydanticObjectId] = None
         filter_sender_id: t.Optional[PydanticObjectId] = None
@@ -120,6 +430,22 @@ class MessageStore:
             except InvalidId:
                 pass
 
+        is_unfiltered = not filter_channel_id and not filter_sender_id and not content
+
+        if is_unfiltered and config.INBOX_TIMELINE_ENABLED:
+            return await self.get_timeline(user, limit, last_sequence)
+
+        # The first page of a single channel can be served from its recent messages
+        is_first_page = not filter_sender_id and not content and not last_sequence
+        cacheable = is_first_page and filter_channel_id in channel_ids
+        channel_key = str(filter_channel_id)
+
+        if cacheable:
+            cached_messages = caches.recent_messages.get(channel_key, limit)
+
+            if cached_messages is not None:
+                return cached_messages
+
         messages = message_models.Message.find(
             In(message_models.Message.channel.id, channel_ids)  # type: ignore[no-untyped-call]
         ).sort(-message_models.Message.sequence)
@@ -140,5 +466,201 @@ class MessageStore:
         if content:
             messages = messages.find({"$text": {"$search": content}})
 
-        messages = messages.find(fetch_links=True).limit(limit)
-        return await messages.to_list()
+        messages = messages.limit(limit)
+
+        if not is_first_page:
+            return await self.find_messages(messages)
+
+        if not cacheable:
+            channels_key = ",".join(sorted(str(id) for id in channel_ids))
+            key = ("messages", channels_key, channel_key, limit)
+            return await flights.do(key, lambda: self.find_messages(messages))
+
+        version = caches.recent_messages.begin_fill(channel_key)
+
+        try:
+            # Identical first pages only depend on the channel once membership is known
+            db_messages = await flights.do(
+                ("channel-messages", channel_key, limit),
+                lambda: self.find_messages(messages),
+            )
+            caches.recent_messages.fill(channel_key, version, db_messages, limit)
+            return db_messages
+        finally:
+            caches.recent_messages.end_fill(channel_key)
+
+    async def stream_messages(
+        self,
+        user: user_models.User,
+        limit: int,
+        batch_size: int,
+        channel_id: t.Optional[str] = None,
+        sender_id: t.Optional[str] = None,
+        content: t.Optional[str] = None,
+        last_sequence: t.Optional[int] = None,
+    ) -> t.AsyncGenerator[list[message_models.Message], None]:
+        # The same page as `get_messages`, sent in batches as they're read, so the
+        # first ones don't wait for the rest
+        remaining = min(max(limit, 1), self.STREAM_MAX_LIMIT)
+
+        while remaining > 0:
+            messages = await self.get_messages(
+                user=user,
+                limit=min(batch_size, remaining),
+                channel_id=channel_id,
+                sender_id=sender_id,
+                content=content,
+                last_sequence=last_sequence,
+            )
+
+            if not messages:
+                return
+
+            yield messages
+            remaining -= len(messages)
+            last_sequence = messages[-1].sequence
+
+    async def get_messages_after(
+        self, user: user_models.User, sequence: int
+    ) -> t.AsyncGenerator[message_models.Message, None]:
+        # Oldest first, in batches walking the (channel, sequence) index
+        channel_ids = user.channel_ids
+
+        while True:
+            messages: list[message_models.Message] = [
+                message_models.Message.from_db(data)
+                for data in await base_models.find_raw(
+                    message_models.Message.find(
+                        In(message_models.Message.channel.id, channel_ids),  # type: ignore[no-untyped-call]
+                        message_models.Message.sequence > sequence,
+                    )
+                    .sort(+message_models.Message.sequence)
+                    .limit(self.REPLAY_BATCH_SIZE)
+                )
+            ]
+
+            for message in messages:
+                resolved_message = await self.resolve_message(message)
+
+                if resolved_message:
+                    yield resolved_message
+
+            if len(messages) < self.REPLAY_BATCH_SIZE:
+                return
+
+            sequence = messages[-1].sequence
+
+    async def exceeds_replay_limit(self, user: user_models.User, sequence: int) -> bool:
+        # Skips through at most the limit's index keys, however long ago it was
+        messages = await base_models.find_raw(
+            message_models.Message.find(
+                In(message_models.Message.channel.id, user.channel_ids),  # type: ignore[no-untyped-call]
+                message_models.Message.sequence > sequence,
+            )
+            .sort(+message_models.Message.sequence)
+            .skip(config.REPLAY_MAX_MESSAGES)
+            .limit(1)
+        )
+        return bool(messages)
+
+    async def find_inbox_entries(
+        self,
+        user: user_models.User,
+        channel_ids: list[t.Any],
+        limit: int,
+        last_sequence: t.Optional[int],
+    ) -> list[dict[str, t.Any]]:
+        # Entries along with the messages they point to, which are kept out of the
+        # inbox as they change, e.g. when sender summaries are re-synced
+        entries = message_models.InboxEntry.find(
+            message_models.InboxEntry.user_id == user.id,
+            In(message_models.InboxEntry.channel_id, channel_ids),  # type: ignore[no-untyped-call]
+        )
+
+        if last_sequence:
+            entries = entries.find(message_models.InboxEntry.sequence < last_sequence)
+
+        collection: t.Any = message_models.InboxEntry.get_motor_collection()
+        pipeline = [
+            {"$match": entries.get_filter_query()},
+            {"$sort": {"sequence": pymongo.DESCENDING}},
+            {"$limit": limit},
+            {
+                "$lookup": {
+                    "from": message_models.Message.get_collection_name(),  # type: ignore[no-untyped-call]
+                    "localField": "message_id",
+                    "foreignField": "_id",
+                    "as": "messages",
+                }
+            },
+        ]
+        documents: list[dict[str, t.Any]] = await collection.aggregate(
+            pipeline
+        ).to_list(None)
+        return documents
+
+    async def get_timeline(
+        self, user: user_models.User, limit: int, last_sequence: t.Optional[int]
+    ) -> list[message_models.Message]:
+        # Messages of fanned out channels are one range read on the user's inbox
+        channels = await self.get_user_channels(user)
+        inbox_channel_ids = [_.id for _ in channels if inboxes.is_fanned_out(_)]
+        other_channel_ids = [_.id for _ in channels if not inboxes.is_fanned_out(_)]
+        inbox_entries: list[dict[str, t.Any]] = []
+
+        # Entries of channels left since, or not fanned out anymore, are skipped
+        if inbox_channel_ids:
+            inbox_entries = await self.find_inbox_entries(
+                user, inbox_channel_ids, limit, last_sequence
+            )
+
+        messages = await self.resolve_messages(
+            [message for entry in inbox_entries for message in entry["messages"]]
+        )
+        # The rest is a single read of the messages, as one query per part would
+        # cost a round trip each
+        queries: list[t.Any] = []
+
+        if other_channel_ids:
+            queries.append(In(message_models.Message.channel.id, other_channel_ids))  # type: ignore[no-untyped-call]
+
+        # Messages the fan-out hasn't reached yet, or failed to write
+        if inbox_channel_ids:
+            fanned_out_sequence = await inboxes.get_fanned_out_sequence()
+            queries.append(
+                And(
+                    In(message_models.Message.channel.id, inbox_channel_ids),  # type: ignore[no-untyped-call]
+                    message_models.Message.sequence >= fanned_out_sequence,
+                )
+            )
+
+        # History older than the inbox, e.g. from before it was enabled, only read
+        # once the inbox runs out
+        if inbox_channel_ids and len(inbox_entries) < limit:
+            history_query: t.Any = In(message_models.Message.channel.id, inbox_channel_ids)  # type: ignore[no-untyped-call]
+
+            if inbox_entries:
+                history_query = And(
+                    history_query,
+                    message_models.Message.sequence < inbox_entries[-1]["sequence"],
+                )
+
+            queries.append(history_query)
+
+        if queries:
+            timeline_messages = message_models.Message.find(Or(*queries))
+
+            if last_sequence:
+                timeline_messages = timeline_messages.find(
+                    message_models.Message.sequence < last_sequence
+                )
+
+            messages += await self.find_messages(
+                timeline_messages.sort(-message_models.Message.sequence).limit(limit)
+            )
+
+        unique_messages = {message.id: message for message in messages}
+        timeline = sorted(
+            unique_messages.values(), key=lambda message: message.sequence, reverse=True
+        )
+        return timeline[:limit]
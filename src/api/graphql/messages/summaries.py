@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import typing as t
+from beanie import PydanticObjectId
+from pymongo.errors import PyMongoError
+from src import metrics
+from src.api.graphql.messages import caches
+from src.db.models import user as user_models
+from src.db.models import message as message_models
+
+logger = logging.getLogger(__name__)
+
+synced_channels = metrics.registry.register(
+    metrics.Counter(
+        "chatql_summaries_synced_channels_total",
+        "Channels with member summaries synced",
+    )
+)
+synced_messages = metrics.registry.register(
+    metrics.Counter(
+        "chatql_summaries_synced_messages_total",
+        "Messages with sender summaries synced",
+    )
+)
+failed_users = metrics.registry.register(
+    metrics.Counter(
+        "chatql_summaries_failed_users_total", "Users whose summaries failed to sync"
+    )
+)
+queued_users = metrics.registry.register(
+    metrics.Gauge("chatql_summaries_queued_users", "Users waiting for a summary sync")
+)
+
+
+class UserSummaryWorker:
+    # Rewrites the summaries of users who changed, embedded in channels as members
+    # and in messages as senders, outside of requests. Users are submitted by the
+    # worker changing them, so each rewrite runs once
+    def __init__(self) -> None:
+        self.queue: t.Optional[asyncio.Queue[str]] = None
+        self.pending_user_ids: set[str] = set()
+
+    def submit(self, user_id: str) -> bool:
+        if not self.queue or user_id in self.pending_user_ids:
+            return False
+
+        self.pending_user_ids.add(user_id)
+        self.queue.put_nowait(user_id)
+        return True
+
+    async def sync(self, user_id: str) -> None:
+        user = await user_models.User.get(PydanticObjectId(user_id))
+
+        if not user:
+            return
+
+        # Only summaries older than the user are rewritten
+        summary = user_models.UserSummary.from_user(user)
+        stale_summary = {"id": summary.id, "updated_at": {"$lt": summary.updated_at}}
+        channels_filter = {"members": {"$elemMatch": stale_summary}}
+        messages_filter = {
+            "sender_snapshot.id": summary.id,
+            "sender_snapshot.updated_at": stale_summary["updated_at"],
+        }
+        channel_ids = set(await message_models.Channel.distinct("_id", channels_filter))
+        channel_ids.update(
+            await message_models.Message.distinct("channel.$id", messages_filter)
+        )
+        channels_result = await message_models.Channel.find(channels_filter).update(
+            {"$set": {"members.$": summary}}
+        )
+        messages_result = await message_models.Message.find(messages_filter).update(
+            {"$set": {"sender_snapshot": summary}}
+        )
+        synced_channels.inc(
+            amount=channels_result.modified_count if channels_result else 0
+        )
+        synced_messages.inc(
+            amount=messages_result.modified_count if messages_result else 0
+        )
+
+        # Cached channels embed the old member summary, and their buffered messages
+        # the old sender summary, on every instance
+        for channel_id in channel_ids:
+            await caches.channels.invalidate(str(channel_id))
+
+    async def run(self) -> None:
+        queue: asyncio.Queue[str] = asyncio.Queue()
+        self.queue = queue
+
+        try:
+            while True:
+                user_id = await queue.get()
+                self.pending_user_ids.discard(user_id)
+
+                try:
+                    await self.sync(user_id)
+                except PyMongoError:  # Skipped rather than stopping the worker
+                    logger.exception("Failed to sync the summaries of %s", user_id)
+                    failed_users.inc()
+                finally:
+                    queue.task_done()
+        finally:
+            self.queue = None
+            self.pending_user_ids.clear()
+
+
+user_summary_worker = UserSummaryWorker()
+
+
+@metrics.registry.add_collector
+async def collect_user_summary_worker() -> None:
+    queue = user_summary_worker.queue
+    queued_users.set(queue.qsize() if queue else 0)
@@ -1,12 +1,16 @@
 import typing as t
 import strawberry
+from graphql import GraphQLError
 from strawberry.types import Info
+from src import tracing
 from src.db.models import user as user_models
-from src.db.models import message as message_models
 from src.api.graphql import schemas
 from src.api.graphql.broadcast import broadcast
 from src.api.graphql.users import schemas as user_schemas
+from src.api.graphql.users import stores as user_stores
 from src.api.graphql.auth.decorators import login_required
+from src.api.graphql.base.cache_control import cache_control
+from src.api.graphql.messages import events
 from src.api.graphql.messages import schemas as message_schemas
 from src.api.graphql.messages import services
 from src.api.graphql.messages import stores
@@ -15,6 +19,7 @@ from src.api.graphql.messages import stores
 @strawberry.type
 class Query:
     @strawberry.field
+    @cache_control(max_age=10)  # Membership changes are picked up shortly
     @login_required
     async def get_channels(
         self, info: Info[dict[t.Any, t.Any], t.Any]
@@ -29,7 +34,8 @@ class Query:
             return schemas.ApiResponse(errors=errors)
 
         user = t.cast(user_models.User, user_validator.user)
-        channels = t.cast(list[message_models.Channel], user.channels)
+        store = stores.MessageStore()
+        channels = await store.get_user_channels(user)
         data = [message_schemas.Channel(channel) for channel in channels]
         data.sort(key=lambda channel: channel.id)
         return schemas.ApiResponse(data=data)
@@ -92,20 +98,136 @@ class Mutation:
         user = t.cast(user_models.User, user_validator.user)
         return await service.create_message(user, payload)
 
+    @strawberry.mutation
+    @login_required
+    async def add_channel_member(
+        self,
+        info: Info[dict[t.Any, t.Any], t.Any],
+        payload: message_schemas.ChannelMemberInput,
+    ) -> schemas.ApiResponse[message_schemas.Channel]:
+        input_errors = await payload.validate()
+        user_validator = user_schemas.UserValidator(
+            userId=info.context["userId"],
+            errorSource=schemas.ApiErrorSource(header="Authorization"),
+        )
+        user_errors = await user_validator.validate()
+        errors = input_errors + user_errors
+
+        if errors:
+            return schemas.ApiResponse(errors=errors)
+
+        service = services.MessageService()
+        user = t.cast(user_models.User, user_validator.user)
+        return await service.add_channel_member(user, payload)
+
+    @strawberry.mutation
+    @login_required
+    async def leave_channel(
+        self,
+        info: Info[dict[t.Any, t.Any], t.Any],
+        payload: message_schemas.ChannelInput,
+    ) -> schemas.ApiResponse[message_schemas.Channel]:
+        input_errors = await payload.validate()
+        user_validator = user_schemas.UserValidator(
+            userId=info.context["userId"],
+            errorSource=schemas.ApiErrorSource(header="Authorization"),
+        )
+        user_errors = await user_validator.validate()
+        errors = input_errors + user_errors
+
+        if errors:
+            return schemas.ApiResponse(errors=errors)
+
+        service = services.MessageService()
+        user = t.cast(user_models.User, user_validator.user)
+        return await service.leave_channel(user, payload)
+
 
 @strawberry.type
 class Subscription:
     @strawberry.subscription
     @login_required
     async def new_message(
-        self, info: Info[dict[t.Any, t.Any], t.Any]
+        self,
+        info: Info[dict[t.Any, t.Any], t.Any],
+        since_sequence: t.Optional[int] = None,
     ) -> t.AsyncGenerator[message_schemas.Message, None]:
         store = stores.MessageStore()
         user_id = info.context["userId"]
+        replayed_sequences: set[int] = set()
+
+        # Subscribes before replaying, so messages committed meanwhile arrive live
+        async with broadcast.subscribe(
+            channel=events.NEW_MESSAGE_CHANNEL
+        ) as subscriber:
+            user_store = user_stores.UserStore()
+            user = await user_store.get_user(user_id)
+
+            if user and since_sequence is not None:
+                # Long disconnections are caught up through `getMessages` instead
+                if await store.exceeds_replay_limit(user, since_sequence):
+                    raise GraphQLError(
+                        "Too many missed messages to replay",
+                        extensions={"code": "RESET_REQUIRED"},
+                    )
+
+                missed_messages = store.get_messages_after(user, since_sequence)
+
+                async for missed_message in missed_messages:
+                    replayed_sequences.add(missed_message.sequence)
+                    yield message_schemas.Message(missed_message)
 
-        async with broadcast.subscribe(channel="messages") as subscriber:
             async for event in subscriber:
-                message = await store.get_message(event.message, user_id)
+                new_message = events.NewMessageEvent.model_validate_json(event.message)
+
+                if new_message.sequence in replayed_sequences:
+                    replayed_sequences.discard(new_message.sequence)
+                    continue
+
+                # Ends before yielding, which hands control over to the subscriber
+                with tracing.tracer.start_span(
+                    "broadcast.deliver", traceparent=new_message.traceparent
+                ):
+                    member_ids = await store.get_channel_member_ids(
+                        new_message.channel_id
+                    )
+                    message = (
+                        await store.get_message(new_message.message_id, user_id)
+                        if user_id in member_ids
+                        else None
+                    )
 
                 if message:
                     yield message_schemas.Message(message)
+
+    @strawberry.subscription
+    @login_required
+    async def stream_messages(
+        self,
+        info: Info[dict[t.Any, t.Any], t.Any],
+        limit: int = 100,
+        batch_size: int = 20,
+        channel_id: t.Optional[str] = None,
+        sender_id: t.Optional[str] = None,
+        content: t.Optional[str] = None,
+        last_sequence: t.Optional[int] = None,
+    ) -> t.AsyncGenerator[list[message_schemas.Message], None]:
+        user_store = user_stores.UserStore()
+        user = await user_store.get_user(info.context["userId"])
+
+        if not user:
+            return
+
+        store = stores.MessageStore()
+        batches = store.stream_messages(
+            user=user,
+            limit=limit,
+            batch_size=batch_size,
+            channel_id=channel_id,
+            sender_id=sender_id,
+            content=content,
+            last_sequence=last_sequence,
+        )
+
+        async for messages in batches:
+            yield [message_schemas.Message(message) for message in messages]
@@ -10,6 +10,7 @@ TData = t.TypeVar("TData")
 @strawberry.enum
 class ErrorEnum(str, Enum):
     CHANNEL_NOT_FOUND = "CHANNEL_NOT_FOUND"
+    EMAIL_ALREADY_IN_USE = "EMAIL_ALREADY_IN_USE"
     EXPIRED_TOKEN = "EXPIRED_TOKEN"  # nosec
     FIELD_REQUIRED = "FIELD_REQUIRED"
     INCORRECT_TOKEN_TYPE = "INCORRECT_TOKEN_TYPE"  # nosec
@@ -20,6 +21,7 @@ class ErrorEnum(str, Enum):
     UNAUTHORIZED = "UNAUTHORIZED"
     URL_NOT_SUPPORTED = "URL_NOT_SUPPORTED"
     USER_NOT_FOUND = "USER_NOT_FOUND"
+    USER_NOT_IN_CHANNEL = "USER_NOT_IN_CHANNEL"
 
 
 # Error object structure based on JSON:API specification: https://jsonapi.org/format/#error-objects
@@ -0,0 +1,80 @@
+import typing as t
+import strawberry
+from datetime import datetime
+from src import config
+from src.api import utils
+from src.api.enums import TokenType
+from src.api.graphql import schemas
+from src.api.graphql.messages import schemas as message_schemas
+from src.db.models import message as message_models
+
+SyncToken = strawberry.scalar(
+    t.NewType("SyncToken", str),
+    description="Opaque token marking the point a client has synced up to",
+)
+
+
+@strawberry.input
+class SyncTokenValidator(schemas.ApiInput):
+    userId: str
+    since: t.Optional[str] = None
+    sinceTime: strawberry.Private[t.Optional[datetime]] = None
+
+    def validate_since(self) -> t.Optional[schemas.ApiError]:
+        if self.since is None:
+            return None
+
+        decode_result = utils.decode_app_token(self.since)
+
+        if decode_result.errors:
+            error = decode_result.errors[0]
+            error.source = schemas.ApiErrorSource(parameter="since")
+            return error
+
+        token = decode_result.data
+
+        if not token or token["type"] != TokenType.SYNC_TOKEN:
+            return schemas.ApiError(
+                code=schemas.ErrorEnum.INCORRECT_TOKEN_TYPE,
+                title="Incorrect token type",
+                source=schemas.ApiErrorSource(parameter="since"),
+            )
+
+        if token.get("userId") != self.userId:
+            return schemas.ApiError(
+                code=schemas.ErrorEnum.INVALID_TOKEN,
+                title="Sync token issued to another user",
+                source=schemas.ApiErrorSource(parameter="since"),
+            )
+
+        self.sinceTime = datetime.fromtimestamp(token["since"], config.TIMEZONE)
+        return None
+
+    async def validate(self) -> list[schemas.ApiError]:
+        since_error = self.validate_since()
+        errors = [since_error]
+        filtered_errors = [_ for _ in errors if _]
+        return filtered_errors
+
+
+@strawberry.type
+class Tombstone:
+    entity: str
+    id: str
+    channelId: str
+    deletedAt: datetime
+
+    def __init__(self, tombstone: message_models.Tombstone) -> None:
+        self.entity = tombstone.entity.value
+        self.id = str(tombstone.entity_id)
+        self.channelId = str(tombstone.channel_id)
+        self.deletedAt = tombstone.deleted_at
+
+
+@strawberry.type
+class SyncResult:
+    token: SyncToken  # type: ignore[valid-type]
+    resetRequired: bool  # Too much changed, clients should reload everything
+    channels: list[message_schemas.Channel]
+    messages: list[message_schemas.Message]
+    tombstones: list[Tombstone]
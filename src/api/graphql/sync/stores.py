@@ -0,0 +1,54 @@
+import typing as t
+from datetime import datetime
+from beanie.operators import In
+from src.api.graphql.messages import stores as message_stores
+from src.db.models import user as user_models
+from src.db.models import message as message_models
+
+
+class SyncStore:
+    async def get_channels(
+        self, user: user_models.User, since: datetime, limit: int
+    ) -> list[message_models.Channel]:
+        return (
+            await message_models.Channel.find(
+                In(message_models.Channel.id, user.channel_ids),  # type: ignore[no-untyped-call]
+                message_models.Channel.updated_at > since,
+            )
+            .sort(+message_models.Channel.updated_at)
+            .limit(limit)
+            .to_list()
+        )
+
+    async def get_messages(
+        self, user: user_models.User, since: datetime, limit: int
+    ) -> list[message_models.Message]:
+        messages = (
+            message_models.Message.find(
+                In(message_models.Message.channel.id, user.channel_ids),  # type: ignore[no-untyped-call]
+                message_models.Message.updated_at > since,
+            )
+            .sort(+message_models.Message.updated_at)
+            .limit(limit)
+        )
+        message_store = message_stores.MessageStore()
+        return await message_store.find_messages(messages)
+
+    async def get_tombstones(
+        self, user: user_models.User, since: datetime, limit: int
+    ) -> list[message_models.Tombstone]:
+        # Deleted channels aren't among the user's anymore, so they are matched by
+        # the members they had
+        query: dict[str, t.Any] = {
+            "deleted_at": {"$gt": since},
+            "$or": [
+                {"channel_id": {"$in": user.channel_ids}},
+                {"member_ids": user.id},
+            ],
+        }
+        return (
+            await message_models.Tombstone.find(query)
+            .sort(+message_models.Tombstone.deleted_at)
+            .limit(limit)
+            .to_list()
+        )
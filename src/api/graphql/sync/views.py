@@ -0,0 +1,37 @@
+import typing as t
+import strawberry
+from strawberry.types import Info
+from src.api.graphql import schemas
+from src.api.graphql.auth.decorators import login_required
+from src.api.graphql.sync import schemas as sync_schemas
+from src.api.graphql.sync import services
+from src.api.graphql.users import schemas as user_schemas
+from src.db.models import user as user_models
+
+
+@strawberry.type
+class Query:
+    @strawberry.field
+    @login_required
+    async def sync(
+        self,
+        info: Info[dict[t.Any, t.Any], t.Any],
+        since: t.Optional[sync_schemas.SyncToken] = None,  # type: ignore[valid-type]
+    ) -> schemas.ApiResponse[sync_schemas.SyncResult]:
+        user_validator = user_schemas.UserValidator(
+            userId=info.context["userId"],
+            errorSource=schemas.ApiErrorSource(header="Authorization"),
+        )
+        user_errors = await user_validator.validate()
+        token_validator = sync_schemas.SyncTokenValidator(
+            userId=info.context["userId"], since=since
+        )
+        token_errors = await token_validator.validate()
+        errors = user_errors + token_errors
+
+        if errors:
+            return schemas.ApiResponse(errors=errors)
+
+        service = services.SyncService()
+        user = t.cast(user_models.User, user_validator.user)
+        return await service.sync(user, token_validator.sinceTime)
@@ -0,0 +1,4 @@
+from src.api.graphql.base import caches
+from src.db.models import user as user_models
+
+users = caches.EntityCache("users", user_models.User, caches.make_backend("users"))
@@ -1,20 +1,25 @@
 import typing as t
 import strawberry
 from datetime import datetime
-from beanie import PydanticObjectId
-from bson.errors import InvalidId
+from src.api import utils
 from src.api.graphql import schemas
+from src.api.graphql.users import stores
 from src.db.models import user as user_models
 
 
 @strawberry.type
 class User:
+    # Built for every listed row and subscription event, so kept compact
+    __slots__ = ("id", "email", "createdAt", "updatedAt")
+
     id: str
     email: str
     createdAt: datetime
     updatedAt: datetime
 
-    def __init__(self, user: user_models.User) -> None:
+    def __init__(
+        self, user: t.Union[user_models.User, user_models.UserSummary]
+    ) -> None:
         self.id = str(user.id)
         self.email = user.email
         self.createdAt = user.created_at
@@ -28,12 +33,8 @@ class UserValidator(schemas.ApiInput):
     errorSource: strawberry.Private[t.Optional[schemas.ApiErrorSource]] = None
 
     async def validate_user_id(self) -> t.Optional[schemas.ApiError]:
-        try:
-            self.user = await user_models.User.find_one(
-                user_models.User.id == PydanticObjectId(self.userId), fetch_links=True
-            )
-        except InvalidId:
-            pass
+        store = stores.UserStore()
+        self.user = await store.get_user(self.userId)
 
         if not self.user:
             return schemas.ApiError(
@@ -49,3 +50,24 @@ class UserValidator(schemas.ApiInput):
         errors = [user_id_error]
         filtered_errors = [_ for _ in errors if _]
         return filtered_errors
+
+
+@strawberry.input
+class UpdateUserInput(schemas.ApiInput):
+    email: str
+
+    def validate_email(self) -> t.Optional[schemas.ApiError]:
+        if not utils.is_valid_email(self.email):
+            return schemas.ApiError(
+                code=schemas.ErrorEnum.INVALID_EMAIL_ADDRESS,
+                title="Invalid email address",
+                source=schemas.ApiErrorSource(pointer="/email"),
+            )
+
+        return None
+
+    async def validate(self) -> list[schemas.ApiError]:
+        email_error = self.validate_email()
+        errors = [email_error]
+        filtered_errors = [_ for _ in errors if _]
+        return filtered_errors
@@ -1,6 +1,8 @@
+from beanie.exceptions import RevisionIdWasChanged
 from src.api.graphql import schemas
 from src.api.graphql.users import schemas as user_schemas
 from src.api.graphql.users import stores
+from src.db.models import user as user_models
 
 
 class UserService:
@@ -11,3 +13,19 @@ class UserService:
         users = await self.store.get_users()
         data = [user_schemas.User(user) for user in users]
         return schemas.ApiResponse(data=data)
+
+    async def update_user(
+        self, user: user_models.User, payload: user_schemas.UpdateUserInput
+    ) -> schemas.ApiResponse[user_schemas.User]:
+        try:
+            saved_user = await self.store.save_user(user, email=payload.email)
+        except RevisionIdWasChanged:  # Raised by saves for duplicate keys, e.g. emails
+            error = schemas.ApiError(
+                code=schemas.ErrorEnum.EMAIL_ALREADY_IN_USE,
+                title="Email address already in use",
+                source=schemas.ApiErrorSource(pointer="/email"),
+            )
+            return schemas.ApiResponse(errors=[error])
+
+        data = user_schemas.User(saved_user)
+        return schemas.ApiResponse(data=data)
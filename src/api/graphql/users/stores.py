@@ -1,7 +1,37 @@
-from src.db.models.user import User
+import typing as t
+from beanie import PydanticObjectId
+from bson.errors import InvalidId
+from src import tracing
+from src.api.graphql.base.singleflight import flights
+from src.api.graphql.messages import summaries
+from src.api.graphql.users import caches
+from src.db.models import base as base_models
+from src.db.models.user import User, UserSummary
 
 
+def get_summary_fields(user: User) -> dict[str, t.Any]:
+    # What summaries embed, but the timestamp every save bumps
+    return UserSummary.from_user(user).model_dump(exclude={"updated_at"})
+
+
+@tracing.trace_methods
 class UserStore:
+    async def get_user(self, user_id: str) -> t.Optional[User]:
+        try:
+            object_id = PydanticObjectId(user_id)
+        except InvalidId:
+            return None
+
+        key = str(object_id)
+
+        async def load_user() -> t.Optional[User]:
+            return await User.find_one(User.id == object_id)
+
+        async def load_shared_user() -> t.Optional[User]:
+            return await flights.do(("user", key), load_user)
+
+        return await caches.users.get(key, load_shared_user)
+
     async def get_or_create_user(self, email: str) -> User:
         db_user = await User.find_one({"email": {"$regex": email, "$options": "i"}})
 
@@ -12,5 +42,18 @@ class UserStore:
         created_user: User = await new_user.save()
         return created_user
 
+    async def save_user(self, user: User, **changes: t.Any) -> User:
+        # Changes are saved on a copy, as `user` may be shared through the cache
+        summary_fields = get_summary_fields(user)
+        saved_user: User = await user.model_copy(update=changes).save()
+        await caches.users.invalidate(str(user.id))
+
+        # Summaries are only rewritten when what they embed changed
+        if get_summary_fields(saved_user) != summary_fields:
+            summaries.user_summary_worker.submit(str(user.id))
+
+        return saved_user
+
     async def get_users(self) -> list[User]:
-        return await User.find().sort("email").to_list()
+        users = await base_models.find_raw(User.find().sort("email"))
+        return [User.from_db(user) for user in users]
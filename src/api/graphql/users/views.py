@@ -3,6 +3,7 @@ import strawberry
 from strawberry.types import Info
 from src.api.graphql import schemas
 from src.api.graphql.auth.decorators import login_required
+from src.api.graphql.base.cache_control import cache_control
 from src.api.graphql.users import services
 from src.api.graphql.users import schemas as user_schemas
 from src.db.models import user as user_models
@@ -11,6 +12,7 @@ from src.db.models import user as user_models
 @strawberry.type
 class Query:
     @strawberry.field
+    @cache_control(max_age=60)
     @login_required
     async def get_users(
         self,
@@ -20,6 +22,7 @@ class Query:
         return await service.get_users()
 
     @strawberry.field
+    @cache_control(max_age=60)
     @login_required
     async def get_user(
         self, info: Info[dict[t.Any, t.Any], t.Any], user_id: str
@@ -35,3 +38,28 @@ class Query:
         user = t.cast(user_models.User, user_validator.user)
         data = user_schemas.User(user)
         return schemas.ApiResponse(data=data)
+
+
+@strawberry.type
+class Mutation:
+    @strawberry.mutation
+    @login_required
+    async def update_user(
+        self,
+        info: Info[dict[t.Any, t.Any], t.Any],
+        payload: user_schemas.UpdateUserInput,
+    ) -> schemas.ApiResponse[user_schemas.User]:
+        input_errors = await payload.validate()
+        user_validator = user_schemas.UserValidator(
+            userId=info.context["userId"],
+            errorSource=schemas.ApiErrorSource(header="Authorization"),
+        )
+        user_errors = await user_validator.validate()
+        errors = input_errors + user_errors
+
+        if errors:
+            return schemas.ApiResponse(errors=errors)
+
+        service = services.UserService()
+        user = t.cast(user_models.User, user_validator.user)
+        return await service.update_user(user, payload)
@@ -3,17 +3,18 @@ from src.api.graphql import schemas
 from src.api.graphql.auth import views as auth_views
 from src.api.graphql.users import views as user_views
 from src.api.graphql.messages import views as message_views
+from src.api.graphql.sync import views as sync_views
 
 
 @strawberry.type
-class Query(user_views.Query, message_views.Query):
+class Query(user_views.Query, message_views.Query, sync_views.Query):
     @strawberry.field
     def health_check(self) -> schemas.ApiResponse[None]:
         return schemas.ApiResponse()
 
 
 @strawberry.type
-class Mutation(auth_views.Mutation, message_views.Mutation):
+class Mutation(auth_views.Mutation, user_views.Mutation, message_views.Mutation):
     pass
 
 
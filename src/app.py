@@ -1,19 +1,48 @@
+import asyncio
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from src import api, config, db
+from src import api, config, db, tracing
+from src.api.graphql.base import listeners as base_listeners
 from src.api.graphql.broadcast import broadcast
+from src.db import slow_queries
+from src.api.graphql.messages import inboxes as message_inboxes
+from src.api.graphql.messages import listeners as message_listeners
+from src.api.graphql.messages import summaries as message_summaries
+
+background_tasks: set[asyncio.Task[None]] = set()
 
 
 async def start_app() -> None:
-    await db.init_db(config.DB_NAME)
+    client = await db.init_db(config.DB_NAME)
     await broadcast.connect()
+    background_tasks.add(asyncio.create_task(slow_queries.slow_query_log.run(client)))
+    background_tasks.add(asyncio.create_task(base_listeners.sync_entity_caches()))
+    background_tasks.add(asyncio.create_task(message_listeners.sync_recent_messages()))
+    background_tasks.add(
+        asyncio.create_task(message_summaries.user_summary_worker.run())
+    )
+
+    if config.INBOX_TIMELINE_ENABLED:
+        background_tasks.add(asyncio.create_task(message_inboxes.inbox_worker.run()))
+
+    if tracing.tracer.is_enabled():
+        background_tasks.add(asyncio.create_task(tracing.exporter.run()))
+
+
+async def stop_app() -> None:
+    for task in background_tasks:
+        task.cancel()
+
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     await start_app()
     yield
+    await stop_app()
 
 
 app = FastAPI(title=config.APP_NAME, lifespan=lifespan)
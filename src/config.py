@@ -15,7 +15,57 @@ JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_EXP_SECONDS = 30 * 60  # 30 minutes
 REFRESH_TOKEN_EXP_SECONDS = 1 * 60 * 60  # 1 hour
 PUB_SUB_URL = os.getenv("PUB_SUB_URL", "memory://")
+PUB_SUB_RETRY_SECONDS = float(os.getenv("PUB_SUB_RETRY_SECONDS", "1"))
+JSON_ENCODER = os.getenv("JSON_ENCODER", "orjson")  # Falls back to `json`
+GRAPHQL_MAX_BATCH_SIZE = int(os.getenv("GRAPHQL_MAX_BATCH_SIZE", "10"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # Admin endpoints are off without it
+
+# Compression
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+COMPRESSION_CACHE_MAX_BYTES = int(os.getenv("COMPRESSION_CACHE_MAX_BYTES", "16777216"))
+
+# Cache
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+ENTITY_CACHE_TTL_SECONDS = int(os.getenv("ENTITY_CACHE_TTL_SECONDS", "300"))
+ENTITY_CACHE_MAX_SIZE = int(os.getenv("ENTITY_CACHE_MAX_SIZE", "10000"))
+CHANNEL_MEMBERS_INDEX_MAX_SIZE = int(
+    os.getenv("CHANNEL_MEMBERS_INDEX_MAX_SIZE", "100000")
+)
+RECENT_MESSAGES_CHANNEL_SIZE = int(os.getenv("RECENT_MESSAGES_CHANNEL_SIZE", "100"))
+RECENT_MESSAGES_MAX_SIZE = int(os.getenv("RECENT_MESSAGES_MAX_SIZE", "10000"))
+SINGLE_FLIGHT_WINDOW_SECONDS = float(os.getenv("SINGLE_FLIGHT_WINDOW_SECONDS", "0"))
+
+# Channels
+CHANNEL_EMBEDDED_MEMBERS_MAX = int(os.getenv("CHANNEL_EMBEDDED_MEMBERS_MAX", "100"))
+
+# Subscriptions
+RECONNECT_MAX_DELAY_SECONDS = float(os.getenv("RECONNECT_MAX_DELAY_SECONDS", "10"))
+FANOUT_RESULTS_MAX_SIZE = int(os.getenv("FANOUT_RESULTS_MAX_SIZE", "1000"))
+REPLAY_MAX_MESSAGES = int(os.getenv("REPLAY_MAX_MESSAGES", "1000"))
+
+# Inbox timeline
+INBOX_TIMELINE_ENABLED = os.getenv("INBOX_TIMELINE_ENABLED", "false").lower() == "true"
+INBOX_MAX_CHANNEL_MEMBERS = int(os.getenv("INBOX_MAX_CHANNEL_MEMBERS", "100"))
+INBOX_WRITE_BATCH_SIZE = int(os.getenv("INBOX_WRITE_BATCH_SIZE", "100"))
+INBOX_WRITE_DELAY_SECONDS = float(os.getenv("INBOX_WRITE_DELAY_SECONDS", "1"))
+
+# Sync
+SYNC_MAX_CHANGES = int(os.getenv("SYNC_MAX_CHANGES", "1000"))
+SYNC_OVERLAP_SECONDS = float(os.getenv("SYNC_OVERLAP_SECONDS", "5"))
+
+# Tracing
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "0"))  # Off by default
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_FLUSH_SECONDS = float(os.getenv("TRACING_FLUSH_SECONDS", "5"))
+TRACING_MAX_QUEUE_SIZE = int(os.getenv("TRACING_MAX_QUEUE_SIZE", "10000"))
 
 # Database
 DB_CONNECTION_STRING = os.getenv("DB_CONNECTION_STRING", "")
 DB_NAME = os.getenv("DB_NAME", "")
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
+QUERY_SHAPES_MAX_SIZE = int(os.getenv("QUERY_SHAPES_MAX_SIZE", "1000"))
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "off")  # off, log or enforce
+QUERY_BUDGET_MAX_COMMANDS = int(os.getenv("QUERY_BUDGET_MAX_COMMANDS", "50"))
+QUERY_BUDGET_MAX_REPEATS = int(os.getenv("QUERY_BUDGET_MAX_REPEATS", "10"))
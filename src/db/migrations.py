@@ -0,0 +1,33 @@
+import typing as t
+from beanie.operators import In
+from src.db.models import message, user
+
+
+async def backfill_channel_members() -> None:
+    # Channels written when members were links, which don't load as channels anymore
+    collection: t.Any = message.Channel.get_motor_collection()
+
+    async for document in collection.find({"member_ids": {"$exists": False}}):
+        member_ids = [member.id for member in document.get("members", [])]
+        members = await user.User.find(
+            In(user.User.id, member_ids)  # type: ignore[no-untyped-call]
+        ).to_list()
+        channel = message.Channel.from_users(members)
+        await message.Channel.find_one(message.Channel.id == document["_id"]).update(
+            {"$set": {"member_ids": channel.member_ids, "members": channel.members}}
+        )
+
+
+async def backfill_user_channel_ids() -> None:
+    # Users created before they kept their channel IDs
+    async for channel in message.Channel.find():
+        await channel.add_to_members()
+
+
+async def backfill_sender_snapshots() -> None:
+    # Messages written before they kept a snapshot of their sender
+    async for sender in user.User.find():
+        snapshot = user.UserSummary.from_user(sender)
+        await message.Message.find(
+            {"sender.$id": sender.id, "sender_snapshot": None}
+        ).update({"$set": {"sender_snapshot": snapshot}})
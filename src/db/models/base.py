@@ -2,10 +2,17 @@ import typing as t
 import beanie
 from enum import Enum
 from datetime import datetime
+from beanie.odm.queries.find import FindMany
 from pydantic import Field
 from src import utils
 
 
+async def find_raw(query: FindMany[t.Any]) -> list[dict[str, t.Any]]:
+    # Documents as stored, for read paths that skip validation
+    documents: list[dict[str, t.Any]] = await query.motor_cursor.to_list(None)
+    return documents
+
+
 class TimestampMixin(beanie.Document):
     created_at: datetime = Field(default_factory=utils.now)
     updated_at: datetime = Field(default_factory=utils.now)
@@ -17,6 +24,7 @@ class TimestampMixin(beanie.Document):
 
 class CounterType(str, Enum):
     MESSAGE = "MESSAGE"
+    INBOX = "INBOX"  # Next message sequence to fan out to inboxes
 
 
 class Counter(beanie.Document):
@@ -1,24 +1,180 @@
 import typing as t
 import beanie
 import pymongo
+from beanie.operators import In
+from datetime import datetime
+from enum import Enum
 from pydantic import Field
+from src import utils
 from src.db.models import base
 from src.db.models import user
 
 
+def get_link_id(value: t.Any) -> beanie.PydanticObjectId:
+    if isinstance(value, beanie.Link):
+        return t.cast(beanie.PydanticObjectId, value.ref.id)
+
+    return t.cast(beanie.PydanticObjectId, value.id)
+
+
+class TombstoneEntity(str, Enum):
+    CHANNEL = "CHANNEL"
+    MEMBER = "MEMBER"  # A user removed from a channel, by the user's id
+    MESSAGE = "MESSAGE"
+
+
+class Tombstone(beanie.Document):
+    entity: TombstoneEntity
+    entity_id: beanie.PydanticObjectId
+    channel_id: beanie.PydanticObjectId
+    # Users who lost the channel, e.g. the members of deleted ones
+    member_ids: list[beanie.PydanticObjectId] = []
+    deleted_at: t.Annotated[datetime, beanie.Indexed()] = Field(
+        default_factory=utils.now
+    )
+
+    class Settings:
+        name = "tombstones"
+
+
+class ChannelMember(beanie.Document):
+    channel_id: beanie.PydanticObjectId
+    # Beanie merges indexes over the same field names, so a (user, channel) index
+    # would replace the unique one
+    user_id: t.Annotated[beanie.PydanticObjectId, beanie.Indexed()]
+    joined_at: datetime = Field(default_factory=utils.now)
+
+    class Settings:
+        name = "channel_members"
+        indexes = [
+            pymongo.IndexModel(
+                [("channel_id", pymongo.ASCENDING), ("user_id", pymongo.ASCENDING)],
+                unique=True,
+            ),
+        ]
+
+
 class Channel(base.TimestampMixin):
-    members: list[beanie.Link[user.User]]
+    # Large channels keep their members in `ChannelMember` documents instead
+    member_ids: t.Annotated[list[beanie.PydanticObjectId], beanie.Indexed()] = []
+    members: list[user.UserSummary] = []  # Same order as `member_ids`
+    external_members: bool = False
+    member_count: int = 0  # Only kept for external members
     messages: list[beanie.BackLink["Message"]] = Field(original_field="channel")  # type: ignore[call-arg]
 
+    @classmethod
+    def from_users(cls, users: t.Iterable[user.User]) -> "Channel":
+        members = [user.UserSummary.from_user(member) for member in users]
+        return cls(member_ids=[member.id for member in members], members=members)
+
+    def count_members(self) -> int:
+        return self.member_count if self.external_members else len(self.member_ids)
+
+    async def get_member_ids(self) -> list[beanie.PydanticObjectId]:
+        if not self.external_members:
+            return self.member_ids
+
+        memberships = await ChannelMember.find(
+            ChannelMember.channel_id == self.id
+        ).to_list()
+        return [membership.user_id for membership in memberships]
+
+    # Saving creates channels too. Adding to members' channel IDs is idempotent
+    @beanie.after_event(beanie.Insert, beanie.Save)  # type: ignore[misc]
+    async def add_to_members(self) -> None:
+        await user.User.find(
+            In(user.User.id, await self.get_member_ids())  # type: ignore[no-untyped-call]
+        ).update({"$addToSet": {"channel_ids": self.id}})
+
+    @beanie.after_event(beanie.Delete)  # type: ignore[misc]
+    async def remove_from_members(self) -> None:
+        await user.User.find(user.User.channel_ids == self.id).update(
+            {"$pull": {"channel_ids": self.id}}
+        )
+
+    @beanie.after_event(beanie.Delete)  # type: ignore[misc]
+    async def record_tombstone(self) -> None:
+        await Tombstone(
+            entity=TombstoneEntity.CHANNEL,
+            entity_id=self.id,
+            channel_id=self.id,
+            member_ids=await self.get_member_ids(),
+        ).insert()
+        await ChannelMember.find(ChannelMember.channel_id == self.id).delete()
+
     class Settings:
         name = "channels"
+        max_nesting_depths_per_field = {"messages": 0}  # Never fetch whole history
+        indexes = [pymongo.IndexModel([("updated_at", pymongo.ASCENDING)])]
 
 
 class Message(base.TimestampMixin):
     sender: beanie.Link[user.User]
+    sender_snapshot: t.Optional[user.UserSummary] = None  # Missing on older messages
     channel: beanie.Link[Channel]
     content: t.Annotated[str, beanie.Indexed(index_type=pymongo.TEXT)]
     sequence: t.Annotated[int, beanie.Indexed(unique=True)]  # used for pagination
 
+    @beanie.before_event(beanie.Insert, beanie.Save)  # type: ignore[misc]
+    def take_sender_snapshot(self) -> None:
+        if self.sender_snapshot is None and isinstance(self.sender, user.User):
+            self.sender_snapshot = user.UserSummary.from_user(self.sender)
+
+    @classmethod
+    def from_db(cls, data: dict[str, t.Any]) -> "Message":
+        # Read paths trust stored documents, which were validated when written
+        sender_snapshot = data.get("sender_snapshot")
+        message: Message = cls.model_construct(
+            id=data["_id"],
+            revision_id=data.get("revision_id"),
+            sender=beanie.Link(data["sender"], user.User),
+            sender_snapshot=(
+                user.UserSummary.from_db(sender_snapshot) if sender_snapshot else None
+            ),
+            channel=beanie.Link(data["channel"], Channel),
+            content=data["content"],
+            sequence=data["sequence"],
+            created_at=data["created_at"],
+            updated_at=data["updated_at"],
+        )
+        return message
+
+    @beanie.after_event(beanie.Delete)  # type: ignore[misc]
+    async def record_tombstone(self) -> None:
+        await Tombstone(
+            entity=TombstoneEntity.MESSAGE,
+            entity_id=self.id,
+            channel_id=get_link_id(self.channel),
+        ).insert()
+
     class Settings:
         name = "messages"
+        indexes = [  # Range reads of a channel's messages, e.g. subscription replay
+            pymongo.IndexModel(
+                [("channel.$id", pymongo.ASCENDING), ("sequence", pymongo.ASCENDING)]
+            ),
+            pymongo.IndexModel([("updated_at", pymongo.ASCENDING)]),  # Delta sync
+            pymongo.IndexModel(  # Re-syncing sender snapshots
+                [
+                    ("sender_snapshot.id", pymongo.ASCENDING),
+                    ("sender_snapshot.updated_at", pymongo.ASCENDING),
+                ]
+            ),
+        ]
+
+
+class InboxEntry(beanie.Document):
+    # Per-user timeline, fanned out after message creation for small enough channels
+    user_id: beanie.PydanticObjectId
+    sequence: int
+    message_id: beanie.PydanticObjectId
+    channel_id: beanie.PydanticObjectId
+
+    class Settings:
+        name = "inbox_entries"
+        indexes = [
+            pymongo.IndexModel(
+                [("user_id", pymongo.ASCENDING), ("sequence", pymongo.DESCENDING)],
+                unique=True,
+            ),
+        ]
@@ -1,16 +1,53 @@
 import typing as t
 import beanie
-from pydantic import EmailStr, Field
+from datetime import datetime
+from pydantic import BaseModel, EmailStr
 from src.db.models import base
 
 
-if t.TYPE_CHECKING:
-    from .message import Channel  # pragma: no cover
-
-
 class User(base.TimestampMixin):
     email: t.Annotated[EmailStr, beanie.Indexed(unique=True)]
-    channels: list[beanie.BackLink["Channel"]] = Field(original_field="members")  # type: ignore[call-arg]
+    # Kept along with channel creation and membership changes
+    channel_ids: t.Annotated[list[beanie.PydanticObjectId], beanie.Indexed()] = []
+
+    @classmethod
+    def from_db(cls, data: dict[str, t.Any]) -> "User":
+        # Read paths trust stored documents, which were validated when written
+        user: User = cls.model_construct(
+            id=data["_id"],
+            revision_id=data.get("revision_id"),
+            email=data["email"],
+            channel_ids=data.get("channel_ids", []),
+            created_at=data["created_at"],
+            updated_at=data["updated_at"],
+        )
+        return user
 
     class Settings:
         name = "users"
+
+
+class UserSummary(BaseModel):
+    # What channels and messages embed of a user, so it isn't looked up
+    id: beanie.PydanticObjectId
+    email: str
+    created_at: datetime
+    updated_at: datetime
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSummary":
+        return cls(
+            id=t.cast(beanie.PydanticObjectId, user.id),
+            email=user.email,
+            created_at=user.created_at,
+            updated_at=user.updated_at,
+        )
+
+    @classmethod
+    def from_db(cls, data: dict[str, t.Any]) -> "UserSummary":
+        return cls.model_construct(
+            id=data["id"],
+            email=data["email"],
+            created_at=data["created_at"],
+            updated_at=data["updated_at"],
+        )
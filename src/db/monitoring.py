@@ -0,0 +1,148 @@
+import typing as t
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pymongo import monitoring
+from src import config, metrics, tracing
+from src.db import query_budgets, slow_queries
+
+# Commands issued by the current operation. The driver runs them in its threads, with
+# a copy of the caller's context, so they're appended to the list it shares
+operation_commands: ContextVar[t.Optional[list[str]]] = ContextVar(
+    "operation_commands", default=None
+)
+
+
+class CapturedCommand(t.NamedTuple):
+    database_name: str
+    command_name: str
+    command: t.Mapping[str, t.Any]
+
+
+# Commands issued within `capture_commands`, e.g. to explain them
+captured_commands: ContextVar[t.Optional[list[CapturedCommand]]] = ContextVar(
+    "captured_commands", default=None
+)
+
+mongo_commands = metrics.registry.register(
+    metrics.Counter("chatql_mongo_commands_total", "Mongo commands issued", ["command"])
+)
+mongo_command_failures = metrics.registry.register(
+    metrics.Counter(
+        "chatql_mongo_command_failures_total", "Mongo commands failed", ["command"]
+    )
+)
+mongo_command_seconds = metrics.registry.register(
+    metrics.Histogram(
+        "chatql_mongo_command_seconds", "Mongo command latency", ["command"]
+    )
+)
+
+
+class CommandListener(monitoring.CommandListener):
+    def __init__(self) -> None:
+        # Spans and fingerprinted commands in flight, by connection and request
+        self.spans: dict[tuple[t.Any, int], tracing.Span] = {}
+        self.commands: dict[tuple[t.Any, int], tuple[str, t.Mapping[str, t.Any]]] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        mongo_commands.inc(event.command_name)
+        commands = operation_commands.get()
+
+        if commands is not None:
+            commands.append(event.command_name)
+
+        captured = captured_commands.get()
+
+        if captured is not None:
+            captured.append(
+                CapturedCommand(
+                    event.database_name, event.command_name, dict(event.command)
+                )
+            )
+
+        is_collection_command = event.command_name in slow_queries.COLLECTION_COMMANDS
+
+        if is_collection_command:
+            key = (event.connection_id, event.request_id)
+            self.commands[key] = (event.database_name, event.command)
+
+        budgets = query_budgets.active_budgets.get()
+
+        if budgets:
+            fingerprint = (
+                slow_queries.get_fingerprint(event.command_name, event.command)
+                if is_collection_command
+                else None
+            )
+
+            for budget in budgets:
+                budget.record(event.command_name, fingerprint)
+
+        if tracing.tracer.is_recording():
+            attributes = {
+                "db.system": "mongodb",
+                "db.name": event.database_name,
+                "db.operation": event.command_name,
+            }
+            span = tracing.tracer.start(f"mongo.{event.command_name}", attributes)
+            self.spans[(event.connection_id, event.request_id)] = span
+
+    def end_span(
+        self,
+        event: t.Union[monitoring.CommandSucceededEvent, monitoring.CommandFailedEvent],
+        error: t.Optional[str] = None,
+    ) -> None:
+        span = self.spans.pop((event.connection_id, event.request_id), None)
+
+        if not span:
+            return
+
+        if error is not None:
+            span.set_error(error)
+
+        tracing.tracer.end(span)
+
+    def record_shape(self, event: monitoring.CommandSucceededEvent) -> None:
+        started_command = self.commands.pop(
+            (event.connection_id, event.request_id), None
+        )
+
+        if not started_command:
+            return
+
+        database_name, command = started_command
+        fingerprint = slow_queries.get_fingerprint(event.command_name, command)
+        seconds = event.duration_micros / 1_000_000
+        shape = slow_queries.query_shapes.record(fingerprint, seconds)
+
+        if seconds * 1000 >= config.SLOW_QUERY_THRESHOLD_MS:
+            slow_query = slow_queries.SlowQuery(
+                database_name, event.command_name, command, shape, seconds
+            )
+            slow_queries.slow_query_log.submit(slow_query)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        mongo_command_seconds.observe(
+            event.duration_micros / 1_000_000, event.command_name
+        )
+        self.end_span(event)
+        self.record_shape(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        mongo_command_failures.inc(event.command_name)
+        mongo_command_seconds.observe(
+            event.duration_micros / 1_000_000, event.command_name
+        )
+        self.end_span(event, str(event.failure))
+        self.commands.pop((event.connection_id, event.request_id), None)
+
+
+@contextmanager
+def capture_commands() -> t.Iterator[list[CapturedCommand]]:
+    commands: list[CapturedCommand] = []
+    token = captured_commands.set(commands)
+
+    try:
+        yield commands
+    finally:
+        captured_commands.reset(token)
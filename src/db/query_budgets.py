@@ -0,0 +1,94 @@
+import logging
+import typing as t
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+MODE_OFF = "off"
+MODE_LOG = "log"
+MODE_ENFORCE = "enforce"
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryBudget:
+    # Commands issued while it's active, along with the fingerprint of those reading
+    # or writing collections, which tell queries repeated in loops
+    def __init__(
+        self, max_commands: int, max_repeats: int, log_only: bool, label: str
+    ) -> None:
+        self.max_commands = max_commands
+        self.max_repeats = max_repeats
+        self.log_only = log_only
+        self.label = label
+        self.commands: list[tuple[str, t.Optional[str]]] = []
+
+    def record(self, command_name: str, fingerprint: t.Optional[str]) -> None:
+        # Appending is atomic, and commands are recorded from the driver's threads
+        self.commands.append((command_name, fingerprint))
+
+    def get_violations(self) -> list[str]:
+        violations: list[str] = []
+
+        if len(self.commands) > self.max_commands:
+            violations.append(
+                f"{len(self.commands)} commands issued, over the budget of "
+                f"{self.max_commands}"
+            )
+
+        fingerprints = Counter(
+            fingerprint for _, fingerprint in self.commands if fingerprint
+        )
+
+        for fingerprint, count in fingerprints.most_common():
+            if count <= self.max_repeats:
+                break
+
+            violations.append(
+                f"Same query issued {count} times, over the budget of "
+                f"{self.max_repeats}: {fingerprint}"
+            )
+
+        return violations
+
+    def enforce(self) -> None:
+        violations = self.get_violations()
+
+        if not violations:
+            return
+
+        message = f"Query budget exceeded by {self.label}: " + "; ".join(violations)
+
+        if self.log_only:
+            logger.warning(message)
+            return
+
+        raise QueryBudgetExceeded(message)
+
+
+# Budgets may be nested, every one of them counts the commands issued within it
+active_budgets: ContextVar[tuple[QueryBudget, ...]] = ContextVar(
+    "active_budgets", default=()
+)
+
+
+@contextmanager
+def query_budget(
+    max_commands: int,
+    max_repeats: int,
+    log_only: bool = False,
+    label: str = "block",
+) -> t.Iterator[QueryBudget]:
+    budget = QueryBudget(max_commands, max_repeats, log_only, label)
+    token = active_budgets.set(active_budgets.get() + (budget,))
+
+    try:
+        yield budget
+    finally:
+        active_budgets.reset(token)
+
+    budget.enforce()
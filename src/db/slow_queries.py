@@ -0,0 +1,309 @@
+import asyncio
+import json
+import logging
+import math
+import threading
+import typing as t
+from collections import OrderedDict, deque
+from motor.core import AgnosticClient
+from src import config, metrics
+
+logger = logging.getLogger(__name__)
+
+# Commands reading or writing a collection, the ones worth fingerprinting
+COLLECTION_COMMANDS = frozenset(
+    ["find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"]
+)
+EXPLAINABLE_COMMANDS = frozenset(["find", "aggregate", "count", "distinct"])
+# Session and routing fields the driver adds, which `explain` doesn't take
+DRIVER_FIELDS = frozenset(["lsid", "txnNumber", "autocommit", "startTransaction"])
+
+logged_slow_queries = metrics.registry.register(
+    metrics.Counter("chatql_slow_queries_logged_total", "Slow queries logged")
+)
+dropped_slow_queries = metrics.registry.register(
+    metrics.Counter(
+        "chatql_slow_queries_dropped_total", "Slow queries not logged, e.g. when full"
+    )
+)
+queued_slow_queries = metrics.registry.register(
+    metrics.Gauge("chatql_slow_queries_queued", "Slow queries waiting to be logged")
+)
+
+
+def get_shape(value: t.Any) -> t.Any:
+    # Values are left out, only the keys and operators used are kept
+    if isinstance(value, t.Mapping):
+        return {key: get_shape(item) for key, item in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        shapes: list[t.Any] = []
+
+        for item in value:
+            shape = get_shape(item)
+
+            if shape not in shapes:
+                shapes.append(shape)
+
+        return shapes
+
+    return "?"
+
+
+def get_stage_shape(stage: t.Mapping[str, t.Any]) -> t.Any:
+    shape: dict[str, t.Any] = {}
+
+    for name, spec in stage.items():
+        if name == "$lookup" and isinstance(spec, t.Mapping):
+            shape[name] = {
+                key: get_pipeline_shape(value) if key == "pipeline" else value
+                for key, value in spec.items()
+                if key != "let"
+            }
+        elif name == "$sort":
+            shape[name] = dict(spec)
+        else:
+            shape[name] = get_shape(spec)
+
+    return shape
+
+
+def get_pipeline_shape(pipeline: t.Sequence[t.Mapping[str, t.Any]]) -> list[t.Any]:
+    return [get_stage_shape(stage) for stage in pipeline]
+
+
+def get_fingerprint(command_name: str, command: t.Mapping[str, t.Any]) -> str:
+    shape: dict[str, t.Any] = {
+        "command": command_name,
+        "collection": command.get(command_name),
+    }
+
+    for key in ("filter", "query"):
+        if key in command:
+            shape["filter"] = get_shape(command[key])
+
+    if "sort" in command:
+        shape["sort"] = dict(command["sort"])
+
+    if "pipeline" in command:
+        shape["pipeline"] = get_pipeline_shape(command["pipeline"])
+
+    for key in ("updates", "deletes"):
+        if key in command:
+            shape["filter"] = get_shape([item.get("q") for item in command[key]])
+
+    return json.dumps(shape, sort_keys=True, default=str)
+
+
+def get_explain_command(command: t.Mapping[str, t.Any]) -> dict[str, t.Any]:
+    return {
+        key: value
+        for key, value in command.items()
+        if not key.startswith("$") and key not in DRIVER_FIELDS
+    }
+
+
+def get_plan_stages(plan: t.Mapping[str, t.Any]) -> list[t.Mapping[str, t.Any]]:
+    # Every stage of a plan, including each branch of e.g. SORT_MERGE and OR stages
+    if not plan:
+        return []
+
+    stages = [plan]
+
+    for key in ("inputStage", "outerStage", "innerStage"):
+        if key in plan:
+            stages += get_plan_stages(plan[key])
+
+    for input_stage in plan.get("inputStages", []):
+        stages += get_plan_stages(input_stage)
+
+    return stages
+
+
+def get_plan_summary(plan: t.Mapping[str, t.Any]) -> str:
+    # Stages of the winning plan from the root down, e.g. "LIMIT < FETCH < IXSCAN"
+    summaries: list[str] = []
+
+    for stage in get_plan_stages(plan):
+        name = stage.get("stage", "?")
+        index_name = stage.get("indexName")
+        summaries.append(f"{name} {index_name}" if index_name else name)
+
+    return " < ".join(summaries)
+
+
+def get_winning_plan(explain_result: t.Mapping[str, t.Any]) -> t.Mapping[str, t.Any]:
+    query_planner = explain_result.get("queryPlanner")
+
+    if query_planner is None:  # Aggregations explain their first stage's cursor
+        stages = explain_result.get("stages") or [{}]
+        query_planner = stages[0].get("$cursor", {}).get("queryPlanner", {})
+
+    winning_plan: t.Mapping[str, t.Any] = query_planner.get("winningPlan", {})
+    # Newer servers nest the plan of the slot based engine
+    return winning_plan.get("queryPlan", winning_plan)
+
+
+class QueryShape:
+    def __init__(self, fingerprint: str, sample_size: int) -> None:
+        self.fingerprint = fingerprint
+        self.count = 0
+        self.total_seconds = 0.0
+        self.durations: deque[float] = deque(maxlen=sample_size)  # Most recent
+        self.plan: t.Optional[str] = None
+
+    def get_p99_seconds(self) -> float:
+        durations = sorted(self.durations)
+
+        if not durations:
+            return 0.0
+
+        return durations[math.ceil(len(durations) * 0.99) - 1]
+
+    def to_dict(self) -> dict[str, t.Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "totalMs": self.total_seconds * 1000,
+            "p99Ms": self.get_p99_seconds() * 1000,
+            "plan": self.plan,
+        }
+
+
+class QueryShapes:
+    # Recorded from the driver's threads. Least recently run shapes are dropped past
+    # `max_size`
+    def __init__(self, max_size: int, sample_size: int = 1000) -> None:
+        self.max_size = max_size
+        self.sample_size = sample_size
+        self.shapes: OrderedDict[str, QueryShape] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def record(self, fingerprint: str, seconds: float) -> QueryShape:
+        with self.lock:
+            shape = self.shapes.get(fingerprint)
+
+            if shape is None:
+                shape = self.shapes[fingerprint] = QueryShape(
+                    fingerprint, self.sample_size
+                )
+            else:
+                self.shapes.move_to_end(fingerprint)
+
+            shape.count += 1
+            shape.total_seconds += seconds
+            shape.durations.append(seconds)
+
+            while len(self.shapes) > self.max_size:
+                self.shapes.popitem(last=False)
+
+        return shape
+
+    def top(self, limit: int) -> list[dict[str, t.Any]]:
+        # Costliest first, by the total time spent on them
+        with self.lock:
+            shapes = sorted(
+                self.shapes.values(),
+                key=lambda shape: shape.total_seconds,
+                reverse=True,
+            )
+            return [shape.to_dict() for shape in shapes[:limit]]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.shapes.clear()
+
+
+query_shapes = QueryShapes(max_size=config.QUERY_SHAPES_MAX_SIZE)
+
+
+class SlowQuery(t.NamedTuple):
+    database_name: str
+    command_name: str
+    command: t.Mapping[str, t.Any]
+    shape: QueryShape
+    seconds: float
+
+
+class SlowQueryLog:
+    # Logs commands over the threshold along with their shape's plan, explained once
+    # per shape outside of the driver's threads. Past `max_queue_size` they're dropped
+    def __init__(self, max_queue_size: int = 100) -> None:
+        self.max_queue_size = max_queue_size
+        self.queue: t.Optional[asyncio.Queue[SlowQuery]] = None
+        self.loop: t.Optional[asyncio.AbstractEventLoop] = None
+
+    def enqueue(self, slow_query: SlowQuery) -> None:
+        if not self.queue or self.queue.full():
+            dropped_slow_queries.inc()
+            return
+
+        self.queue.put_nowait(slow_query)
+
+    def submit(self, slow_query: SlowQuery) -> None:
+        # Called from the driver's threads
+        if not self.loop:
+            dropped_slow_queries.inc()
+            return
+
+        self.loop.call_soon_threadsafe(self.enqueue, slow_query)
+
+    async def explain(
+        self,
+        client: AgnosticClient,  # type: ignore[type-arg]
+        slow_query: SlowQuery,
+    ) -> str:
+        if slow_query.command_name not in EXPLAINABLE_COMMANDS:
+            return "not explained"
+
+        command = get_explain_command(slow_query.command)
+
+        try:
+            result = await client[slow_query.database_name].command(
+                {"explain": command, "verbosity": "queryPlanner"}
+            )
+        except Exception as error:
+            return f"explain failed: {error}"
+
+        return get_plan_summary(get_winning_plan(result))
+
+    async def log(
+        self,
+        client: AgnosticClient,  # type: ignore[type-arg]
+        slow_query: SlowQuery,
+    ) -> None:
+        shape = slow_query.shape
+
+        if shape.plan is None:
+            shape.plan = await self.explain(client, slow_query)
+
+        logger.warning(
+            "Slow query took %.1f ms: %s, plan: %s",
+            slow_query.seconds * 1000,
+            shape.fingerprint,
+            shape.plan,
+        )
+        logged_slow_queries.inc()
+
+    async def run(self, client: AgnosticClient) -> None:  # type: ignore[type-arg]
+        queue: asyncio.Queue[SlowQuery] = asyncio.Queue(self.max_queue_size)
+        self.queue = queue
+        self.loop = asyncio.get_running_loop()
+
+        try:
+            while True:
+                slow_query = await queue.get()
+                await self.log(client, slow_query)
+                queue.task_done()
+        finally:
+            self.queue = None
+            self.loop = None
+
+
+slow_query_log = SlowQueryLog()
+
+
+@metrics.registry.add_collector
+async def collect_slow_query_log() -> None:
+    queue = slow_query_log.queue
+    queued_slow_queries.set(queue.qsize() if queue else 0)
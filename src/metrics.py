@@ -0,0 +1,253 @@
+import bisect
+import threading
+import typing as t
+from abc import ABC, abstractmethod
+
+LabelValues = tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+OTHER_LABEL = "other"
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: t.Sequence[str], values: t.Sequence[str]) -> str:
+    if not names:
+        return ""
+
+    pairs = [
+        f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values)
+    ]
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value))
+
+
+class Metric(ABC):
+    type = "untyped"
+
+    # Series past `max_series` are aggregated under "other", as label values may
+    # come from clients, e.g. operation names
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: t.Sequence[str] = (),
+        max_series: int = 1000,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.max_series = max_series
+        # Updated from the driver's threads too
+        self.lock = threading.Lock()
+
+    def get_key(
+        self, label_values: LabelValues, series: dict[LabelValues, t.Any]
+    ) -> LabelValues:
+        if label_values in series or len(series) < self.max_series:
+            return label_values
+
+        return (OTHER_LABEL,) * len(self.label_names)
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+
+    @abstractmethod
+    def clear(self) -> None:
+        raise NotImplementedError  # pragma: no cover
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: t.Sequence[str] = (),
+        max_series: int = 1000,
+    ) -> None:
+        super().__init__(name, documentation, label_names, max_series)
+        self.values: dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self.lock:
+            key = self.get_key(label_values, self.values)
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, *label_values: str) -> float:
+        return self.values.get(label_values, 0)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+
+        with self.lock:
+            values = list(self.values.items())
+
+        for label_values, value in values:
+            labels = format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}{labels} {format_value(value)}")
+
+        return lines
+
+    def clear(self) -> None:
+        with self.lock:
+            self.values.clear()
+
+
+class HistogramSeries:
+    def __init__(self, size: int) -> None:
+        self.counts = [0] * size  # Per bucket, the last one being +Inf
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: t.Sequence[str] = (),
+        buckets: t.Sequence[float] = DEFAULT_BUCKETS,
+        max_series: int = 1000,
+    ) -> None:
+        super().__init__(name, documentation, label_names, max_series)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.series: dict[LabelValues, HistogramSeries] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self.lock:
+            key = self.get_key(label_values, self.series)
+            series = self.series.get(key)
+
+            if series is None:
+                series = self.series[key] = HistogramSeries(len(self.buckets))
+
+            series.counts[index] += 1
+            series.sum += value
+            series.count += 1
+
+    def get(self, *label_values: str) -> t.Optional[HistogramSeries]:
+        return self.series.get(label_values)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        bucket_label_names = self.label_names + ("le",)
+
+        with self.lock:
+            series = [
+                (label_values, list(item.counts), item.sum, item.count)
+                for label_values, item in self.series.items()
+            ]
+
+        for label_values, counts, total, count in series:
+            cumulative_count = 0
+
+            for bucket, bucket_count in zip(self.buckets, counts):
+                cumulative_count += bucket_count
+                labels = format_labels(
+                    bucket_label_names, label_values + (format_value(bucket),)
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative_count}")
+
+            labels = format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+
+        return lines
+
+    def clear(self) -> None:
+        with self.lock:
+            self.series.clear()
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: t.Sequence[str] = (),
+        max_series: int = 1000,
+    ) -> None:
+        super().__init__(name, documentation, label_names, max_series)
+        self.values: dict[LabelValues, float] = {}
+
+    def set(self, value: float, *label_values: str) -> None:
+        with self.lock:
+            key = self.get_key(label_values, self.values)
+            self.values[key] = value
+
+    def get(self, *label_values: str) -> t.Optional[float]:
+        return self.values.get(label_values)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+
+        with self.lock:
+            values = list(self.values.items())
+
+        for label_values, value in values:
+            labels = format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}{labels} {format_value(value)}")
+
+        return lines
+
+    def clear(self) -> None:
+        with self.lock:
+            self.values.clear()
+
+
+MetricT = t.TypeVar("MetricT", bound=Metric)
+Collector = t.Callable[[], t.Awaitable[None]]
+CollectorT = t.TypeVar("CollectorT", bound=Collector)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: list[Metric] = []
+        # Update gauges, e.g. cache sizes, when metrics are scraped
+        self.collectors: list[Collector] = []
+
+    def register(self, metric: MetricT) -> MetricT:
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: CollectorT) -> CollectorT:
+        self.collectors.append(collector)
+        return collector
+
+    async def collect(self) -> None:
+        for collector in self.collectors:
+            await collector()
+
+    def render(self) -> str:
+        lines: list[str] = []
+
+        for metric in self.metrics:
+            lines += metric.render()
+
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        for metric in self.metrics:
+            metric.clear()
+
+
+registry = Registry()
@@ -0,0 +1,317 @@
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import typing as t
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+from src import config, metrics
+
+SERVICE_NAME = "chatql"
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+INVALID_TRACE_ID = "0" * 32
+INVALID_SPAN_ID = "0" * 16
+# OTLP status codes
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+SPAN_KIND_INTERNAL = 1
+
+ClassT = t.TypeVar("ClassT", bound=type)
+ReturnT = t.TypeVar("ReturnT")
+
+exported_spans = metrics.registry.register(
+    metrics.Counter("chatql_trace_spans_exported_total", "Spans written out")
+)
+dropped_spans = metrics.registry.register(
+    metrics.Counter("chatql_trace_spans_dropped_total", "Spans past the queue size")
+)
+queued_spans = metrics.registry.register(
+    metrics.Gauge("chatql_trace_spans_queued", "Spans waiting for the next flush")
+)
+
+
+def new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"  # nosec
+
+
+def parse_traceparent(value: str) -> t.Optional[tuple[str, str, bool]]:
+    # W3C trace context: version-trace_id-parent_id-flags
+    match = TRACEPARENT_PATTERN.match(value.strip().lower())
+
+    if not match:
+        return None
+
+    trace_id, span_id, flags = match.groups()
+
+    if trace_id == INVALID_TRACE_ID or span_id == INVALID_SPAN_ID:
+        return None
+
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+def encode_attribute_value(value: t.Any) -> dict[str, t.Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+
+    if isinstance(value, float):
+        return {"doubleValue": value}
+
+    return {"stringValue": str(value)}
+
+
+class Span:
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_span_id: t.Optional[str],
+        sampled: bool,
+        attributes: t.Optional[dict[str, t.Any]] = None,
+    ) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_id(64) if sampled else INVALID_SPAN_ID
+        self.parent_span_id = parent_span_id
+        self.sampled = sampled
+        self.attributes = attributes or {}
+        self.error: t.Optional[str] = None
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns: t.Optional[int] = None
+
+    @property
+    def traceparent(self) -> t.Optional[str]:
+        # Unsampled traces aren't propagated, whoever receives them decides anew
+        if not self.sampled:
+            return None
+
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: t.Any) -> None:
+        if self.sampled:
+            self.attributes[key] = value
+
+    def set_error(self, message: str) -> None:
+        if self.sampled:
+            self.error = message
+
+    def to_otlp(self) -> dict[str, t.Any]:
+        data: dict[str, t.Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_time_ns),
+            "endTimeUnixNano": str(self.end_time_ns),
+            "attributes": [
+                {"key": key, "value": encode_attribute_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": {"code": STATUS_UNSET},
+        }
+
+        if self.parent_span_id:
+            data["parentSpanId"] = self.parent_span_id
+
+        if self.error is not None:
+            data["status"] = {"code": STATUS_ERROR, "message": self.error}
+
+        return data
+
+
+# Shared by everything running outside of sampled traces
+NON_RECORDING_SPAN = Span("", INVALID_TRACE_ID, None, sampled=False)
+current_span: ContextVar[t.Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class FileExporter:
+    # Writes finished spans as OTLP/JSON lines, one batch per line, which OTLP
+    # collectors' file receivers can replay. Spans past `max_queue_size` are dropped
+    # rather than held up until the next flush
+    def __init__(self, path: str, max_queue_size: int) -> None:
+        self.path = path
+        self.max_queue_size = max_queue_size
+        self.spans: list[Span] = []
+        self.lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self.lock:
+            if len(self.spans) >= self.max_queue_size:
+                dropped_spans.inc()
+                return
+
+            self.spans.append(span)
+
+    def flush(self) -> None:
+        with self.lock:
+            spans, self.spans = self.spans, []
+
+        if not spans:
+            return
+
+        data = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": encode_attribute_value(SERVICE_NAME),
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": SERVICE_NAME},
+                            "spans": [span.to_otlp() for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(data, separators=(",", ":")) + "\n")
+
+        exported_spans.inc(amount=len(spans))
+
+    async def run(self) -> None:
+        try:
+            while True:
+                await asyncio.sleep(config.TRACING_FLUSH_SECONDS)
+                await asyncio.to_thread(self.flush)
+        finally:
+            self.flush()
+
+
+class Tracer:
+    def __init__(self, exporter: FileExporter, sample_rate: float) -> None:
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def is_enabled(self) -> bool:
+        # The exporter only runs while enabled, so nothing is recorded otherwise,
+        # even for remote parents that were sampled
+        return self.sample_rate > 0
+
+    def is_recording(self) -> bool:
+        # Lets hot paths skip spans that couldn't be sampled
+        span = current_span.get()
+
+        if span is None:
+            return self.is_enabled()
+
+        return span.sampled
+
+    def start(
+        self,
+        name: str,
+        attributes: t.Optional[dict[str, t.Any]] = None,
+        traceparent: t.Optional[str] = None,
+    ) -> Span:
+        # Children of spans from other processes, e.g. through events, or of the
+        # current span. Otherwise roots, sampled at `sample_rate`
+        if not self.is_enabled():
+            return NON_RECORDING_SPAN
+
+        remote_parent = parse_traceparent(traceparent) if traceparent else None
+        parent = current_span.get()
+
+        if remote_parent:
+            trace_id, parent_span_id, sampled = remote_parent
+        elif parent:
+            trace_id, parent_span_id, sampled = (
+                parent.trace_id,
+                parent.span_id,
+                parent.sampled,
+            )
+        else:
+            sampled = random.random() < self.sample_rate  # nosec
+            trace_id, parent_span_id = (
+                new_id(128) if sampled else INVALID_TRACE_ID
+            ), None
+
+        if not sampled:
+            return NON_RECORDING_SPAN
+
+        return Span(name, trace_id, parent_span_id, sampled, attributes)
+
+    def end(self, span: Span) -> None:
+        if not span.sampled or span.end_time_ns is not None:
+            return
+
+        span.end_time_ns = time.time_ns()
+        self.exporter.export(span)
+
+    @contextmanager
+    def start_span(
+        self,
+        name: str,
+        attributes: t.Optional[dict[str, t.Any]] = None,
+        traceparent: t.Optional[str] = None,
+    ) -> t.Iterator[Span]:
+        span = self.start(name, attributes, traceparent)
+        token = current_span.set(span)
+
+        try:
+            yield span
+        except Exception as error:
+            span.set_error(f"{type(error).__name__}: {error}")
+            raise
+        finally:
+            current_span.reset(token)
+            self.end(span)
+
+
+exporter = FileExporter(
+    config.TRACING_FILE, max_queue_size=config.TRACING_MAX_QUEUE_SIZE
+)
+tracer = Tracer(exporter, sample_rate=config.TRACING_SAMPLE_RATE)
+
+
+@metrics.registry.add_collector
+async def collect_exporter() -> None:
+    queued_spans.set(len(exporter.spans))
+
+
+def get_traceparent() -> t.Optional[str]:
+    span = current_span.get()
+    return span.traceparent if span else None
+
+
+def traced(
+    name: str,
+) -> t.Callable[
+    [t.Callable[..., t.Awaitable[ReturnT]]], t.Callable[..., t.Awaitable[ReturnT]]
+]:
+    def decorator(
+        f: t.Callable[..., t.Awaitable[ReturnT]]
+    ) -> t.Callable[..., t.Awaitable[ReturnT]]:
+        @wraps(f)
+        async def wrapper(*args: t.Any, **kwargs: t.Any) -> ReturnT:
+            if not tracer.is_recording():
+                return await f(*args, **kwargs)
+
+            with tracer.start_span(name):
+                return await f(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def trace_methods(cls: ClassT) -> ClassT:
+    # A span per call of the class' public coroutine methods
+    for attr_name, attr in list(vars(cls).items()):
+        if attr_name.startswith("_") or not iscoroutinefunction(attr):
+            continue
+
+        setattr(cls, attr_name, traced(f"{cls.__name__}.{attr_name}")(attr))
+
+    return cls
@@ -1,3 +1,4 @@
+import typing as t
 import pytest
 from src import config
 from src.api.graphql import schema
@@ -87,7 +88,8 @@ async def test_not_supported_url() -> None:
 
 
 @pytest.mark.asyncio
-async def test_success() -> None:
+async def test_success(query_budget: t.Callable[[int, int], None]) -> None:
+    query_budget(7, 2)
     mutation = """
         mutation TestMutation($payload: UserAuthenticationInput!) {
             authenticateUser(payload: $payload) {
@@ -0,0 +1,115 @@
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from graphql import GraphQLError
+from strawberry.types import ExecutionResult
+from src.app import app
+from src.api.graphql.base import cache_control
+from src.db.models.user import User
+
+GET_USERS_QUERY = "query { getUsers { success data { id } } }"
+
+
+def test_get_cache_control() -> None:
+    result = ExecutionResult(data={"getUsers": {}, "getUser": {}}, errors=None)
+    error_result = ExecutionResult(data=None, errors=[GraphQLError("Failed")])
+    empty_result = ExecutionResult(data=None, errors=None)
+
+    assert cache_control.get_cache_control(error_result, {}) == "no-store"
+    assert cache_control.get_cache_control(empty_result, {}) == "no-store"
+    assert cache_control.get_cache_control(result, {"getUsers": 60}) == (
+        "private, no-cache"
+    )
+    assert cache_control.get_cache_control(result, {"getUsers": 60, "getUser": 10}) == (
+        "private, max-age=10"
+    )
+
+    hints = {"getUsers": 60, "getUser": 10}
+    assert cache_control.get_cache_control(result, hints, failed=True) == "no-store"
+
+    scalar_result = ExecutionResult(data={"count": 1}, errors=None)
+    assert cache_control.get_cache_control(scalar_result, {"count": 5}) == (
+        "private, max-age=5"
+    )
+
+
+@pytest.mark.parametrize(
+    ["if_none_match", "matches"],
+    [
+        ('W/"a"', True),
+        ('"a"', True),
+        ('"b", W/"a"', True),
+        ("*", True),
+        ('"b"', False),
+        ("", False),
+    ],
+)
+def test_matches_etag(if_none_match: str, matches: bool) -> None:
+    assert cache_control.matches_etag(if_none_match, 'W/"a"') == matches
+
+
+@pytest.mark.asyncio
+async def test_conditional_get(jon: User, jon_token: str) -> None:
+    headers = {"Authorization": f"Bearer {jon_token}"}
+    params = {"query": GET_USERS_QUERY}
+
+    with TestClient(app) as client:
+        response = client.get("/graphql", params=params, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["data"]["getUsers"]["data"] == [{"id": str(jon.id)}]
+        assert response.headers["cache-control"] == "private, max-age=60"
+        assert response.headers["vary"] == "Authorization"
+        etag = response.headers["etag"]
+
+        headers["If-None-Match"] = etag
+        response = client.get("/graphql", params=params, headers=headers)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers["etag"] == etag
+        assert not response.content
+
+
+@pytest.mark.asyncio
+async def test_unauthenticated_get() -> None:
+    # Authentication failures are payloads of their own, which aren't stored
+    with TestClient(app) as client:
+        response = client.get(
+            "/graphql", params={"query": "query { getUsers { data { id } } }"}
+        )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"]["getUsers"]["data"] is None
+    assert response.headers["cache-control"] == "no-store"
+    assert "etag" not in response.headers
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("selection", ["success", "data { id }"])
+async def test_failed_payload_get(jon_token: str, selection: str) -> None:
+    # Failures aren't stored whether or not the client selected them
+    headers = {"Authorization": f"Bearer {jon_token}"}
+    query = f'query {{ getUser(userId: "123456789012345678901234") {{ {selection} }} }}'
+
+    with TestClient(app) as client:
+        response = client.get("/graphql", params={"query": query}, headers=headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert "errors" not in response.json()
+    assert response.headers["cache-control"] == "no-store"
+    assert "etag" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_uncacheable_requests(jon_token: str) -> None:
+    headers = {"Authorization": f"Bearer {jon_token}"}
+    mutation = 'mutation { refreshToken(refreshToken: "") { success } }'
+
+    with TestClient(app) as client:
+        post_response = client.post(
+            "/graphql", json={"query": GET_USERS_QUERY}, headers=headers
+        )
+        mutation_response = client.get("/graphql", params={"query": mutation})
+
+    assert post_response.status_code == status.HTTP_200_OK
+    assert "etag" not in post_response.headers
+    assert mutation_response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "etag" not in mutation_response.headers
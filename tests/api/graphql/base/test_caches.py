@@ -0,0 +1,237 @@
+import typing as t
+import pytest
+from beanie import Link
+from src import config
+from src.api.graphql.base import caches
+from src.api.graphql.broadcast import broadcast
+from src.db.models import user as user_models
+from src.db.models import message as message_models
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.values: dict[str, t.Any] = {}
+
+    async def get(self, key: str) -> t.Optional[t.Any]:
+        return self.values.get(key)
+
+    async def set(self, key: str, value: t.Any, ex: int) -> None:
+        self.values[key] = value
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self.values.pop(key, None)
+
+    async def scan_iter(self, match: str) -> t.AsyncGenerator[str, None]:
+        for key in list(self.values):
+            if key.startswith(match.rstrip("*")):
+                yield key
+
+
+@pytest.mark.asyncio
+async def test_memory_backend() -> None:
+    backend = caches.MemoryCacheBackend(max_size=2, ttl_seconds=10)
+
+    await backend.set("a", 1)
+    await backend.set("b", 2)
+    assert await backend.get("a") == 1  # Makes `b` the least recently used
+    await backend.set("c", 3)
+    assert await backend.get("b") is None
+    assert await backend.size() == 2
+
+    await backend.delete("c")
+    await backend.delete("c")
+    assert await backend.size() == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_expired() -> None:
+    backend = caches.MemoryCacheBackend(max_size=2, ttl_seconds=0)
+
+    await backend.set("a", 1)
+    assert await backend.get("a") is None
+    assert await backend.size() == 0
+
+
+@pytest.mark.asyncio
+async def test_redis_backend() -> None:
+    client = FakeRedis()
+    backend = caches.RedisCacheBackend(client, "users", ttl_seconds=10)
+    other_backend = caches.RedisCacheBackend(client, "channels", ttl_seconds=10)
+
+    await backend.set("a", "1")
+    await other_backend.set("a", "2")
+    assert await backend.get("a") == "1"
+    assert await backend.size() == 1
+
+    await backend.delete("a")
+    assert await backend.get("a") is None
+
+    await backend.clear()
+    await other_backend.clear()
+    assert not client.values
+
+
+def test_make_backend(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert isinstance(caches.make_backend("users"), caches.MemoryCacheBackend)
+
+    monkeypatch.setattr(config, "CACHE_URL", "redis://localhost:6379")
+    monkeypatch.setattr(caches, "connect_redis", lambda url: FakeRedis())
+    backend = caches.make_backend("users")
+    assert isinstance(backend, caches.RedisCacheBackend)
+    assert backend.prefix == "cache:users:"
+
+
+@pytest.mark.asyncio
+async def test_dump_document(
+    jon: user_models.User, jon_channel: message_models.Channel
+) -> None:
+    message = await message_models.Message(
+        sender=jon, channel=jon_channel, content="Test message", sequence=1
+    ).save()
+    data = caches.dump_document(message)
+    assert data["content"] == "Test message"
+    assert data["sender"]["email"] == jon.email
+    assert data["channel"]["_id"] == str(jon_channel.id)
+    assert "messages" not in data["channel"]
+
+    db_message = await message_models.Message.get(message.id)  # Links not fetched
+    assert db_message
+    data = caches.dump_document(db_message)
+    assert data["sender"] == {"id": str(jon.id), "collection": "users"}
+    loaded_message = message_models.Message.model_validate(data)
+    assert isinstance(loaded_message.sender, Link)
+    assert loaded_message.sender.ref.id == jon.id
+
+    db_channel = await message_models.Channel.get(jon_channel.id)
+    assert db_channel
+    data = caches.dump_document(db_channel, back_links=["messages"])  # Not fetched
+    assert data["messages"] == []
+
+
+@pytest.mark.asyncio
+async def test_entity_cache(jon: user_models.User) -> None:
+    cache = caches.EntityCache(
+        "test-users", user_models.User, caches.MemoryCacheBackend(10, 10)
+    )
+    loads = 0
+
+    async def load_user() -> user_models.User:
+        nonlocal loads
+        loads += 1
+        return jon
+
+    async def load_missing_user() -> t.Optional[user_models.User]:
+        return None
+
+    assert await cache.get("jon", load_user) is jon
+    assert await cache.get("jon", load_user) is jon
+    assert await cache.get("mary", load_missing_user) is None
+    assert loads == 1
+    assert caches.entity_cache_hits.get("test-users") == 1
+    assert caches.entity_cache_misses.get("test-users") == 2
+
+    await caches.collect_entity_caches()
+    assert caches.entity_cache_hit_ratio.get("test-users") == 1 / 3
+    assert caches.entity_cache_size.get("test-users") == 1
+    assert caches.entity_cache_hit_ratio.get("users") == 0  # Not read yet
+
+    await cache.clear()
+    assert await cache.get("jon", load_missing_user) is None
+
+
+@pytest.mark.asyncio
+async def test_entity_cache_load_racing_invalidation(jon: user_models.User) -> None:
+    cache = caches.EntityCache(
+        "test-users", user_models.User, caches.MemoryCacheBackend(10, 10)
+    )
+
+    async def load_user() -> user_models.User:
+        await cache.evict("jon")  # Simulates an invalidation received during the load
+        return jon
+
+    assert await cache.get("jon", load_user) is jon
+    assert await cache.backend.size() == 0
+
+
+@pytest.mark.asyncio
+async def test_entity_cache_shared_backend(
+    common_channel: message_models.Channel,
+) -> None:
+    cache = caches.EntityCache(
+        "test-channels",
+        message_models.Channel,
+        caches.RedisCacheBackend(FakeRedis(), "channels", 10),
+    )
+    channel = await message_models.Channel.find_one(
+        message_models.Channel.id == common_channel.id, fetch_links=True
+    )
+    channel = t.cast(message_models.Channel, channel)
+
+    async def load_channel() -> message_models.Channel:
+        return channel
+
+    assert await cache.get("common", load_channel) is channel
+    cached_channel = await cache.get("common", load_channel)
+    assert cached_channel
+    assert cached_channel is not channel
+    assert cached_channel.id == common_channel.id
+    members = t.cast(list[user_models.User], cached_channel.members)
+    expected_members = t.cast(list[user_models.User], common_channel.members)
+    assert sorted(member.email for member in members) == sorted(
+        member.email for member in expected_members
+    )
+
+
+@pytest.mark.asyncio
+async def test_entity_cache_invalidate(
+    jon: user_models.User, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    published: list[tuple[str, str]] = []
+
+    async def mock_publish(channel: str, message: str) -> None:
+        published.append((channel, message))
+
+    monkeypatch.setattr(broadcast, "publish", mock_publish)
+    evicted_keys: list[str] = []
+    cache = caches.EntityCache(
+        "test-users",
+        user_models.User,
+        caches.MemoryCacheBackend(10, 10),
+        on_evict=evicted_keys.append,
+    )
+    await cache.backend.set("jon", jon)
+
+    await cache.invalidate("jon")
+    assert await cache.backend.get("jon") is None
+    assert evicted_keys == ["jon"]
+    event = caches.CacheInvalidationEvent(entity="test-users", key="jon")
+    assert published == [(caches.INVALIDATION_CHANNEL, event.model_dump_json())]
+
+
+@pytest.mark.asyncio
+async def test_entity_cache_reset() -> None:
+    resets: list[bool] = []
+    cache = caches.EntityCache(
+        "test-users",
+        user_models.User,
+        caches.MemoryCacheBackend(10, 10),
+        on_reset=lambda: resets.append(True),
+    )
+    await cache.backend.set("jon", 1)
+    version = cache.version
+
+    await cache.reset()
+    assert await cache.backend.get("jon") is None
+    assert cache.version == version + 1
+    assert resets == [True]
+
+    shared_cache = caches.EntityCache(
+        "test-channels",
+        message_models.Channel,
+        caches.RedisCacheBackend(FakeRedis(), "channels", 10),
+    )
+    await shared_cache.backend.set("common", "{}")
+
+    await shared_cache.reset()  # Kept, other workers' invalidations reached it
+    assert await shared_cache.backend.get("common") == "{}"
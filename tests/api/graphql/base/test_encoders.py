@@ -0,0 +1,36 @@
+import pytest
+from datetime import datetime
+from src.api.graphql.base import encoders
+
+
+@pytest.mark.parametrize("encoder", [encoders.JsonEncoder(), encoders.OrjsonEncoder()])
+def test_encoder_dumps(encoder: encoders.JsonEncoder) -> None:
+    data = {"content": "Olá", "createdAt": datetime(2024, 1, 2, 3, 4, 5), "ids": [1]}
+    expected = '{"content":"Olá","createdAt":"2024-01-02T03:04:05","ids":[1]}'
+    assert encoder.dumps(data) == expected
+    assert encoder.dumps_bytes(data) == expected.encode()
+
+
+@pytest.mark.parametrize("encoder", [encoders.JsonEncoder(), encoders.OrjsonEncoder()])
+def test_encoder_unsupported_type(encoder: encoders.JsonEncoder) -> None:
+    with pytest.raises(TypeError):
+        encoder.dumps({"value": object()})
+
+
+def test_get_encoder() -> None:
+    assert isinstance(encoders.get_encoder("orjson"), encoders.OrjsonEncoder)
+    assert type(encoders.get_encoder("json")) is encoders.JsonEncoder
+
+
+def test_msgpack_encoder() -> None:
+    encoder = encoders.MsgpackEncoder()
+    data = {"content": "Olá", "createdAt": datetime(2024, 1, 2, 3, 4, 5)}
+    encoded_data = encoder.dumps_bytes({"id": "1"})
+
+    assert encoder.loads(encoder.dumps_bytes(data)) == {
+        "content": "Olá",
+        "createdAt": "2024-01-02T03:04:05",
+    }
+    assert encoder.dumps_with_data({"type": "next"}, encoded_data) == (
+        encoder.dumps_bytes({"type": "next", "payload": {"data": {"id": "1"}}})
+    )
@@ -0,0 +1,123 @@
+import logging
+import typing as t
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+from src import config, tracing
+from src.app import app
+from src.api.graphql import schema
+from src.api.graphql.base import extensions
+from src.db import query_budgets
+
+
+@pytest.mark.asyncio
+async def test_operation_metrics(jon_token: str) -> None:
+    headers = {"Authorization": f"Bearer {jon_token}"}
+    query = """
+        query GetUsers {
+            getUsers { success }
+            getUser(userId: "") { success }
+        }
+    """
+
+    with TestClient(app) as client:
+        client.post("/graphql", json={"query": query}, headers=headers)
+        client.post("/graphql", json={"query": query})
+        response = client.get("/metrics")
+
+    operation_seconds = extensions.operation_seconds.get("query", "GetUsers")
+    assert operation_seconds
+    assert operation_seconds.count == 2
+    assert extensions.operation_commands.get("query", "GetUsers")
+    field_seconds = extensions.field_seconds.get("Query.getUsers")
+    assert field_seconds
+    assert field_seconds.count == 2
+    # Once for the invalid user ID, twice when unauthenticated
+    assert extensions.api_errors.get("USER_NOT_FOUND") == 1
+    assert extensions.api_errors.get("UNAUTHORIZED") == 2
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert (
+        'chatql_graphql_operation_seconds_count{type="query",operation="GetUsers"} 2'
+        in response.text
+    )
+    assert response.text.count("chatql_api_errors_total{") == 2
+
+
+@pytest.mark.asyncio
+async def test_error_metrics() -> None:
+    context = {"request": Request(scope={"type": "http", "headers": []})}
+    await schema.execute("query Invalid { unknown }", context_value=context)
+    await schema.execute("query {", context_value=context)
+
+    assert extensions.operation_errors.get("query", "Invalid") == 1
+    assert extensions.operation_errors.get("unknown", "") == 1
+
+
+@pytest.mark.asyncio
+async def test_operation_spans(
+    jon_token: str, sampled_spans: list[tracing.Span]
+) -> None:
+    traceparent = f"00-{'a' * 32}-{'b' * 16}-01"
+    headers = {"Authorization": f"Bearer {jon_token}", "traceparent": traceparent}
+
+    with TestClient(app) as client:
+        client.post(
+            "/graphql",
+            json={"query": "query GetUsers { getUsers { success } }"},
+            headers=headers,
+        )
+        client.post("/graphql", json={"query": "query Invalid { unknown }"})
+
+    spans = {span.name: span for span in sampled_spans}
+    operation_span, error_span = [
+        span for span in sampled_spans if span.name == "graphql.operation"
+    ]
+    assert operation_span.trace_id == "a" * 32
+    assert operation_span.parent_span_id == "b" * 16
+    assert operation_span.attributes == {
+        "graphql.operation.type": "query",
+        "graphql.operation.name": "GetUsers",
+    }
+    assert operation_span.error is None
+    resolve_span = spans["graphql.resolve"]
+    assert resolve_span.attributes == {"graphql.field": "Query.getUsers"}
+    assert resolve_span.parent_span_id == operation_span.span_id
+    assert spans["UserStore.get_users"].trace_id == operation_span.trace_id
+    assert error_span.trace_id != operation_span.trace_id
+    assert error_span.error
+
+
+@pytest.mark.asyncio
+async def test_operation_span_without_request(
+    sampled_spans: list[tracing.Span],
+) -> None:
+    await schema.execute("query { healthCheck { success } }")
+
+    assert [span.name for span in sampled_spans] == ["graphql.operation"]
+
+
+@pytest.mark.asyncio
+async def test_query_budget(
+    query_budget: t.Callable[[int, int], None],
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    query = "query HealthCheck { healthCheck { success } }"
+    query_budget(-1, 0)  # Any operation is over it
+
+    with pytest.raises(query_budgets.QueryBudgetExceeded) as error:
+        await schema.execute(query)
+
+    assert str(error.value).startswith("Query budget exceeded by HealthCheck")
+
+    monkeypatch.setattr(config, "QUERY_BUDGET_MODE", query_budgets.MODE_LOG)
+
+    with caplog.at_level(logging.WARNING, logger=query_budgets.__name__):
+        result = await schema.execute("query { healthCheck { success } }")
+
+    assert not result.errors
+    assert "anonymous operation" in caplog.records[0].getMessage()
+
+    monkeypatch.setattr(config, "QUERY_BUDGET_MODE", query_budgets.MODE_OFF)
+    result = await schema.execute(query)
+    assert not result.errors
@@ -0,0 +1,218 @@
+import typing as t
+import msgpack
+import pytest
+import strawberry
+from graphql import ExecutionResult, GraphQLError, parse
+from src import config
+from src.api.graphql import schema
+from src.api.graphql.base import encoders, fanout
+
+
+def make_execute(
+    result: ExecutionResult,
+) -> t.Callable[[], t.Awaitable[ExecutionResult]]:
+    async def execute_event() -> ExecutionResult:
+        return result
+
+    return execute_event
+
+
+@pytest.mark.asyncio
+async def test_shared_results() -> None:
+    results = fanout.SharedResults(max_size=1)
+    result = ExecutionResult(data={"newMessage": {"id": "1"}})
+    other_result = ExecutionResult(data={"newMessage": {"id": "2"}})
+    error_result = ExecutionResult(data=None, errors=[GraphQLError("Failed")])
+
+    assert await results.get("a", make_execute(result)) is result
+    assert await results.get("a", make_execute(other_result)) is result
+    assert await results.get("b", make_execute(error_result)) is error_result
+    encoded_data = '{"newMessage":{"id":"1"}}'
+    assert results.encode(result.data, fanout.dump_json) == encoded_data
+    assert results.encode(result.data, fanout.dump_json) == encoded_data
+    # Not a shared result
+    assert results.encode({"newMessage": {"id": "1"}}, fanout.dump_json) is None
+    assert fanout.executions.get() == 2
+    assert fanout.shared_executions.get() == 1
+    assert fanout.encodings.get() == 1
+    assert fanout.shared_encodings.get() == 1
+
+    assert await results.get("c", make_execute(other_result)) is other_result
+    assert results.encode(result.data, fanout.dump_json) is None  # Evicted
+    assert list(results.results) == ["c"]
+
+    results.clear()
+    assert not results.results
+    assert not results.results_by_data
+
+
+@pytest.mark.asyncio
+async def test_collect_shared_results() -> None:
+    result = ExecutionResult(data={"newMessage": {"id": "1"}})
+    await fanout.shared_results.get("a", make_execute(result))
+    await fanout.collect_shared_results()
+    assert fanout.shared_results_size.get() == 1
+
+
+def get_shape_key(
+    query: str, variable_values: t.Optional[dict[str, t.Any]] = None
+) -> t.Optional[str]:
+    return fanout.get_shape_key(parse(query), None, variable_values)
+
+
+def test_get_shape_key() -> None:
+    shape_key = get_shape_key("subscription { newMessage { id } }")
+    assert shape_key
+    assert shape_key == get_shape_key(
+        "subscription Resume { newMessage(sinceSequence: 1) { id } }"
+    )
+    assert shape_key != get_shape_key("subscription { newMessage { id content } }")
+    assert shape_key != get_shape_key("subscription { message: newMessage { id } }")
+    assert shape_key != get_shape_key(
+        "subscription { newMessage { ...Fields } } fragment Fields on Message { id }"
+    )
+    assert get_shape_key("subscription { count }") == "count"
+
+    query = "subscription { newMessage { id content @include(if: $content) } }"
+    assert get_shape_key(query, {"content": True}) != get_shape_key(
+        query, {"content": False}
+    )
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "subscription A { newMessage { id } } subscription B { newMessage { id } }",
+        "subscription { newMessage { id } count }",
+        "subscription { ...Fields } fragment Fields on Subscription { newMessage { id } }",
+    ],
+)
+def test_get_shape_key_unsupported(query: str) -> None:
+    assert get_shape_key(query) is None
+
+
+def test_get_event_key() -> None:
+    class Event:
+        id = "1"
+
+    assert fanout.get_event_key(Event(), "shape") == ("Event", "1", "shape")
+    assert fanout.get_event_key(Event(), None) is None
+    assert fanout.get_event_key(object(), "shape") is None
+
+
+@pytest.mark.asyncio
+async def test_subscribe_error() -> None:
+    result = await schema.subscribe(
+        "subscription { newMessage { id } }", operation_name="Missing"
+    )
+    assert isinstance(result, ExecutionResult)
+    assert result.errors
+
+
+@pytest.mark.asyncio
+async def test_subscribe_async_fields() -> None:
+    @strawberry.type
+    class Event:
+        id: str
+
+        @strawberry.field
+        async def upper_id(self) -> str:
+            return self.id.upper()
+
+    @strawberry.type
+    class Query:
+        ok: bool = True
+
+    @strawberry.type
+    class Subscription:
+        @strawberry.subscription
+        async def events(self) -> t.AsyncGenerator[Event, None]:
+            yield Event(id="a")
+
+    events_schema = fanout.Schema(query=Query, subscription=Subscription)
+    query = "subscription { events { upperId } }"
+
+    for _ in range(2):
+        sub = await events_schema.subscribe(query)
+        results = [result async for result in sub]  # type: ignore[union-attr]
+        assert [result.data for result in results] == [{"events": {"upperId": "A"}}]
+
+    assert fanout.shared_executions.get() == 1
+
+
+@pytest.mark.asyncio
+async def test_subscribe_stream_error() -> None:
+    @strawberry.type
+    class Query:
+        ok: bool = True
+
+    @strawberry.type
+    class Subscription:
+        @strawberry.subscription
+        async def events(self) -> t.AsyncGenerator[str, None]:
+            yield "a"
+            raise GraphQLError("Gone", extensions={"code": "GONE"})
+
+    events_schema = fanout.Schema(query=Query, subscription=Subscription)
+    sub = await events_schema.subscribe("subscription { events }")
+    results = [result async for result in sub]  # type: ignore[union-attr]
+
+    assert results[0].data == {"events": "a"}
+    assert results[1].data is None
+    assert [error.extensions for error in results[1].errors or []] == [{"code": "GONE"}]
+
+
+def test_add_reconnect_delay(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "RECONNECT_MAX_DELAY_SECONDS", 0.5)
+    delays = {
+        fanout.add_reconnect_delay({"type": "connection_ack"})["payload"][
+            "reconnectDelayMs"
+        ]
+        for _ in range(20)
+    }
+
+    assert all(0 <= delay <= 500 for delay in delays)
+    assert len(delays) > 1
+    assert fanout.add_reconnect_delay({"type": "ping"}) == {"type": "ping"}
+
+
+@pytest.mark.asyncio
+async def test_encode_frame() -> None:
+    result = ExecutionResult(data={"newMessage": {"id": "1"}})
+    await fanout.shared_results.get("key", make_execute(result))
+
+    assert fanout.encode_frame({"type": "connection_ack"}) is None
+    assert fanout.encode_frame({"type": "next", "payload": {"data": {}}}) is None
+    assert (
+        fanout.encode_frame(
+            {"type": "next", "id": "1", "payload": {"data": result.data, "errors": []}}
+        )
+        is None
+    )
+    frame = fanout.encode_frame(
+        {"type": "next", "id": "1", "payload": {"data": result.data}}
+    )
+    assert (
+        frame == '{"type":"next","id":"1","payload":{"data":{"newMessage":{"id":"1"}}}}'
+    )
+
+
+@pytest.mark.asyncio
+async def test_encode_msgpack_frame() -> None:
+    result = ExecutionResult(data={"newMessage": {"id": "1"}})
+    await fanout.shared_results.get("key", make_execute(result))
+    frame = {"type": "next", "id": "1", "payload": {"data": result.data}}
+
+    for _ in range(2):
+        assert msgpack.unpackb(fanout.encode_msgpack_frame(frame)) == frame
+
+    assert fanout.encode_msgpack_frame({"type": "ping"}) == msgpack.packb(
+        {"type": "ping"}
+    )
+    assert fanout.shared_encodings.get() == 1
+
+
+def test_get_subscription_protocols(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert fanout.MSGPACK_PROTOCOL in fanout.get_subscription_protocols()
+    monkeypatch.setattr(encoders, "msgpack_encoder", None)
+    assert fanout.MSGPACK_PROTOCOL not in fanout.get_subscription_protocols()
@@ -0,0 +1,55 @@
+import typing as t
+import pytest
+from contextlib import asynccontextmanager
+from broadcaster._base import Event
+from src.api.graphql.base import caches, listeners
+from src.api.graphql.broadcast import broadcast
+from src.db.models import user as user_models
+
+
+class MockSubscriber:
+    def __init__(self, events: list[Event]) -> None:
+        self.events = events
+
+    async def __aiter__(self) -> t.AsyncGenerator[Event, None]:
+        for event in self.events:
+            yield event
+
+
+def make_event(entity: str, key: str) -> Event:
+    invalidation = caches.CacheInvalidationEvent(entity=entity, key=key)
+    return Event(
+        channel=caches.INVALIDATION_CHANNEL, message=invalidation.model_dump_json()
+    )
+
+
+@pytest.mark.asyncio
+async def test_sync_entity_caches(monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = caches.EntityCache(
+        "test-users", user_models.User, caches.MemoryCacheBackend(10, 10)
+    )
+    await cache.backend.set("a", 1)
+    await cache.backend.set("b", 2)
+    received_events = [make_event("test-users", "a"), make_event("unknown", "b")]
+    resets: list[str] = []
+
+    async def reset() -> None:
+        resets.append("reset")
+
+    @asynccontextmanager
+    async def mock_subscribe(
+        *args: list[t.Any], **kwargs: dict[t.Any, t.Any]
+    ) -> t.AsyncGenerator[MockSubscriber, None]:
+        yield MockSubscriber(received_events)
+
+    monkeypatch.setattr(broadcast, "subscribe", mock_subscribe)
+    monkeypatch.setattr(cache, "reset", reset)
+    await listeners.sync_entity_caches()
+
+    assert await cache.backend.get("a") is None
+    assert await cache.backend.get("b") == 2
+    assert not resets
+
+    received_events = [Event(channel=caches.INVALIDATION_CHANNEL, message="{")]
+    await listeners.sync_entity_caches()
+    assert resets == ["reset"]
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import typing as t
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from strawberry.http.exceptions import HTTPException
+from src.app import app
+from src.api.graphql.base import caches, persisted_queries
+
+QUERY = "query { healthCheck { success } }"
+QUERY_HASH = hashlib.sha256(QUERY.encode()).hexdigest()
+
+
+def get_extensions(query_hash: str = QUERY_HASH, version: int = 1) -> dict[str, t.Any]:
+    return {"persistedQuery": {"version": version, "sha256Hash": query_hash}}
+
+
+@pytest.mark.asyncio
+async def test_get_query() -> None:
+    backend = caches.MemoryCacheBackend(max_size=10, ttl_seconds=60)
+    queries = persisted_queries.PersistedQueries(backend)
+
+    assert await queries.get_query(QUERY, None) == QUERY
+    assert await queries.get_query(QUERY, {"other": {}}) == QUERY
+
+    with pytest.raises(persisted_queries.PersistedQueryNotFound):
+        await queries.get_query(None, get_extensions())
+
+    assert await queries.get_query(QUERY, get_extensions()) == QUERY
+    assert await queries.get_query(None, get_extensions()) == QUERY
+
+    await backend.set(QUERY_HASH, QUERY.encode())  # As shared backends return it
+    assert await queries.get_query(None, get_extensions()) == QUERY
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "extensions", [get_extensions(version=2), get_extensions(query_hash="other")]
+)
+async def test_get_query_invalid(extensions: dict[str, t.Any]) -> None:
+    backend = caches.MemoryCacheBackend(max_size=10, ttl_seconds=60)
+    queries = persisted_queries.PersistedQueries(backend)
+
+    with pytest.raises(HTTPException) as error:
+        await queries.get_query(QUERY, extensions)
+
+    assert error.value.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.asyncio
+async def test_persisted_query() -> None:
+    extensions = get_extensions()
+    # Requests sending only the hash may also be GETs without a query
+    params = {"extensions": json.dumps(extensions)}
+
+    with TestClient(app) as client:
+        response = client.get("/graphql", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["errors"][0]["message"] == "PersistedQueryNotFound"
+
+        response = client.post(
+            "/graphql", json={"query": QUERY, "extensions": extensions}
+        )
+        assert response.json()["data"]["healthCheck"]["success"]
+
+        response = client.get("/graphql", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["data"]["healthCheck"]["success"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ["content", "content_type"],
+    [("[]", "application/json"), ("{", "application/json"), (QUERY, "text/plain")],
+)
+async def test_invalid_body(content: str, content_type: str) -> None:
+    with TestClient(app) as client:
+        response = client.post(
+            "/graphql", content=content, headers={"Content-Type": content_type}
+        )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
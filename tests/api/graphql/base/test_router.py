@@ -0,0 +1,76 @@
+import typing as t
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from src import config
+from src.app import app
+from src.api.graphql.auth import services
+from src.db.models.user import User
+
+
+@pytest.mark.asyncio
+async def test_batched_operations(
+    jon: User, jon_token: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    validations = 0
+    validate_authentication_header = services.AuthService.validate_authentication_header
+
+    def count_validations(self: services.AuthService, header_value: str) -> t.Any:
+        nonlocal validations
+        validations += 1
+        return validate_authentication_header(self, header_value)
+
+    monkeypatch.setattr(
+        services.AuthService, "validate_authentication_header", count_validations
+    )
+    operations = [
+        {"query": "query { getUsers { success data { id } } }"},
+        {
+            "query": "query Get($userId: String!) { getUser(userId: $userId) { success } }",
+            "variables": {"userId": str(jon.id)},
+        },
+        {"query": "query { healthCheck { success } }"},
+        {"variables": {}},
+        {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": "a"}}},
+        {"extensions": {"persistedQuery": {"version": 2}}, "query": "{ a }"},
+        [],
+    ]
+    headers = {"Authorization": f"Bearer {jon_token}"}
+
+    with TestClient(app) as client:
+        response = client.post("/graphql", json=operations, headers=headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()
+    assert len(results) == len(operations)
+    assert results[0]["data"]["getUsers"]["data"] == [{"id": str(jon.id)}]
+    assert results[1]["data"]["getUser"]["success"]
+    assert results[2]["data"]["healthCheck"]["success"]
+    assert results[3]["errors"][0]["message"] == "No GraphQL query found"
+    assert results[4]["errors"][0]["message"] == "PersistedQueryNotFound"
+    assert results[5]["errors"][0]["message"] == "Unsupported persisted query"
+    assert results[6]["errors"][0]["message"] == "Unsupported request body"
+    # The principal is validated once for the whole batch
+    assert validations == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ["body", "reason"],
+    [
+        ("[]", "Unsupported request body"),
+        ("[{", "Unable to parse request body as JSON"),
+        ("[{}, {}, {}]", "Too many operations in batch"),
+    ],
+)
+async def test_invalid_batches(
+    body: str, reason: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(config, "GRAPHQL_MAX_BATCH_SIZE", 2)
+    headers = {"Content-Type": "application/json"}
+
+    with TestClient(app) as client:
+        response = client.post("/graphql", content=body, headers=headers)
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.text == reason
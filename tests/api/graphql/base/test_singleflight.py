@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+from src.api.graphql.base import singleflight
+
+
+class Loader:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def load(self) -> list[int]:
+        self.calls += 1
+        await self.release.wait()
+        return [self.calls]
+
+    async def fail(self) -> list[int]:
+        self.calls += 1
+        await self.release.wait()
+        raise ValueError("Load failed")
+
+
+@pytest.mark.asyncio
+async def test_do_shares_in_flight_calls() -> None:
+    flights = singleflight.SingleFlight(window_seconds=0)
+    loader = Loader()
+    first = asyncio.ensure_future(flights.do("key", loader.load))
+    second = asyncio.ensure_future(flights.do("key", loader.load))
+    other = asyncio.ensure_future(flights.do("other", loader.load))
+    await asyncio.sleep(0)
+    assert singleflight.single_flight_calls.get() == 2
+    assert singleflight.single_flight_shared_calls.get() == 1
+    assert len(flights.flights) == 2
+
+    loader.release.set()
+    first_result, second_result, _ = await asyncio.gather(first, second, other)
+    assert first_result is second_result
+    assert loader.calls == 2
+    assert not flights.flights  # Nothing kept without a window
+
+    await flights.do("key", loader.load)
+    assert loader.calls == 3
+
+    flights.clear()
+    assert not flights.flights
+
+
+@pytest.mark.asyncio
+async def test_collect_flights() -> None:
+    singleflight.flights.flights["key"] = asyncio.get_running_loop().create_future()
+    await singleflight.collect_flights()
+    assert singleflight.single_flight_in_flight.get() == 1
+
+
+@pytest.mark.asyncio
+async def test_do_keeps_results_within_window() -> None:
+    flights = singleflight.SingleFlight(window_seconds=0.01)
+    loader = Loader()
+    loader.release.set()
+
+    result = await flights.do("key", loader.load)
+    assert await flights.do("key", loader.load) is result
+    assert loader.calls == 1
+
+    await asyncio.sleep(0.02)
+    assert not flights.flights
+    assert await flights.do("key", loader.load) == [2]
+
+
+@pytest.mark.asyncio
+async def test_do_forgets_failures() -> None:
+    flights = singleflight.SingleFlight(window_seconds=10)
+    loader = Loader()
+    first = asyncio.ensure_future(flights.do("key", loader.fail))
+    second = asyncio.ensure_future(flights.do("key", loader.fail))
+    await asyncio.sleep(0)
+    loader.release.set()
+
+    for result in await asyncio.gather(first, second, return_exceptions=True):
+        assert isinstance(result, ValueError)
+
+    assert not flights.flights
+    assert loader.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_do_survives_cancelled_caller() -> None:
+    flights = singleflight.SingleFlight(window_seconds=0)
+    loader = Loader()
+    first = asyncio.ensure_future(flights.do("key", loader.load))
+    second = asyncio.ensure_future(flights.do("key", loader.load))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    loader.release.set()
+    assert await second == [1]
+    assert first.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_do_forgets_cancelled_calls() -> None:
+    flights = singleflight.SingleFlight(window_seconds=10)
+    loader = Loader()
+    caller = asyncio.ensure_future(flights.do("key", loader.load))
+    await asyncio.sleep(0)
+
+    flights.flights["key"].cancel()
+    await asyncio.gather(caller, return_exceptions=True)
+    assert not flights.flights
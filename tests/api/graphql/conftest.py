@@ -1,10 +1,29 @@
+import typing as t
 import pytest
 from datetime import timedelta
-from src import utils
+from src import config, utils
 from src.api.enums import TokenType
 from src.db.models import user as user_models
 from src.db.models import message as message_models
 from src.api import utils as api_utils
+from src.db import query_budgets
+
+
+@pytest.fixture(autouse=True)
+def enforce_query_budget(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Operations issuing queries in loops fail the suites, with real databases
+    monkeypatch.setattr(config, "QUERY_BUDGET_MODE", query_budgets.MODE_ENFORCE)
+
+
+@pytest.fixture
+def query_budget(monkeypatch: pytest.MonkeyPatch) -> t.Callable[[int, int], None]:
+    # Lowers the budget of a test's operations. Values were counted under mongomock
+    # and haven't been checked against MongoDB, so they may need raising there
+    def set_query_budget(max_commands: int, max_repeats: int) -> None:
+        monkeypatch.setattr(config, "QUERY_BUDGET_MAX_COMMANDS", max_commands)
+        monkeypatch.setattr(config, "QUERY_BUDGET_MAX_REPEATS", max_repeats)
+
+    return set_query_budget
 
 
 @pytest.fixture
@@ -25,21 +44,21 @@ async def mary() -> user_models.User:
 async def common_channel(
     jon: user_models.User, mary: user_models.User
 ) -> message_models.Channel:
-    channel = message_models.Channel(members=[jon, mary])
+    channel: message_models.Channel = message_models.Channel.from_users([jon, mary])
     channel = await channel.save()
     return channel
 
 
 @pytest.fixture
 async def jon_channel(jon: user_models.User) -> message_models.Channel:
-    channel = message_models.Channel(members=[jon])
+    channel: message_models.Channel = message_models.Channel.from_users([jon])
     channel = await channel.save()
     return channel
 
 
 @pytest.fixture
 async def mary_channel(mary: user_models.User) -> message_models.Channel:
-    channel = message_models.Channel(members=[mary])
+    channel: message_models.Channel = message_models.Channel.from_users([mary])
     channel = await channel.save()
     return channel
 
@@ -0,0 +1,100 @@
+import typing as t
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from src import config
+from src.app import app
+from src.api.graphql import schemas
+from src.db.models import user as user_models
+from src.db.models import message as message_models
+
+QUERY = """
+    mutation TestMutation($payload: ChannelMemberInput!) {
+        addChannelMember(payload: $payload) {
+            success
+            errors {
+                code
+                source {
+                    header
+                    pointer
+                }
+            }
+            data {
+                id
+                memberCount
+                members(limit: 1) {
+                    id
+                }
+            }
+        }
+    }
+"""
+
+
+def add_channel_member(
+    channel_id: str, user_id: str, token: t.Optional[str] = None
+) -> dict[str, t.Any]:
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    variables = {"payload": {"channelId": channel_id, "userId": user_id}}
+    json = {"query": QUERY, "variables": variables}
+
+    with TestClient(app) as client:
+        response = client.post("/graphql", json=json, headers=headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    return t.cast(dict[str, t.Any], response.json()["data"]["addChannelMember"])
+
+
+@pytest.mark.asyncio
+async def test_unauthenticated() -> None:
+    result_data = add_channel_member("", "")
+    assert not result_data["success"]
+    error = result_data["errors"][0]
+    assert error["code"] == schemas.ErrorEnum.UNAUTHORIZED
+    assert error["source"]["header"] == "Authorization"
+
+
+@pytest.mark.asyncio
+async def test_invalid_input(jon_token: str) -> None:
+    result_data = add_channel_member("", "", jon_token)
+    assert not result_data["success"]
+    assert [error["code"] for error in result_data["errors"]] == [
+        schemas.ErrorEnum.CHANNEL_NOT_FOUND,
+        schemas.ErrorEnum.USER_NOT_FOUND,
+    ]
+    assert [error["source"]["pointer"] for error in result_data["errors"]] == [
+        "/channelId",
+        "/userId",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_not_in_channel(
+    jon: user_models.User, jon_token: str, mary_channel: message_models.Channel
+) -> None:
+    result_data = add_channel_member(str(mary_channel.id), str(jon.id), jon_token)
+    assert not result_data["success"]
+    error = result_data["errors"][0]
+    assert error["code"] == schemas.ErrorEnum.USER_NOT_IN_CHANNEL
+    assert error["source"]["pointer"] == "/channelId"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("embedded_members_max", [100, 1])
+async def test_success(
+    jon: user_models.User,
+    mary: user_models.User,
+    jon_token: str,
+    jon_channel: message_models.Channel,
+    embedded_members_max: int,
+    monkeypatch: pytest.MonkeyPatch,
+    query_budget: t.Callable[[int, int], None],
+) -> None:
+    query_budget(13, 2)
+    monkeypatch.setattr(config, "CHANNEL_EMBEDDED_MEMBERS_MAX", embedded_members_max)
+    result_data = add_channel_member(str(jon_channel.id), str(mary.id), jon_token)
+    assert result_data["success"]
+    assert result_data["data"]["id"] == str(jon_channel.id)
+    assert result_data["data"]["memberCount"] == 2
+    first_member_id = min(str(jon.id), str(mary.id))
+    assert result_data["data"]["members"] == [{"id": first_member_id}]
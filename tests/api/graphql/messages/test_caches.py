@@ -0,0 +1,241 @@
+import pytest
+from beanie import PydanticObjectId
+from src.api.graphql.messages import caches, events
+from src.db.models import user as user_models
+from src.db.models import message as message_models
+
+
+async def create_messages(
+    sender: user_models.User, channel: message_models.Channel, sequences: list[int]
+) -> list[message_models.Message]:
+    messages: list[message_models.Message] = []
+
+    for sequence in sequences:
+        message = message_models.Message(
+            sender=sender, channel=channel, content="Test message", sequence=sequence
+        )
+        messages.append(await message.save())
+
+    return messages
+
+
+def fill(
+    cache: caches.RecentMessageCache,
+    channel_id: str,
+    messages: list[message_models.Message],
+    limit: int,
+) -> None:
+    version = cache.begin_fill(channel_id)
+    cache.fill(channel_id, version, messages, limit)
+    cache.end_fill(channel_id)
+
+
+@pytest.mark.asyncio
+async def test_get_channel_id(
+    jon: user_models.User, jon_channel: message_models.Channel
+) -> None:
+    (message,) = await create_messages(jon, jon_channel, [1])
+    db_message = await message_models.Message.get(PydanticObjectId(message.id))
+    assert db_message
+    assert events.get_channel_id(message) == str(jon_channel.id)
+    assert events.get_channel_id(db_message) == str(jon_channel.id)
+
+
+@pytest.mark.asyncio
+async def test_fill_and_get(
+    jon: user_models.User, jon_channel: message_models.Channel
+) -> None:
+    cache = caches.RecentMessageCache(channel_size=3, max_messages=10)
+    channel_id = str(jon_channel.id)
+    messages = await create_messages(jon, jon_channel, [4, 3, 2, 1])
+
+    assert cache.get(channel_id, 2) is None
+    fill(cache, channel_id, messages, 4)
+    assert cache.get(channel_id, 2) == messages[:2]
+    assert cache.get(channel_id, 3) == messages[:3]
+    assert cache.get(channel_id, 4) is None  # Older messages aren't buffered
+    assert cache.has_message(channel_id, str(messages[0].id))
+    assert not cache.has_message(channel_id, str(messages[3].id))
+    assert caches.recent_message_hits.get() == 2
+    assert caches.recent_message_misses.get() == 2
+
+
+@pytest.mark.asyncio
+async def test_fill_complete_channel(
+    jon: user_models.User, jon_channel: message_models.Channel
+) -> None:
+    cache = caches.RecentMessageCache(channel_size=3, max_messages=10)
+    channel_id = str(jon_channel.id)
+    messages = await create_messages(jon, jon_channel, [2, 1])
+
+    fill(cache, channel_id, messages, 3)
+    assert cache.get(channel_id, 100) == messages
+
+
+@pytest.mark.asyncio
+async def test_fill_discarded_after_write(
+    jon: user_models.User, jon_channel: message_models.Channel
+) -> None:
+    cache = caches.RecentMessageCache(channel_size=3, max_messages=10)
+    channel_id = str(jon_channel.id)
+    messages = await create_messages(jon, jon_channel, [2, 1])
+
+    version = cache.begin_fill(channel_id)
+    cache.notify_write(channel_id)
+    cache.fill(channel_id, version, messages, 3)
+    cache.end_fill(channel_id)
+    assert not cache.fills
+    assert cache.get(channel_id, 1) is None
+
+
+@pytest.mark.asyncio
+async def test_add(jon: user_models.User, jon_channel: message_models.Channel) -> None:
+    cache = caches.RecentMessageCache(channel_size=3, max_messages=10)
+    channel_id = str(jon_channel.id)
+    messages = await create_messages(jon, jon_channel, [5, 4, 3, 2, 1])
+
+    cache.add(messages[0])  # Channel not buffered yet
+    assert cache.get(channel_id, 1) is None
+
+    fill(cache, channel_id, messages[3:], 3)
+    cache.add(messages[1])
+    cache.add(messages[1])
+    cache.add(messages[2])  # Committed after a newer message
+    assert cache.get(channel_id, 3) == messages[1:4]
+    assert cache.size == 3
+
+    cache.add(messages[0])
+    assert cache.get(channel_id, 3) == messages[:3]
+    assert cache.get(channel_id, 4) is None
+    assert cache.size == 3
+
+
+@pytest.mark.asyncio
+async def test_evict(
+    jon: user_models.User,
+    jon_channel: message_models.Channel,
+    common_channel: message_models.Channel,
+) -> None:
+    cache = caches.RecentMessageCache(channel_size=3, max_messages=4)
+    jon_channel_id = str(jon_channel.id)
+    common_channel_id = str(common_channel.id)
+    jon_messages = await create_messages(jon, jon_channel, [2, 1])
+    common_messages = await create_messages(jon, common_channel, [4, 3])
+
+    fill(cache, jon_channel_id, jon_messages, 10)
+    fill(cache, common_channel_id, common_messages, 10)
+    assert cache.get(jon_channel_id, 1)  # Makes common channel the least recently used
+
+    (message,) = await create_messages(jon, jon_channel, [5])
+    cache.add(message)
+    assert cache.get(common_channel_id, 1) is None
+    assert cache.get(jon_channel_id, 3) == [message] + jon_messages
+    assert cache.size == 3
+
+    cache.clear()
+    assert not cache.buffers
+    assert cache.size == 0
+
+
+@pytest.mark.asyncio
+async def test_reset(
+    jon: user_models.User,
+    jon_channel: message_models.Channel,
+    common_channel: message_models.Channel,
+) -> None:
+    cache = caches.RecentMessageCache(channel_size=3, max_messages=10)
+    jon_channel_id = str(jon_channel.id)
+    common_channel_id = str(common_channel.id)
+    jon_messages = await create_messages(jon, jon_channel, [1])
+    fill(cache, jon_channel_id, jon_messages, 10)
+    version = cache.begin_fill(common_channel_id)
+
+    cache.reset()
+    assert cache.get(jon_channel_id, 1) is None
+    assert cache.size == 0
+
+    # Read before the reset, so it may be missing messages
+    cache.fill(common_channel_id, version, [], 10)
+    cache.end_fill(common_channel_id)
+    assert cache.get(common_channel_id, 1) is None
+
+
+@pytest.mark.asyncio
+async def test_invalidate(
+    jon: user_models.User, jon_channel: message_models.Channel
+) -> None:
+    cache = caches.RecentMessageCache(channel_size=3, max_messages=10)
+    channel_id = str(jon_channel.id)
+    messages = await create_messages(jon, jon_channel, [1])
+    fill(cache, channel_id, messages, 10)
+    version = cache.begin_fill(channel_id)
+
+    cache.invalidate(channel_id)
+    assert cache.get(channel_id, 1) is None
+
+    # Read before the channel changed
+    cache.fill(channel_id, version, messages, 10)
+    cache.end_fill(channel_id)
+    assert cache.get(channel_id, 1) is None
+
+
+@pytest.mark.asyncio
+async def test_channel_eviction(
+    jon: user_models.User, jon_channel: message_models.Channel
+) -> None:
+    channel_id = str(jon_channel.id)
+    messages = await create_messages(jon, jon_channel, [1])
+    fill(caches.recent_messages, channel_id, messages, 10)
+    caches.channel_members.set(channel_id, frozenset(), caches.channel_members.version)
+
+    await caches.channels.evict(channel_id)
+    assert caches.recent_messages.get(channel_id, 1) is None
+    assert caches.channel_members.get(channel_id) is None
+
+    fill(caches.recent_messages, channel_id, messages, 10)
+    await caches.channels.reset()
+    assert caches.recent_messages.get(channel_id, 1) is None
+
+
+@pytest.mark.asyncio
+async def test_collect_recent_messages(
+    jon: user_models.User, jon_channel: message_models.Channel
+) -> None:
+    messages = await create_messages(jon, jon_channel, [2, 1])
+    fill(caches.recent_messages, str(jon_channel.id), messages, 10)
+
+    await caches.collect_recent_messages()
+    assert caches.recent_message_size.get() == 2
+
+
+@pytest.mark.asyncio
+async def test_get_member_ids(
+    jon: user_models.User,
+    mary: user_models.User,
+    common_channel: message_models.Channel,
+) -> None:
+    expected_member_ids = frozenset([str(jon.id), str(mary.id)])
+    assert caches.get_member_ids(common_channel) == expected_member_ids
+
+    db_channel = await message_models.Channel.get(PydanticObjectId(common_channel.id))
+    assert db_channel  # Members not fetched
+    assert caches.get_member_ids(db_channel) == expected_member_ids
+
+
+def test_channel_members_index() -> None:
+    index = caches.ChannelMembersIndex(max_size=2)
+
+    index.set("a", frozenset(["jon"]), index.version)
+    index.set("b", frozenset(["mary"]), index.version)
+    assert index.get("a") == frozenset(["jon"])  # Makes `b` the least recently used
+    index.set("c", frozenset(["jon", "mary"]), index.version)
+    assert index.get("b") is None
+    assert index.get("c") == frozenset(["jon", "mary"])
+
+    version = index.version
+    index.discard("c")
+    index.set("c", frozenset(["jon"]), version)  # Read before the discard
+    assert index.get("c") is None
+
+    index.clear()
+    assert index.get("a") is None
@@ -1,3 +1,4 @@
+import typing as t
 import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
@@ -139,8 +140,12 @@ async def test_wrong_channel(
 
 @pytest.mark.asyncio
 async def test_no_channel(
-    jon: user_models.User, mary: user_models.User, jon_token: str
+    jon: user_models.User,
+    mary: user_models.User,
+    jon_token: str,
+    query_budget: t.Callable[[int, int], None],
 ) -> None:
+    query_budget(30, 4)
     query = """
         mutation TestMutation($payload: CreateMessageInput!) {
             createMessage(payload: $payload) {
@@ -187,8 +192,12 @@ async def test_no_channel(
 
 @pytest.mark.asyncio
 async def test_with_channel(
-    jon: user_models.User, common_channel: message_models.Channel, jon_token: str
+    jon: user_models.User,
+    common_channel: message_models.Channel,
+    jon_token: str,
+    query_budget: t.Callable[[int, int], None],
 ) -> None:
+    query_budget(21, 4)
     query = """
         mutation TestMutation($payload: CreateMessageInput!) {
             createMessage(payload: $payload) {
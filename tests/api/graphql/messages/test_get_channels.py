@@ -82,7 +82,9 @@ async def test_success(
     common_channel: message_models.Channel,
     jon_channel: message_models.Channel,
     mary_channel: message_models.Channel,  # Expected not to be returned by query
+    query_budget: t.Callable[[int, int], None],
 ) -> None:
+    query_budget(3, 1)
     query = """
         query TestQuery {
             getChannels {
@@ -1,3 +1,4 @@
+import typing as t
 import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
@@ -74,7 +75,10 @@ async def test_invalid_token(jon_token: str, monkeypatch: pytest.MonkeyPatch) ->
 
 
 @pytest.mark.asyncio
-async def test_success(jon: User, mary: User, jon_token: str) -> None:
+async def test_success(
+    jon: User, mary: User, jon_token: str, query_budget: t.Callable[[int, int], None]
+) -> None:
+    query_budget(5, 1)
     query = """
         query TestQuery($content: String) {
             getMessages(content: $content) {
@@ -98,8 +102,8 @@ async def test_success(jon: User, mary: User, jon_token: str) -> None:
     }
     headers = {"Authorization": f"Bearer {jon_token}"}
 
-    jon_channel = await message_models.Channel(members=[jon]).save()
-    mary_channel = await message_models.Channel(members=[mary]).save()
+    jon_channel = await message_models.Channel.from_users([jon]).save()
+    mary_channel = await message_models.Channel.from_users([mary]).save()
     message = await message_models.Message(
         channel=jon_channel, sender=jon, content="Message to myself", sequence=1
     ).save()
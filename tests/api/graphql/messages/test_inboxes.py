@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import typing as t
+import pytest
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+from src import config
+from src.api.graphql.messages import inboxes
+from src.db.models import base as base_models
+from src.db.models import user as user_models
+from src.db.models import message as message_models
+
+
+@pytest.mark.asyncio
+async def test_start(monkeypatch: pytest.MonkeyPatch) -> None:
+    worker = inboxes.InboxWorker(batch_size=10)
+    assert await inboxes.get_next_sequence() == 1
+
+    await base_models.Counter(
+        type=base_models.CounterType.MESSAGE, next_value=5
+    ).insert()
+    assert await worker.start() == 5  # New messages only
+    assert await inboxes.get_next_sequence() == 5
+
+    await inboxes.get_counter_query().update({"$set": {"next_value": 7}})
+    assert await worker.start() == 7
+
+    # Another instance inserts its counter in between
+    async def find_nothing() -> None:
+        return None
+
+    async def insert(*args: object, **kwargs: object) -> None:
+        raise DuplicateKeyError("Duplicate counter")
+
+    queries: list[t.Awaitable[t.Any]] = [find_nothing(), inboxes.get_counter_query()]
+    monkeypatch.setattr(inboxes, "get_counter_query", lambda: queries.pop(0))
+    monkeypatch.setattr(base_models.Counter, "insert", insert)
+    assert await worker.start() == 7
+
+
+@pytest.mark.asyncio
+async def test_fan_out(
+    jon: user_models.User,
+    mary: user_models.User,
+    jon_channel: message_models.Channel,
+    common_channel: message_models.Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(config, "INBOX_MAX_CHANNEL_MEMBERS", 1)
+    message = await message_models.Message(
+        sender=jon, channel=jon_channel, content="Note to self", sequence=1
+    ).save()
+    await message_models.Message(
+        sender=mary, channel=common_channel, content="Hi Jon", sequence=2
+    ).save()
+    other_message = await message_models.Message(
+        sender=jon, channel=jon_channel, content="Another note", sequence=4
+    ).save()
+    worker = inboxes.InboxWorker(batch_size=10)
+    assert await worker.start() == 1
+
+    # Too recent, earlier sequences may still be written
+    monkeypatch.setattr(config, "INBOX_WRITE_DELAY_SECONDS", 60)
+    assert await worker.fan_out(1) == 1
+
+    monkeypatch.setattr(config, "INBOX_WRITE_DELAY_SECONDS", 0)
+    assert await worker.fan_out(1) == 5
+    assert await worker.fan_out(5) == 5
+    assert await inboxes.get_next_sequence() == 5
+
+    entries = await message_models.InboxEntry.find().to_list()
+    assert [(entry.user_id, entry.message_id) for entry in entries] == [
+        (jon.id, message.id),
+        (jon.id, other_message.id),
+    ]
+    assert entries[0].channel_id == jon_channel.id
+    assert entries[0].sequence == message.sequence
+    assert inboxes.written_entries.get() == 2
+    assert inboxes.failed_entries.get() == 0
+
+
+@pytest.mark.asyncio
+async def test_fan_out_failure(
+    jon: user_models.User,
+    jon_channel: message_models.Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def insert_many(*args: object, **kwargs: object) -> None:
+        raise PyMongoError("Write failed")
+
+    monkeypatch.setattr(config, "INBOX_WRITE_DELAY_SECONDS", 0)
+    await message_models.Message(
+        sender=jon, channel=jon_channel, content="Note to self", sequence=1
+    ).save()
+    worker = inboxes.InboxWorker(batch_size=10)
+    await worker.start()
+
+    with monkeypatch.context() as patch:
+        patch.setattr(message_models.InboxEntry, "insert_many", insert_many)
+        assert await worker.fan_out(1) == 1  # Retried later
+
+    assert await inboxes.get_next_sequence() == 1
+    assert inboxes.failed_entries.get() == 1
+    assert await worker.fan_out(1) == 2
+    assert await message_models.InboxEntry.find().count() == 1
+
+
+@pytest.mark.asyncio
+async def test_write_partial_failure(
+    jon: user_models.User,
+    jon_channel: message_models.Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    write_errors: list[dict[str, object]] = []
+
+    async def insert_many(*args: object, **kwargs: object) -> None:
+        raise BulkWriteError({"writeErrors": write_errors})
+
+    monkeypatch.setattr(message_models.InboxEntry, "insert_many", insert_many)
+    message = await message_models.Message(
+        sender=jon, channel=jon_channel, content="Note to self", sequence=1
+    ).save()
+    entries = inboxes.make_entries(message, [str(jon.id)] * 3)
+    worker = inboxes.InboxWorker(batch_size=10)
+
+    # Only entries that aren't written yet count as failed
+    write_errors[:] = [{"index": 0, "code": inboxes.DUPLICATE_KEY_ERROR}]
+    assert await worker.write(entries)
+    write_errors.append({"index": 1, "code": 1})
+    assert not await worker.write(entries)
+    assert inboxes.written_entries.get() == 3
+    assert inboxes.failed_entries.get() == 1
+
+
+@pytest.mark.asyncio
+async def test_run(
+    jon: user_models.User,
+    jon_channel: message_models.Channel,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    monkeypatch.setattr(config, "INBOX_WRITE_DELAY_SECONDS", 0)
+    worker = inboxes.InboxWorker(batch_size=10)
+    fan_out = worker.fan_out
+    calls: list[int] = []
+
+    async def flaky_fan_out(next_sequence: int) -> int:
+        calls.append(next_sequence)
+
+        if len(calls) == 1:
+            raise PyMongoError("Read failed")
+
+        return await fan_out(next_sequence)
+
+    monkeypatch.setattr(worker, "fan_out", flaky_fan_out)
+    await message_models.Message(
+        sender=jon, channel=jon_channel, content="Note to self", sequence=1
+    ).save()
+
+    with caplog.at_level(logging.ERROR, logger=inboxes.__name__):
+        task = asyncio.create_task(worker.run())
+
+        while not await message_models.InboxEntry.find().count():
+            await asyncio.sleep(0)
+
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    assert [record.getMessage() for record in caplog.records] == [
+        "Failed to fan out messages to inboxes"
+    ]
+    assert calls[:2] == [1, 1]
+    assert worker.next_sequence is None
+
+
+@pytest.mark.asyncio
+async def test_collect_inbox_worker(monkeypatch: pytest.MonkeyPatch) -> None:
+    await inboxes.collect_inbox_worker()
+    assert inboxes.next_fanned_out_sequence.get() is None  # Not started
+
+    monkeypatch.setattr(inboxes.inbox_worker, "next_sequence", 5)
+    await inboxes.collect_inbox_worker()
+    assert inboxes.next_fanned_out_sequence.get() == 5
+
+
+@pytest.mark.asyncio
+async def test_get_fanned_out_sequence(monkeypatch: pytest.MonkeyPatch) -> None:
+    await base_models.Counter(type=base_models.CounterType.INBOX, next_value=3).insert()
+    assert await inboxes.get_fanned_out_sequence() == 3
+
+    # The worker's progress, as of its last tick
+    monkeypatch.setattr(inboxes.inbox_worker, "next_sequence", 2)
+    assert await inboxes.get_fanned_out_sequence() == 2
+
+
+@pytest.mark.asyncio
+async def test_backfill(
+    jon: user_models.User,
+    mary: user_models.User,
+    jon_channel: message_models.Channel,
+    common_channel: message_models.Channel,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    channels = [jon_channel, common_channel, jon_channel, jon_channel]
+    messages = [
+        await message_models.Message(
+            sender=jon, channel=channel, content="Hi", sequence=sequence
+        ).save()
+        for sequence, channel in enumerate(channels, start=1)
+    ]
+    worker = inboxes.InboxWorker(batch_size=2)
+    await worker.backfill(jon_channel, str(mary.id))
+
+    entries = await message_models.InboxEntry.find().to_list()
+    assert [entry.message_id for entry in entries] == [
+        messages[0].id,
+        messages[2].id,
+        messages[3].id,
+    ]
+    assert {entry.user_id for entry in entries} == {mary.id}
+
+    async def insert_many(*args: object, **kwargs: object) -> None:
+        raise PyMongoError("Write failed")
+
+    monkeypatch.setattr(message_models.InboxEntry, "insert_many", insert_many)
+
+    with caplog.at_level(logging.ERROR, logger=inboxes.__name__):
+        await worker.backfill(jon_channel, str(jon.id))
+
+    assert [record.getMessage() for record in caplog.records] == [
+        f"Failed to backfill the inbox of {jon.id}"
+    ]
@@ -0,0 +1,86 @@
+import typing as t
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from src.app import app
+from src.api.graphql import schemas
+from src.db.models import user as user_models
+from src.db.models import message as message_models
+
+QUERY = """
+    mutation TestMutation($payload: ChannelInput!) {
+        leaveChannel(payload: $payload) {
+            success
+            errors {
+                code
+                source {
+                    header
+                    pointer
+                }
+            }
+            data {
+                id
+                memberCount
+                members {
+                    id
+                }
+            }
+        }
+    }
+"""
+
+
+def leave_channel(channel_id: str, token: t.Optional[str] = None) -> dict[str, t.Any]:
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    variables = {"payload": {"channelId": channel_id}}
+    json = {"query": QUERY, "variables": variables}
+
+    with TestClient(app) as client:
+        response = client.post("/graphql", json=json, headers=headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    return t.cast(dict[str, t.Any], response.json()["data"]["leaveChannel"])
+
+
+@pytest.mark.asyncio
+async def test_unauthenticated() -> None:
+    result_data = leave_channel("")
+    assert not result_data["success"]
+    error = result_data["errors"][0]
+    assert error["code"] == schemas.ErrorEnum.UNAUTHORIZED
+    assert error["source"]["header"] == "Authorization"
+
+
+@pytest.mark.asyncio
+async def test_channel_not_found(jon_token: str) -> None:
+    result_data = leave_channel("123456789012345678901234", jon_token)
+    assert not result_data["success"]
+    error = result_data["errors"][0]
+    assert error["code"] == schemas.ErrorEnum.CHANNEL_NOT_FOUND
+    assert error["source"]["pointer"] == "/channelId"
+
+
+@pytest.mark.asyncio
+async def test_not_in_channel(
+    jon_token: str, mary_channel: message_models.Channel
+) -> None:
+    result_data = leave_channel(str(mary_channel.id), jon_token)
+    assert not result_data["success"]
+    assert result_data["errors"][0]["code"] == schemas.ErrorEnum.USER_NOT_IN_CHANNEL
+
+
+@pytest.mark.asyncio
+async def test_success(
+    mary: user_models.User,
+    jon_token: str,
+    common_channel: message_models.Channel,
+    query_budget: t.Callable[[int, int], None],
+) -> None:
+    query_budget(9, 2)
+    result_data = leave_channel(str(common_channel.id), jon_token)
+    assert result_data["success"]
+    assert result_data["data"] == {
+        "id": str(common_channel.id),
+        "memberCount": 1,
+        "members": [{"id": str(mary.id)}],
+    }
@@ -0,0 +1,78 @@
+import typing as t
+import pytest
+from contextlib import asynccontextmanager
+from broadcaster._base import Event
+from src.api.graphql.broadcast import broadcast
+from src.api.graphql.messages import caches, events, listeners
+from src.db.models.user import User
+from src.db.models.message import Channel, Message
+
+
+class MockSubscriber:
+    def __init__(self, events: list[Event]) -> None:
+        self.events = events
+
+    async def __aiter__(self) -> t.AsyncGenerator[Event, None]:
+        for event in self.events:
+            yield event
+
+
+def make_event(message: Message) -> Event:
+    new_message = events.NewMessageEvent.from_message(message)
+    return Event(
+        channel=events.NEW_MESSAGE_CHANNEL, message=new_message.model_dump_json()
+    )
+
+
+@pytest.mark.asyncio
+async def test_sync_recent_messages(
+    jon: User,
+    jon_channel: Channel,
+    mary_channel: Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    cached_message = await Message(
+        channel=jon_channel, sender=jon, content="Cached", sequence=1
+    ).save()
+    new_message = await Message(
+        channel=jon_channel, sender=jon, content="New", sequence=2
+    ).save()
+    other_message = await Message(
+        channel=mary_channel, sender=jon, content="Other channel", sequence=3
+    ).save()
+    deleted_message = Message(
+        channel=jon_channel, sender=jon, content="Deleted", sequence=4
+    )
+    deleted_message = await deleted_message.save()
+    await deleted_message.delete()
+
+    cache = caches.recent_messages
+    channel_id = str(jon_channel.id)
+    version = cache.begin_fill(channel_id)
+    cache.fill(channel_id, version, [cached_message], 10)
+    cache.end_fill(channel_id)
+    received_events = [
+        make_event(cached_message),
+        make_event(new_message),
+        make_event(other_message),
+        make_event(deleted_message),
+    ]
+
+    @asynccontextmanager
+    async def mock_subscribe(
+        *args: list[t.Any], **kwargs: dict[t.Any, t.Any]
+    ) -> t.AsyncGenerator[MockSubscriber, None]:
+        yield MockSubscriber(received_events)
+
+    monkeypatch.setattr(broadcast, "subscribe", mock_subscribe)
+    await listeners.sync_recent_messages()
+
+    messages = cache.get(channel_id, 10)
+    assert messages
+    assert [message.id for message in messages] == [new_message.id, cached_message.id]
+    assert str(t.cast(Channel, messages[0].channel).id) == channel_id
+    assert cache.get(str(mary_channel.id), 10) is None
+
+    received_events = [Event(channel=events.NEW_MESSAGE_CHANNEL, message="{")]
+    await listeners.sync_recent_messages()
+    assert cache.get(channel_id, 10) is None  # Messages may have been missed
@@ -1,28 +1,45 @@
 import typing as t
+import msgpack
 import pytest
 from contextlib import asynccontextmanager
 from broadcaster._base import Event
 from starlette.requests import Request
 from fastapi.testclient import TestClient
-from strawberry.subscriptions import GRAPHQL_WS_PROTOCOL
+from starlette.websockets import WebSocketDisconnect
+from strawberry.subscriptions import GRAPHQL_TRANSPORT_WS_PROTOCOL, GRAPHQL_WS_PROTOCOL
+from src import config, tracing
 from src.app import app
 from src.api.graphql import schema
+from src.api.graphql.base import fanout
 from src.api.graphql.broadcast import broadcast
+from src.api.graphql.messages import events
 from src.db.models.user import User
 from src.db.models.message import Channel, Message
 
 
 class MockSubscriber:
-    def __init__(self, event: Event) -> None:
-        self.event = event
+    def __init__(self, events: list[Event]) -> None:
+        self.events = events
 
     async def __aiter__(self) -> t.AsyncGenerator[Event, None]:
-        yield self.event
+        for event in self.events:
+            yield event
+
+
+def make_event(message: Message) -> Event:
+    new_message = events.NewMessageEvent.from_message(message)
+    return Event(
+        channel=events.NEW_MESSAGE_CHANNEL, message=new_message.model_dump_json()
+    )
 
 
 @pytest.mark.asyncio
 async def test_success(
-    jon_token: str, mary: User, common_channel: Channel, monkeypatch: pytest.MonkeyPatch
+    jon_token: str,
+    mary: User,
+    common_channel: Channel,
+    mary_channel: Channel,
+    monkeypatch: pytest.MonkeyPatch,
 ) -> None:
     query = """
         subscription TestSubscription {
@@ -31,18 +48,22 @@ async def test_success(
             }
         }
     """
+    private_message = await Message(
+        channel=mary_channel, sender=mary, content="Message to myself", sequence=1
+    ).save()
     message = await Message(
-        channel=common_channel, sender=mary, content="Hi Jon!", sequence=1
+        channel=common_channel, sender=mary, content="Hi Jon!", sequence=2
     ).save()
 
     @asynccontextmanager
     async def mock_subscribe(
         *args: list[t.Any], **kwargs: dict[t.Any, t.Any]
     ) -> t.AsyncGenerator[MockSubscriber, None]:
-        event = Event(channel="messages", message=str(message.id))
-        yield MockSubscriber(event)
+        # Events from channels Jon isn't part of are filtered out
+        yield MockSubscriber([make_event(private_message), make_event(message)])
 
     monkeypatch.setattr(broadcast, "subscribe", mock_subscribe)
+    monkeypatch.setattr(config, "RECONNECT_MAX_DELAY_SECONDS", 0)
 
     token = f"Bearer {jon_token}"
     headers = {"Authorization": token}
@@ -67,7 +88,10 @@ async def test_success(
         ) as ws:
             ws.send_json({"type": "connection_init"})
             response = ws.receive_json()
-            assert response == {"type": "connection_ack"}
+            assert response == {
+                "type": "connection_ack",
+                "payload": {"reconnectDelayMs": 0},
+            }
 
             ws.send_json({"id": "1", "type": "start", "payload": {"query": query}})
             response = ws.receive_json()
@@ -76,3 +100,341 @@ async def test_success(
                 "id": "1",
                 "payload": {"data": {"newMessage": {"id": str(message.id)}}},
             }
+
+
+@pytest.mark.asyncio
+async def test_resume(
+    jon_token: str,
+    jon: User,
+    mary: User,
+    common_channel: Channel,
+    mary_channel: Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    query = """
+        subscription TestSubscription($sinceSequence: Int) {
+            newMessage(sinceSequence: $sinceSequence) {
+                id
+            }
+        }
+    """
+    seen_message = await Message(
+        channel=common_channel, sender=mary, content="Hi Jon!", sequence=1
+    ).save()
+    await Message(
+        channel=mary_channel, sender=mary, content="Message to myself", sequence=2
+    ).save()
+    missed_message = await Message(
+        channel=common_channel, sender=mary, content="Are you there?", sequence=3
+    ).save()
+    live_message = await Message(
+        channel=common_channel, sender=jon, content="Back online", sequence=4
+    ).save()
+
+    @asynccontextmanager
+    async def mock_subscribe(
+        *args: list[t.Any], **kwargs: dict[t.Any, t.Any]
+    ) -> t.AsyncGenerator[MockSubscriber, None]:
+        # The missed message was published after subscribing, so it is also live
+        yield MockSubscriber([make_event(missed_message), make_event(live_message)])
+
+    monkeypatch.setattr(broadcast, "subscribe", mock_subscribe)
+    token = f"Bearer {jon_token}"
+    scope = {"type": "http", "headers": [[b"authorization", token.encode()]]}
+    request = Request(scope=scope)
+    sub = await schema.subscribe(
+        query,
+        context_value={"request": request},
+        variable_values={"sinceSequence": seen_message.sequence},
+    )
+    message_ids: list[str] = []
+
+    async for result in sub:  # type: ignore[union-attr]
+        assert not result.errors
+        data = t.cast(dict[str, t.Any], result.data)
+        message_ids.append(data["newMessage"]["id"])
+
+    assert message_ids == [str(missed_message.id), str(live_message.id)]
+
+
+@pytest.mark.asyncio
+async def test_resume_reset_required(
+    jon_token: str,
+    mary: User,
+    common_channel: Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    query = """
+        subscription TestSubscription($sinceSequence: Int) {
+            newMessage(sinceSequence: $sinceSequence) {
+                id
+            }
+        }
+    """
+    monkeypatch.setattr(config, "REPLAY_MAX_MESSAGES", 1)
+
+    for sequence in [1, 2]:
+        await Message(
+            channel=common_channel, sender=mary, content="Hi Jon!", sequence=sequence
+        ).save()
+
+    @asynccontextmanager
+    async def mock_subscribe(
+        *args: list[t.Any], **kwargs: dict[t.Any, t.Any]
+    ) -> t.AsyncGenerator[MockSubscriber, None]:
+        yield MockSubscriber([])
+
+    monkeypatch.setattr(broadcast, "subscribe", mock_subscribe)
+    token = f"Bearer {jon_token}"
+    scope = {"type": "http", "headers": [[b"authorization", token.encode()]]}
+    sub = await schema.subscribe(
+        query,
+        context_value={"request": Request(scope=scope)},
+        variable_values={"sinceSequence": 0},
+    )
+    results = [result async for result in sub]  # type: ignore[union-attr]
+
+    # Nothing is replayed, clients fetch the history with `getMessages` instead
+    assert len(results) == 1
+    assert results[0].data is None
+    assert [error.extensions for error in results[0].errors or []] == [
+        {"code": "RESET_REQUIRED"}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_shared_frames(
+    jon_token: str,
+    mary: User,
+    common_channel: Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    query = """
+        subscription TestSubscription {
+            newMessage {
+                id
+                content
+            }
+        }
+    """
+    message = await Message(
+        channel=common_channel, sender=mary, content="Hi Jon!", sequence=1
+    ).save()
+
+    @asynccontextmanager
+    async def mock_subscribe(
+        *args: list[t.Any], **kwargs: dict[t.Any, t.Any]
+    ) -> t.AsyncGenerator[MockSubscriber, None]:
+        yield MockSubscriber([make_event(message)])
+
+    monkeypatch.setattr(broadcast, "subscribe", mock_subscribe)
+    monkeypatch.setattr(config, "RECONNECT_MAX_DELAY_SECONDS", 0)
+    headers = {"Authorization": f"Bearer {jon_token}"}
+    expected_payload = {
+        "data": {"newMessage": {"id": str(message.id), "content": "Hi Jon!"}}
+    }
+
+    with TestClient(app) as client:
+        with client.websocket_connect(
+            "/graphql", headers=headers, subprotocols=[GRAPHQL_TRANSPORT_WS_PROTOCOL]
+        ) as ws:
+            ws.send_json({"type": "connection_init"})
+            assert ws.receive_json() == {
+                "type": "connection_ack",
+                "payload": {"reconnectDelayMs": 0},
+            }
+
+            for operation_id in ["1", "2"]:
+                ws.send_json(
+                    {
+                        "id": operation_id,
+                        "type": "subscribe",
+                        "payload": {"query": query},
+                    }
+                )
+                assert ws.receive_json() == {
+                    "id": operation_id,
+                    "type": "next",
+                    "payload": expected_payload,
+                }
+                assert ws.receive_json() == {"id": operation_id, "type": "complete"}
+
+    assert fanout.executions.get() == 1
+    assert fanout.shared_executions.get() == 1
+    assert fanout.encodings.get() == 1
+    assert fanout.shared_encodings.get() == 1
+    assert len(fanout.shared_results.results) == 1
+
+
+@pytest.mark.asyncio
+async def test_msgpack_frames(
+    jon_token: str,
+    mary: User,
+    common_channel: Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    query = """
+        subscription TestSubscription {
+            newMessage {
+                id
+                content
+            }
+        }
+    """
+    message = await Message(
+        channel=common_channel, sender=mary, content="Hi Jon!", sequence=1
+    ).save()
+
+    @asynccontextmanager
+    async def mock_subscribe(
+        *args: list[t.Any], **kwargs: dict[t.Any, t.Any]
+    ) -> t.AsyncGenerator[MockSubscriber, None]:
+        yield MockSubscriber([make_event(message)])
+
+    monkeypatch.setattr(broadcast, "subscribe", mock_subscribe)
+    monkeypatch.setattr(config, "RECONNECT_MAX_DELAY_SECONDS", 0)
+    headers = {"Authorization": f"Bearer {jon_token}"}
+    expected_payload = {
+        "data": {"newMessage": {"id": str(message.id), "content": "Hi Jon!"}}
+    }
+
+    with TestClient(app) as client:
+        with client.websocket_connect(
+            "/graphql", headers=headers, subprotocols=[fanout.MSGPACK_PROTOCOL]
+        ) as ws:
+            assert ws.accepted_subprotocol == fanout.MSGPACK_PROTOCOL
+            ws.send_bytes(msgpack.packb({"type": "connection_init"}))
+            assert msgpack.unpackb(ws.receive_bytes()) == {
+                "type": "connection_ack",
+                "payload": {"reconnectDelayMs": 0},
+            }
+
+            for operation_id in ["1", "2"]:
+                subscribe = {
+                    "id": operation_id,
+                    "type": "subscribe",
+                    "payload": {"query": query},
+                }
+                ws.send_bytes(msgpack.packb(subscribe))
+                assert msgpack.unpackb(ws.receive_bytes()) == {
+                    "id": operation_id,
+                    "type": "next",
+                    "payload": expected_payload,
+                }
+                assert msgpack.unpackb(ws.receive_bytes()) == {
+                    "id": operation_id,
+                    "type": "complete",
+                }
+
+    assert fanout.shared_encodings.get() == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("frame", ["{}", b"\xc1", msgpack.packb(["connection_init"])])
+async def test_invalid_msgpack_frame(
+    jon_token: str, frame: t.Union[str, bytes]
+) -> None:
+    headers = {"Authorization": f"Bearer {jon_token}"}
+
+    with TestClient(app) as client:
+        with client.websocket_connect(
+            "/graphql", headers=headers, subprotocols=[fanout.MSGPACK_PROTOCOL]
+        ) as ws:
+            if isinstance(frame, str):
+                ws.send_text(frame)
+            else:
+                ws.send_bytes(frame)
+
+            with pytest.raises(WebSocketDisconnect) as error:
+                ws.receive_bytes()
+
+            assert error.value.code == 4400
+
+
+@pytest.mark.asyncio
+async def test_unshared_shape(
+    jon_token: str,
+    mary: User,
+    common_channel: Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    query = """
+        subscription TestSubscription {
+            ...Fields
+        }
+
+        fragment Fields on Subscription {
+            newMessage {
+                id
+            }
+        }
+    """
+    message = await Message(
+        channel=common_channel, sender=mary, content="Hi Jon!", sequence=1
+    ).save()
+
+    @asynccontextmanager
+    async def mock_subscribe(
+        *args: list[t.Any], **kwargs: dict[t.Any, t.Any]
+    ) -> t.AsyncGenerator[MockSubscriber, None]:
+        yield MockSubscriber([make_event(message)])
+
+    monkeypatch.setattr(broadcast, "subscribe", mock_subscribe)
+    token = f"Bearer {jon_token}"
+    scope = {"type": "http", "headers": [[b"authorization", token.encode()]]}
+    request = Request(scope=scope)
+    sub = await schema.subscribe(query, context_value={"request": request})
+
+    async for result in sub:  # type: ignore[union-attr]
+        data = t.cast(dict[str, t.Any], result.data)
+        assert data["newMessage"]["id"] == str(message.id)
+
+    assert not fanout.executions.get()
+
+
+@pytest.mark.asyncio
+async def test_delivery_span(
+    jon_token: str,
+    mary: User,
+    common_channel: Channel,
+    monkeypatch: pytest.MonkeyPatch,
+    sampled_spans: list[tracing.Span],
+) -> None:
+    query = "subscription { newMessage { id } }"
+    message = await Message(
+        channel=common_channel, sender=mary, content="Hi Jon!", sequence=1
+    ).save()
+    event = make_event(message)
+    traceparent = f"00-{'a' * 32}-{'b' * 16}-01"
+    event = Event(
+        channel=event.channel,
+        message=event.message.replace(
+            '"traceparent":null', f'"traceparent":"{traceparent}"'
+        ),
+    )
+
+    @asynccontextmanager
+    async def mock_subscribe(
+        *args: list[t.Any], **kwargs: dict[t.Any, t.Any]
+    ) -> t.AsyncGenerator[MockSubscriber, None]:
+        yield MockSubscriber([event])
+
+    monkeypatch.setattr(broadcast, "subscribe", mock_subscribe)
+    token = f"Bearer {jon_token}"
+    scope = {"type": "http", "headers": [[b"authorization", token.encode()]]}
+    sub = await schema.subscribe(query, context_value={"request": Request(scope=scope)})
+
+    async for result in sub:  # type: ignore[union-attr]
+        assert result.data == {"newMessage": {"id": str(message.id)}}
+
+    # The delivery continues the publisher's trace
+    [delivery_span] = [
+        span for span in sampled_spans if span.name == "broadcast.deliver"
+    ]
+    assert delivery_span.trace_id == "a" * 32
+    assert delivery_span.parent_span_id == "b" * 16
+    store_spans = [
+        span for span in sampled_spans if span.name.startswith("MessageStore")
+    ]
+    assert store_spans
+    assert all(span.trace_id == "a" * 32 for span in store_spans)
@@ -2,6 +2,8 @@ import pytest
 from beanie import PydanticObjectId
 from src.api.graphql import schemas
 from src.api.graphql.messages import schemas as message_schemas
+from src.api.graphql.messages import stores
+from src.api.graphql.users import schemas as user_schemas
 from src.db.models import user as user_models
 from src.db.models import message as message_models
 
@@ -61,12 +63,16 @@ async def test_create_message_input_valid(jon_channel: message_models.Channel) -
 
 
 @pytest.mark.asyncio
-async def test_channel_without_prefetch(jon_channel: message_models.Channel) -> None:
+async def test_channel_from_document(
+    jon: user_models.User, jon_channel: message_models.Channel
+) -> None:
     db_channel = await message_models.Channel.get(PydanticObjectId(jon_channel.id))
     assert db_channel
 
-    with pytest.raises(RuntimeError, match="Failed to prefetch channel's members"):
-        message_schemas.Channel(db_channel)
+    channel = message_schemas.Channel(db_channel)  # Without looking users up
+    assert channel.memberCount == 1
+    members = await stores.MessageStore().get_channel_members(channel.channel, 10)
+    assert [user_schemas.User(member).email for member in members] == [jon.email]
 
 
 @pytest.mark.asyncio
@@ -95,6 +101,36 @@ async def test_message_without_sender_prefetch(
     db_message = await message_models.Message.get(PydanticObjectId(message.id))
     assert db_message
     db_message.channel = jon_channel
+    db_message.sender_snapshot = None
 
     with pytest.raises(RuntimeError, match="Failed to prefetch message's sender"):
         message_schemas.Message(db_message)
+
+
+@pytest.mark.asyncio
+async def test_message_without_sender_snapshot(
+    jon: user_models.User, jon_channel: message_models.Channel
+) -> None:
+    message = await message_models.Message(
+        channel=jon_channel, sender=jon, content="Test message", sequence=1
+    ).save()
+    assert message.sender_snapshot
+    message.sender_snapshot = None  # As on messages written before snapshots
+
+    store = stores.MessageStore()
+    resolved_message = await store.resolve_message(message)
+    assert resolved_message
+    assert message_schemas.Message(resolved_message).sender.email == jon.email
+
+
+@pytest.mark.asyncio
+async def test_message_is_slotted(
+    jon: user_models.User, jon_channel: message_models.Channel
+) -> None:
+    message = await message_models.Message(
+        channel=jon_channel, sender=jon, content="Test message", sequence=1
+    ).save()
+    schema = message_schemas.Message(message)
+
+    for value in [schema, schema.channel, schema.sender]:
+        assert not hasattr(value, "__dict__")
@@ -1,10 +1,17 @@
+import asyncio
 import typing as t
 import pytest
 from beanie.exceptions import RevisionIdWasChanged
+from pymongo.errors import BulkWriteError
+from src import config
 from src.db.models import base as base_models
 from src.db.models import user as user_models
 from src.db.models import message as message_models
-from src.api.graphql.messages import stores
+from src.api.graphql.base import caches as base_caches
+from src.api.graphql.base import singleflight
+from src.api.graphql.messages import caches, inboxes, stores
+from src.api.graphql.users import caches as user_caches
+from src.api.graphql.users import stores as user_stores
 
 
 @pytest.mark.asyncio
@@ -16,7 +23,8 @@ async def test_get_or_create_channel_create(
     store = stores.MessageStore()
     channel = await store.get_or_create_channel([jon, mary, jon])
 
-    assert channel.members == [jon, mary]
+    assert channel.member_ids == [jon.id, mary.id]
+    assert [member.email for member in channel.members] == [jon.email, mary.email]
 
 
 @pytest.mark.asyncio
@@ -38,6 +46,66 @@ async def test_get_or_create_channel_get(
     assert original_member_ids == channel_member_ids
 
 
+@pytest.mark.asyncio
+async def test_get_or_create_channel_invalidates_members(
+    jon: user_models.User, mary: user_models.User
+) -> None:
+    async def load_user() -> user_models.User:
+        return jon
+
+    await user_caches.users.get(str(jon.id), load_user)
+    assert await user_caches.users.backend.size() == 1
+
+    store = stores.MessageStore()
+    await store.get_or_create_channel([jon, mary])
+    assert await user_caches.users.backend.size() == 0
+
+
+@pytest.mark.asyncio
+async def test_get_channel(
+    jon_channel: message_models.Channel, mary_channel: message_models.Channel
+) -> None:
+    store = stores.MessageStore()
+    assert await store.get_channel("") is None
+
+    channel = await store.get_channel(str(jon_channel.id))
+    assert channel
+    assert channel.id == jon_channel.id
+    members = t.cast(list[user_models.User], channel.members)
+    assert [member.email for member in members] == ["jon@doe.com"]
+
+    await jon_channel.delete()
+    cached_channel = await store.get_channel(str(jon_channel.id))
+    assert cached_channel is channel
+    assert base_caches.entity_cache_hits.get("channels") == 1
+
+
+@pytest.mark.asyncio
+async def test_get_channel_member_ids(
+    jon: user_models.User, jon_channel: message_models.Channel
+) -> None:
+    store = stores.MessageStore()
+    assert await store.get_channel_member_ids("") == frozenset()
+
+    channel_id = str(jon_channel.id)
+    assert await store.get_channel_member_ids(channel_id) == frozenset([str(jon.id)])
+    assert caches.channel_members.get(channel_id) == frozenset([str(jon.id)])
+
+    await caches.channels.evict(channel_id)
+    assert caches.channel_members.get(channel_id) is None
+
+
+@pytest.mark.asyncio
+async def test_get_or_create_channel_indexes_members(
+    jon: user_models.User, mary: user_models.User
+) -> None:
+    store = stores.MessageStore()
+    channel = await store.get_or_create_channel([jon, mary])
+    assert caches.channel_members.get(str(channel.id)) == frozenset(
+        [str(jon.id), str(mary.id)]
+    )
+
+
 @pytest.mark.asyncio
 async def test_create_message(
     jon: user_models.User, jon_channel: message_models.Channel
@@ -227,6 +295,87 @@ async def test_get_messages(
     assert expected_message_ids == db_message_ids
 
 
+@pytest.mark.asyncio
+async def test_get_messages_cached(
+    jon: user_models.User,
+    common_channel: message_models.Channel,
+) -> None:
+    message = await message_models.Message(
+        sender=jon, channel=common_channel, content="Hi Mary", sequence=1
+    ).save()
+    user = await user_models.User.find_one(
+        user_models.User.id == jon.id, fetch_links=True
+    )
+    user = t.cast(user_models.User, user)
+    channel_id = str(common_channel.id)
+    store = stores.MessageStore()
+
+    db_messages = await store.get_messages(user=user, limit=10, channel_id=channel_id)
+    assert [db_message.id for db_message in db_messages] == [message.id]
+
+    new_message = await store.create_message(jon, common_channel, "How are you?")
+    await message_models.Message.delete_all()  # Page must now come from the cache
+    db_messages = await store.get_messages(user=user, limit=10, channel_id=channel_id)
+    assert [db_message.id for db_message in db_messages] == [
+        new_message.id,
+        message.id,
+    ]
+    assert caches.recent_message_hits.get() == 1
+    assert caches.recent_message_misses.get() == 1
+
+
+@pytest.mark.asyncio
+async def test_get_messages_cached_membership(
+    jon: user_models.User,
+    mary: user_models.User,
+    jon_channel: message_models.Channel,
+) -> None:
+    await message_models.Message(
+        sender=jon, channel=jon_channel, content="Note to self", sequence=1
+    ).save()
+    user = t.cast(user_models.User, await user_models.User.get(jon.id))
+    channel_id = str(jon_channel.id)
+    store = stores.MessageStore()
+    (message,) = await store.get_messages(user=user, limit=10, channel_id=channel_id)
+    assert t.cast(message_models.Channel, message.channel).count_members() == 1
+
+    # Buffered messages embed the channel, so they're read again once it changed
+    assert await store.add_channel_member(jon_channel, mary)
+    (message,) = await store.get_messages(user=user, limit=10, channel_id=channel_id)
+    assert t.cast(message_models.Channel, message.channel).count_members() == 2
+
+
+@pytest.mark.asyncio
+async def test_get_messages_coalesced(
+    jon: user_models.User,
+    common_channel: message_models.Channel,
+) -> None:
+    message = await message_models.Message(
+        sender=jon, channel=common_channel, content="Hi Mary", sequence=1
+    ).save()
+    user = await user_models.User.find_one(
+        user_models.User.id == jon.id, fetch_links=True
+    )
+    user = t.cast(user_models.User, user)
+    channel_id = str(common_channel.id)
+    store = stores.MessageStore()
+
+    pages = await asyncio.gather(
+        store.get_messages(user=user, limit=10),
+        store.get_messages(user=user, limit=10),
+        store.get_messages(user=user, limit=10, channel_id=channel_id),
+        store.get_messages(user=user, limit=10, channel_id=channel_id),
+    )
+    assert pages[0] is pages[1]
+    assert pages[2] is pages[3]
+    assert [[db_message.id for db_message in page] for page in pages] == [
+        [message.id]
+    ] * 4
+    assert (
+        singleflight.single_flight_shared_calls.get() == 3
+    )  # Both pages and their channel
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize("message_id", ["", "123456789012345678901234"])
 async def test_get_message_not_found(message_id: str) -> None:
@@ -256,3 +405,370 @@ async def test_message_found(
 
     message = await store.get_message(str(message_mary_private.id), str(jon.id))
     assert message is None
+
+
+@pytest.mark.asyncio
+async def test_get_message_coalesced(
+    jon: user_models.User,
+    mary: user_models.User,
+    common_channel: message_models.Channel,
+) -> None:
+    message = await message_models.Message(
+        sender=mary, channel=common_channel, content="Hi Jon", sequence=1
+    ).save()
+
+    store = stores.MessageStore()
+    jon_message, mary_message = await asyncio.gather(
+        store.get_message(str(message.id), str(jon.id)),
+        store.get_message(str(message.id), str(mary.id)),
+    )
+    assert jon_message
+    assert jon_message is mary_message
+    assert singleflight.single_flight_shared_calls.get() == 1
+
+
+async def remove_sender_snapshot(message: message_models.Message) -> None:
+    # As on messages written before snapshots
+    await message_models.Message.find_one(
+        message_models.Message.id == message.id
+    ).update({"$unset": {"sender_snapshot": ""}})
+
+
+@pytest.mark.asyncio
+async def test_get_message_missing_channel_or_sender(
+    jon: user_models.User,
+    mary: user_models.User,
+    common_channel: message_models.Channel,
+    mary_channel: message_models.Channel,
+) -> None:
+    message_from_mary = await message_models.Message(
+        sender=mary, channel=common_channel, content="Hi Jon", sequence=1
+    ).save()
+    message_in_mary_channel = await message_models.Message(
+        sender=mary, channel=mary_channel, content="Message to myself", sequence=2
+    ).save()
+    await mary.delete()
+    await mary_channel.delete()
+
+    store = stores.MessageStore()
+    message = await store.get_message(str(message_from_mary.id), str(jon.id))
+    assert message  # Shown with its sender snapshot
+    assert message.sender_snapshot
+    assert message.sender_snapshot.email == mary.email
+
+    await remove_sender_snapshot(message_from_mary)
+    singleflight.flights.clear()
+    message = await store.get_message(str(message_from_mary.id), str(jon.id))
+    assert message is None
+
+    message = await store.get_message(str(message_in_mary_channel.id), str(jon.id))
+    assert message is None
+
+    # Members index outliving the channel
+    channel_members = frozenset([str(jon.id), str(mary.id)])
+    version = caches.channel_members.version
+    caches.channel_members.set(str(mary_channel.id), channel_members, version)
+    message = await store.get_message(str(message_in_mary_channel.id), str(jon.id))
+    assert message is None
+
+
+@pytest.mark.asyncio
+async def test_stream_messages(
+    jon: user_models.User, common_channel: message_models.Channel
+) -> None:
+    messages = [
+        await message_models.Message(
+            sender=jon, channel=common_channel, content="Hi", sequence=sequence
+        ).save()
+        for sequence in range(1, 6)
+    ]
+    ids = [message.id for message in reversed(messages)]
+    user = await user_models.User.get(jon.id)
+    user = t.cast(user_models.User, user)
+    store = stores.MessageStore()
+
+    batches = [
+        [message.id for message in batch]
+        async for batch in store.stream_messages(user, limit=4, batch_size=3)
+    ]
+    assert batches == [ids[:3], ids[3:4]]
+
+    batches = [
+        [message.id for message in batch]
+        async for batch in store.stream_messages(user, limit=10, batch_size=3)
+    ]
+    assert batches == [ids[:3], ids[3:]]
+
+
+@pytest.mark.asyncio
+async def test_get_messages_after(
+    jon: user_models.User,
+    mary: user_models.User,
+    jon_channel: message_models.Channel,
+    common_channel: message_models.Channel,
+    mary_channel: message_models.Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(stores.MessageStore, "REPLAY_BATCH_SIZE", 2)
+    channels = [jon_channel, common_channel, mary_channel, common_channel, jon_channel]
+    messages = [
+        await message_models.Message(
+            sender=jon, channel=channel, content="Hi", sequence=sequence
+        ).save()
+        for sequence, channel in enumerate(channels, start=1)
+    ]
+    orphan_message = await message_models.Message(
+        sender=mary, channel=common_channel, content="Bye", sequence=6
+    ).save()
+    await remove_sender_snapshot(orphan_message)
+    await mary.delete()
+    user = await user_models.User.find_one(
+        user_models.User.id == jon.id, fetch_links=True
+    )
+    user = t.cast(user_models.User, user)
+
+    store = stores.MessageStore()
+    missed_messages = [
+        message async for message in store.get_messages_after(user, sequence=1)
+    ]
+    assert orphan_message.id not in [message.id for message in missed_messages]
+    assert [message.id for message in missed_messages] == [
+        messages[1].id,
+        messages[3].id,
+        messages[4].id,
+    ]
+    assert isinstance(missed_messages[0].channel, message_models.Channel)
+    assert missed_messages[0].sender_snapshot
+    assert missed_messages[0].sender_snapshot.email == jon.email
+
+
+@pytest.mark.asyncio
+async def test_exceeds_replay_limit(
+    jon: user_models.User,
+    common_channel: message_models.Channel,
+    mary_channel: message_models.Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(config, "REPLAY_MAX_MESSAGES", 1)
+
+    for sequence, channel in enumerate([common_channel, mary_channel], start=1):
+        await message_models.Message(
+            sender=jon, channel=channel, content="Hi", sequence=sequence
+        ).save()
+
+    user = t.cast(user_models.User, await user_models.User.get(jon.id))
+    store = stores.MessageStore()
+    # Messages of other channels don't count
+    assert not await store.exceeds_replay_limit(user, sequence=0)
+
+    await message_models.Message(
+        sender=jon, channel=common_channel, content="Hi", sequence=3
+    ).save()
+    assert await store.exceeds_replay_limit(user, sequence=0)
+    assert not await store.exceeds_replay_limit(user, sequence=1)
+
+
+@pytest.mark.asyncio
+async def test_get_timeline(
+    jon: user_models.User,
+    mary: user_models.User,
+    jon_channel: message_models.Channel,
+    common_channel: message_models.Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(config, "INBOX_TIMELINE_ENABLED", True)
+    monkeypatch.setattr(config, "INBOX_MAX_CHANNEL_MEMBERS", 1)
+    channels = [jon_channel, common_channel, jon_channel, common_channel]
+    messages = [
+        await message_models.Message(
+            sender=jon, channel=channel, content="Hi", sequence=sequence
+        ).save()
+        for sequence, channel in enumerate(channels, start=1)
+    ]
+    # Only the newest message of Jon's own channel made it to the inbox
+    await message_models.InboxEntry.insert_many(
+        inboxes.make_entries(messages[2], [str(jon.id)])
+    )
+    await base_models.Counter(type=base_models.CounterType.INBOX, next_value=5).insert()
+    user = await user_models.User.find_one(
+        user_models.User.id == jon.id, fetch_links=True
+    )
+    user = t.cast(user_models.User, user)
+    store = stores.MessageStore()
+
+    async def get_sequences(
+        limit: int, last_sequence: t.Optional[int] = None
+    ) -> list[int]:
+        timeline = await store.get_messages(
+            user=user, limit=limit, last_sequence=last_sequence
+        )
+        return [message.sequence for message in timeline]
+
+    assert await get_sequences(10) == [4, 3, 2, 1]
+    assert await get_sequences(2) == [4, 3]
+    assert await get_sequences(2, last_sequence=3) == [2, 1]
+
+    monkeypatch.setattr(config, "INBOX_MAX_CHANNEL_MEMBERS", 2)
+    assert await get_sequences(1) == [3]  # Common channel is fanned out now
+
+    # Not fanned out yet, so it's read from the messages
+    await message_models.Message(
+        sender=jon, channel=jon_channel, content="Hi", sequence=5
+    ).save()
+    assert await get_sequences(1) == [5]
+
+
+@pytest.mark.asyncio
+async def test_timeline_membership(
+    jon: user_models.User,
+    mary: user_models.User,
+    jon_channel: message_models.Channel,
+    mary_channel: message_models.Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(config, "INBOX_TIMELINE_ENABLED", True)
+    channels = [jon_channel, mary_channel, jon_channel, mary_channel, jon_channel]
+
+    for sequence, channel in enumerate(channels, start=1):
+        message = await message_models.Message(
+            sender=jon, channel=channel, content="Hi", sequence=sequence
+        ).save()
+        member_ids = caches.get_member_ids(channel)
+        await message_models.InboxEntry.insert_many(
+            inboxes.make_entries(message, member_ids)
+        )
+
+    await base_models.Counter(type=base_models.CounterType.INBOX, next_value=6).insert()
+    store = stores.MessageStore()
+
+    async def get_sequences() -> list[int]:
+        user = t.cast(user_models.User, await user_models.User.get(jon.id))
+        timeline = await store.get_messages(user=user, limit=3)
+        return [message.sequence for message in timeline]
+
+    # The history of a joined channel is backfilled
+    assert await get_sequences() == [5, 3, 1]
+    assert await store.add_channel_member(mary_channel, jon)
+    assert await get_sequences() == [5, 4, 3]
+
+    channel = await get_db_channel(mary_channel)
+    assert await store.remove_channel_member(channel, jon)
+    assert await get_sequences() == [5, 3, 1]
+
+
+async def get_db_channel(channel: message_models.Channel) -> message_models.Channel:
+    store = stores.MessageStore()
+    db_channel = await store.get_channel(str(channel.id))
+    assert db_channel
+    return db_channel
+
+
+@pytest.mark.asyncio
+async def test_embedded_channel_members(
+    jon: user_models.User,
+    mary: user_models.User,
+    jon_channel: message_models.Channel,
+) -> None:
+    store = stores.MessageStore()
+    assert await store.add_channel_member(jon_channel, mary)
+    channel = await get_db_channel(jon_channel)
+    assert not channel.external_members
+    assert channel.count_members() == 2
+    assert not await store.add_channel_member(channel, mary)
+
+    members = await store.get_channel_members(channel, 100)
+    assert [member.id for member in members] == sorted([jon.id, mary.id], key=str)
+    members = await store.get_channel_members(channel, 1, str(members[0].id))
+    assert len(members) == 1
+
+    db_mary = await user_models.User.get(mary.id)
+    assert db_mary
+    assert db_mary.channel_ids == [jon_channel.id]
+
+    assert await store.remove_channel_member(channel, mary)
+    channel = await get_db_channel(jon_channel)
+    assert await store.get_channel_member_ids(str(channel.id)) == {str(jon.id)}
+    assert not await store.remove_channel_member(channel, mary)
+    db_mary = await user_models.User.get(mary.id)
+    assert db_mary
+    assert not db_mary.channel_ids
+
+
+@pytest.mark.asyncio
+async def test_external_channel_members(
+    jon: user_models.User,
+    mary: user_models.User,
+    jon_channel: message_models.Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(config, "CHANNEL_EMBEDDED_MEMBERS_MAX", 1)
+    store = stores.MessageStore()
+    ann = await user_models.User(email="ann@doe.com").save()
+
+    assert await store.add_channel_member(jon_channel, mary)
+    channel = await get_db_channel(jon_channel)
+    assert channel.external_members
+    assert not channel.members
+    assert channel.count_members() == 2
+    assert not inboxes.is_fanned_out(channel)
+
+    assert await store.add_channel_member(channel, ann)
+    assert not await store.add_channel_member(channel, ann)
+    channel = await get_db_channel(jon_channel)
+    assert channel.count_members() == 3
+    member_ids = sorted([jon.id, mary.id, ann.id], key=str)
+    assert await store.get_channel_member_ids(str(channel.id)) == {
+        str(member_id) for member_id in member_ids
+    }
+
+    members = await store.get_channel_members(channel, 2)
+    assert [member.id for member in members] == member_ids[:2]
+    members = await store.get_channel_members(channel, 2, str(member_ids[1]))
+    assert [member.id for member in members] == member_ids[2:]
+    members = await store.get_channel_members(channel, 2, "invalid")
+    assert len(members) == 2
+
+    user = await user_stores.UserStore().get_user(str(ann.id))
+    assert user
+    assert user.channel_ids == [channel.id]
+
+    assert await store.remove_channel_member(channel, ann)
+    assert not await store.remove_channel_member(channel, ann)
+    channel = await get_db_channel(jon_channel)
+    assert channel.count_members() == 2
+
+    await channel.delete()
+    tombstone = await message_models.Tombstone.find_one(
+        message_models.Tombstone.entity == message_models.TombstoneEntity.CHANNEL
+    )
+    assert tombstone
+    assert sorted(tombstone.member_ids, key=str) == sorted([jon.id, mary.id], key=str)
+    assert not await message_models.ChannelMember.find().count()
+    assert not await user_models.User.find(user_models.User.channel_ids != []).count()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_external_members_move(
+    jon: user_models.User,
+    mary: user_models.User,
+    jon_channel: message_models.Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(config, "CHANNEL_EMBEDDED_MEMBERS_MAX", 1)
+    store = stores.MessageStore()
+    ann = await user_models.User(email="ann@doe.com").save()
+
+    # Both joins read the channel before either moved its members
+    assert await store.add_channel_member(jon_channel, mary)
+    assert await store.add_channel_member(jon_channel, ann)
+    channel = await get_db_channel(jon_channel)
+    assert channel.external_members
+    assert channel.count_members() == 3
+
+    async def insert_many(*args: object, **kwargs: object) -> None:
+        raise BulkWriteError({"writeErrors": [{"index": 0, "code": 1}]})
+
+    monkeypatch.setattr(message_models.ChannelMember, "insert_many", insert_many)
+
+    with pytest.raises(BulkWriteError):
+        await store.add_channel_member(jon_channel, ann)
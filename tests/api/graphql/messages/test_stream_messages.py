@@ -0,0 +1,59 @@
+import typing as t
+import pytest
+from starlette.requests import Request
+from src.api.graphql import schema
+from src.db.models.user import User
+from src.db.models.message import Channel, Message
+
+QUERY = """
+    subscription TestSubscription {
+        streamMessages(limit: 3, batchSize: 2) {
+            id
+            content
+        }
+    }
+"""
+
+
+def make_request(token: str) -> Request:
+    scope = {
+        "type": "http",
+        "headers": [
+            [b"authorization", f"Bearer {token}".encode()],
+        ],
+    }
+    return Request(scope=scope)
+
+
+@pytest.mark.asyncio
+async def test_success(jon: User, jon_token: str, common_channel: Channel) -> None:
+    messages = [
+        await Message(
+            channel=common_channel,
+            sender=jon,
+            content=f"Hi {sequence}",
+            sequence=sequence,
+        ).save()
+        for sequence in range(1, 5)
+    ]
+    context = {"request": make_request(jon_token)}
+    sub = await schema.subscribe(QUERY, context_value=context)
+    batches = []
+
+    async for result in sub:  # type: ignore[union-attr]
+        data = t.cast(dict[str, t.Any], result.data)
+        batches.append([message["id"] for message in data["streamMessages"]])
+
+    assert batches == [
+        [str(messages[3].id), str(messages[2].id)],
+        [str(messages[1].id)],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_user_not_found(jon: User, jon_token: str) -> None:
+    await jon.delete()
+    context = {"request": make_request(jon_token)}
+    sub = await schema.subscribe(QUERY, context_value=context)
+
+    assert [result async for result in sub] == []  # type: ignore[union-attr]
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import pytest
+from pymongo.errors import PyMongoError
+from src.api.graphql.messages import caches, stores, summaries
+from src.db.models import user as user_models
+from src.db.models import message as message_models
+
+
+@pytest.mark.asyncio
+async def test_worker(
+    jon: user_models.User,
+    mary: user_models.User,
+    common_channel: message_models.Channel,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    message = await message_models.Message(
+        sender=jon, channel=common_channel, content="Hi Mary", sequence=1
+    ).save()
+    await message_models.Message(
+        sender=mary, channel=common_channel, content="Hi Jon", sequence=2
+    ).save()
+    worker = summaries.UserSummaryWorker()
+    assert not worker.submit(str(jon.id))  # Not running
+
+    # Cached with the old summaries
+    store = stores.MessageStore()
+    channel_id = str(common_channel.id)
+    assert await store.get_channel(channel_id)
+    version = caches.recent_messages.begin_fill(channel_id)
+    caches.recent_messages.fill(channel_id, version, [message], 10)
+    caches.recent_messages.end_fill(channel_id)
+
+    task = asyncio.create_task(worker.run())
+    await asyncio.sleep(0)
+    jon.email = "jon@example.com"
+    await jon.save()
+    assert worker.submit(str(jon.id))
+    assert not worker.submit(str(jon.id))  # Already queued
+    assert worker.submit(str(mary.id))  # Unchanged
+    assert worker.submit("123456789012345678901234")  # Missing
+    assert worker.queue
+    await worker.queue.join()
+
+    assert caches.recent_messages.get(channel_id, 1) is None
+    db_message = await store.load_message(message.id)
+    assert db_message
+    assert db_message.sender_snapshot
+    assert db_message.sender_snapshot.email == "jon@example.com"
+    db_channel = await store.get_channel(channel_id)
+    assert db_channel
+    assert sorted(member.email for member in db_channel.members) == [
+        "jon@example.com",
+        mary.email,
+    ]
+    assert summaries.synced_channels.get() == 1
+    assert summaries.synced_messages.get() == 1
+
+    async def fail(user_id: str) -> None:
+        raise PyMongoError("Unavailable")
+
+    monkeypatch.setattr(worker, "sync", fail)
+
+    with caplog.at_level(logging.ERROR, logger=summaries.__name__):
+        assert worker.submit(str(jon.id))
+        await worker.queue.join()
+
+    assert summaries.failed_users.get() == 1
+    assert caplog.records[0].getMessage() == f"Failed to sync the summaries of {jon.id}"
+    assert not task.done()  # Still running
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert worker.queue is None
+
+
+@pytest.mark.asyncio
+async def test_collect_user_summary_worker() -> None:
+    await summaries.collect_user_summary_worker()
+    assert summaries.queued_users.get() == 0
+
+    task = asyncio.create_task(summaries.user_summary_worker.run())
+    await asyncio.sleep(0)
+    summaries.user_summary_worker.submit("123456789012345678901234")
+    await summaries.collect_user_summary_worker()
+    assert summaries.queued_users.get() == 1
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
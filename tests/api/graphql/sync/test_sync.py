@@ -0,0 +1,237 @@
+import asyncio
+import typing as t
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from src import config
+from src.app import app
+from src.api import utils as api_utils
+from src.api.enums import TokenType
+from src.api.graphql import schemas
+from src.api.graphql.messages import stores as message_stores
+from src.api.graphql.sync import stores as sync_stores
+from src.api.graphql.users.schemas import UserValidator
+from src.db.models.user import User
+from src.db.models import message as message_models
+from tests.api.graphql import utils as test_utils
+
+QUERY = """
+    query TestQuery($since: SyncToken) {
+        sync(since: $since) {
+            success
+            errors {
+                code
+                title
+                source {
+                    header
+                    parameter
+                }
+            }
+            data {
+                token
+                resetRequired
+                channels {
+                    id
+                }
+                messages {
+                    id
+                    sender {
+                        id
+                    }
+                }
+                tombstones {
+                    entity
+                    id
+                    channelId
+                }
+            }
+        }
+    }
+"""
+
+
+def sync(token: str, since: t.Optional[str] = None) -> dict[str, t.Any]:
+    headers = {"Authorization": f"Bearer {token}"}
+    json = {"query": QUERY, "variables": {"since": since}}
+
+    with TestClient(app) as client:
+        response = client.post("/graphql", json=json, headers=headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    return t.cast(dict[str, t.Any], response.json()["data"]["sync"])
+
+
+@pytest.mark.asyncio
+async def test_unauthenticated() -> None:
+    with TestClient(app) as client:
+        response = client.post("/graphql", json={"query": QUERY})
+
+    assert response.status_code == status.HTTP_200_OK
+    result_data = response.json()["data"]["sync"]
+    assert not result_data["success"]
+    error = result_data["errors"][0]
+    assert error["code"] == schemas.ErrorEnum.UNAUTHORIZED
+    assert error["source"]["header"] == "Authorization"
+
+
+@pytest.mark.asyncio
+async def test_user_not_found(jon_token: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        UserValidator,
+        "validate",
+        test_utils.patch_authenticated_user_validator,
+    )
+    result_data = sync(jon_token)
+    assert not result_data["success"]
+    assert [error["code"] for error in result_data["errors"]] == [
+        schemas.ErrorEnum.USER_NOT_FOUND
+    ]
+
+
+@pytest.mark.asyncio
+async def test_invalid_token(jon: User, mary: User, jon_token: str) -> None:
+    mary_token = api_utils.make_app_token(
+        {"userId": str(mary.id), "since": 0, "type": TokenType.SYNC_TOKEN}
+    )
+    cases = [
+        ("invalid", schemas.ErrorEnum.INVALID_TOKEN, "Invalid token"),
+        (jon_token, schemas.ErrorEnum.INCORRECT_TOKEN_TYPE, "Incorrect token type"),
+        (
+            mary_token,
+            schemas.ErrorEnum.INVALID_TOKEN,
+            "Sync token issued to another user",
+        ),
+    ]
+
+    for since, code, title in cases:
+        result_data = sync(jon_token, since)
+        assert not result_data["success"]
+        error = result_data["errors"][0]
+        assert error["code"] == code
+        assert error["title"] == title
+        assert error["source"]["parameter"] == "since"
+
+
+@pytest.mark.asyncio
+async def test_success(
+    jon: User,
+    mary: User,
+    jon_token: str,
+    common_channel: message_models.Channel,
+    jon_channel: message_models.Channel,
+    mary_channel: message_models.Channel,
+    monkeypatch: pytest.MonkeyPatch,
+    query_budget: t.Callable[[int, int], None],
+) -> None:
+    query_budget(5, 1)
+    monkeypatch.setattr(config, "SYNC_OVERLAP_SECONDS", 0)
+    old_message = await message_models.Message(
+        sender=mary, channel=common_channel, content="Hi Jon", sequence=1
+    ).save()
+    result_data = sync(jon_token)  # First sync only issues a token
+    assert result_data["success"]
+    assert result_data["data"]["token"]
+    assert not result_data["data"]["resetRequired"]
+    assert not result_data["data"]["channels"]
+    assert not result_data["data"]["messages"]
+    assert not result_data["data"]["tombstones"]
+    token = result_data["data"]["token"]
+    await asyncio.sleep(0.01)
+
+    new_message = await message_models.Message(
+        sender=mary, channel=common_channel, content="Are you there?", sequence=2
+    ).save()
+    await message_models.Message(
+        sender=mary, channel=mary_channel, content="Message to myself", sequence=3
+    ).save()
+    await common_channel.save()
+    # Read back, so its channel is an unfetched link
+    db_old_message = await message_models.Message.get(old_message.id)
+    await t.cast(message_models.Message, db_old_message).delete()
+    await jon_channel.delete()
+    await mary_channel.delete()
+
+    result_data = sync(jon_token, token)
+    assert result_data["success"]
+    assert result_data["data"]["token"] != token
+    assert not result_data["data"]["resetRequired"]
+    assert result_data["data"]["channels"] == [{"id": str(common_channel.id)}]
+    assert result_data["data"]["messages"] == [
+        {"id": str(new_message.id), "sender": {"id": str(mary.id)}}
+    ]
+    assert result_data["data"]["tombstones"] == [
+        {
+            "entity": "MESSAGE",
+            "id": str(old_message.id),
+            "channelId": str(common_channel.id),
+        },
+        {
+            "entity": "CHANNEL",
+            "id": str(jon_channel.id),
+            "channelId": str(jon_channel.id),
+        },
+    ]
+
+    monkeypatch.setattr(config, "SYNC_MAX_CHANGES", 1)
+    result_data = sync(jon_token, token)
+    assert result_data["success"]
+    assert result_data["data"]["resetRequired"]
+    assert not result_data["data"]["tombstones"]
+
+
+@pytest.mark.asyncio
+async def test_member_removal(
+    jon: User,
+    mary: User,
+    jon_token: str,
+    common_channel: message_models.Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(config, "SYNC_OVERLAP_SECONDS", 0)
+    token = sync(jon_token)["data"]["token"]
+    await asyncio.sleep(0.01)
+    store = message_stores.MessageStore()
+    assert await store.remove_channel_member(common_channel, jon)
+
+    # The channel isn't Jon's anymore, so only the removal tells him
+    result_data = sync(jon_token, token)
+    assert result_data["success"]
+    assert not result_data["data"]["channels"]
+    assert result_data["data"]["tombstones"] == [
+        {
+            "entity": "MEMBER",
+            "id": str(jon.id),
+            "channelId": str(common_channel.id),
+        }
+    ]
+
+    db_mary = t.cast(User, await User.get(mary.id))
+    sync_store = sync_stores.SyncStore()
+    tombstones = await sync_store.get_tombstones(db_mary, common_channel.created_at, 10)
+    assert [tombstone.entity_id for tombstone in tombstones] == [jon.id]
+
+
+@pytest.mark.asyncio
+async def test_orphan_message(
+    jon: User,
+    mary: User,
+    jon_token: str,
+    common_channel: message_models.Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(config, "SYNC_OVERLAP_SECONDS", 0)
+    token = sync(jon_token)["data"]["token"]
+    await asyncio.sleep(0.01)
+    message = await message_models.Message(
+        sender=mary, channel=common_channel, content="Bye", sequence=1
+    ).save()
+    await message_models.Message.find_one(
+        message_models.Message.id == message.id
+    ).update(
+        {"$unset": {"sender_snapshot": ""}}  # As on messages written before snapshots
+    )
+    await mary.delete()
+
+    result_data = sync(jon_token, token)
+    assert result_data["success"]
+    assert not result_data["data"]["messages"]  # Sender is gone
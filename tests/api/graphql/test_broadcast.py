@@ -0,0 +1,82 @@
+import json
+import logging
+import typing as t
+from contextlib import asynccontextmanager
+import pytest
+from broadcaster._base import Event
+from src import config, tracing
+from src.api.graphql import broadcast
+from src.api.graphql.messages import events
+
+
+@pytest.mark.asyncio
+async def test_publish(
+    monkeypatch: pytest.MonkeyPatch, sampled_spans: list[tracing.Span]
+) -> None:
+    published: list[tuple[str, str]] = []
+
+    async def mock_publish(channel: str, message: str) -> None:
+        published.append((channel, message))
+
+    monkeypatch.setattr(broadcast.broadcast, "publish", mock_publish)
+    event = events.NewMessageEvent(message_id="1", channel_id="2", sequence=1)
+
+    with tracing.tracer.start_span("operation") as operation_span:
+        await broadcast.publish(events.NEW_MESSAGE_CHANNEL, event)
+
+    publish_span = sampled_spans[0]
+    assert publish_span.name == "broadcast.publish"
+    assert publish_span.parent_span_id == operation_span.span_id
+    assert publish_span.attributes == {"messaging.destination": "messages"}
+    [(channel, message)] = published
+    assert channel == events.NEW_MESSAGE_CHANNEL
+    assert json.loads(message)["traceparent"] == publish_span.traceparent
+
+
+class MockSubscriber:
+    def __init__(self, messages: list[str]) -> None:
+        self.messages = messages
+
+    async def __aiter__(self) -> t.AsyncGenerator[Event, None]:
+        for message in self.messages:
+            yield Event(channel="test", message=message)
+
+
+@pytest.mark.asyncio
+async def test_listen(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    subscriptions: list[t.Optional[list[str]]] = [None, ["a", "fail"]]
+    handled: list[str] = []
+    resets: list[list[str]] = []
+
+    @asynccontextmanager
+    async def mock_subscribe(channel: str) -> t.AsyncGenerator[MockSubscriber, None]:
+        messages = subscriptions.pop(0)
+
+        if messages is None:
+            raise ConnectionError("Unavailable")
+
+        yield MockSubscriber(messages)
+
+    async def handle(message: str) -> None:
+        if message == "fail":
+            raise ValueError("Malformed")
+
+        handled.append(message)
+
+    async def reset() -> None:
+        resets.append(list(handled))
+
+    monkeypatch.setattr(broadcast.broadcast, "subscribe", mock_subscribe)
+    monkeypatch.setattr(config, "PUB_SUB_RETRY_SECONDS", 0)
+
+    with caplog.at_level(logging.ERROR, logger=broadcast.__name__):
+        await broadcast.listen("test", handle, reset)
+
+    assert handled == ["a"]
+    assert resets == [[], ["a"]]
+    assert [record.getMessage() for record in caplog.records] == [
+        "Subscription to test failed",
+        "Failed to handle an event of test",
+    ]
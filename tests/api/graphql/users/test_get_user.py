@@ -1,3 +1,4 @@
+import typing as t
 import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
@@ -79,7 +80,10 @@ async def test_invalid_user_id(user_id: str, jon_token: str) -> None:
 
 
 @pytest.mark.asyncio
-async def test_success(mary: User, jon_token: str) -> None:
+async def test_success(
+    mary: User, jon_token: str, query_budget: t.Callable[[int, int], None]
+) -> None:
+    query_budget(2, 1)
     query = """
         query TestQuery($userId: String!) {
             getUser(userId: $userId) {
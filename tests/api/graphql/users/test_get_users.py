@@ -1,3 +1,4 @@
+import typing as t
 import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
@@ -37,7 +38,10 @@ async def test_unauthenticated() -> None:
 
 
 @pytest.mark.asyncio
-async def test_success(jon: User, mary: User, jon_token: str) -> None:
+async def test_success(
+    jon: User, mary: User, jon_token: str, query_budget: t.Callable[[int, int], None]
+) -> None:
+    query_budget(1, 1)
     users = [
         {"email": jon.email, "id": str(jon.id)},
         {"email": mary.email, "id": str(mary.id)},
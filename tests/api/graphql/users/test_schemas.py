@@ -10,3 +10,10 @@ async def test_user_validator_user_not_found(user_id: str) -> None:
     error = await schema.validate_user_id()
     assert error
     assert error.code == schemas.ErrorEnum.USER_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_update_user_input() -> None:
+    assert not await user_schemas.UpdateUserInput(email="jon@doe.com").validate()
+    (error,) = await user_schemas.UpdateUserInput(email="jon").validate()
+    assert error.code == schemas.ErrorEnum.INVALID_EMAIL_ADDRESS
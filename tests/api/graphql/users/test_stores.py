@@ -0,0 +1,53 @@
+import pytest
+from src.api.graphql.base import caches as base_caches
+from src.api.graphql.messages import summaries
+from src.api.graphql.users import stores
+from src.db.models import user as user_models
+from src.db.models import message as message_models
+
+
+@pytest.mark.asyncio
+async def test_get_user(
+    jon: user_models.User, jon_channel: message_models.Channel
+) -> None:
+    store = stores.UserStore()
+    assert await store.get_user("") is None
+    assert await store.get_user("123456789012345678901234") is None
+
+    user = await store.get_user(str(jon.id))
+    assert user
+    assert user.id == jon.id
+    assert user.channel_ids == [jon_channel.id]
+
+    await jon.delete()
+    assert await store.get_user(str(jon.id)) is user
+    assert base_caches.entity_cache_hits.get("users") == 1
+    assert base_caches.entity_cache_misses.get("users") == 2
+
+
+@pytest.mark.asyncio
+async def test_save_user(
+    jon: user_models.User,
+    jon_channel: message_models.Channel,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    submitted_user_ids: list[str] = []
+
+    def submit(user_id: str) -> bool:
+        submitted_user_ids.append(user_id)
+        return True
+
+    monkeypatch.setattr(summaries.user_summary_worker, "submit", submit)
+    store = stores.UserStore()
+    user = await store.get_user(str(jon.id))
+    assert user
+
+    await store.save_user(user, channel_ids=[])
+    assert not submitted_user_ids  # Summaries don't embed channels
+    assert user.channel_ids == [jon_channel.id]  # Changes are saved on a copy
+    user = await store.get_user(str(jon.id))
+    assert user and user.channel_ids == []
+
+    saved_user = await store.save_user(user, email="jon@example.com")
+    assert saved_user.email == "jon@example.com"
+    assert submitted_user_ids == [str(jon.id)]
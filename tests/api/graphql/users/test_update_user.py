@@ -0,0 +1,87 @@
+import typing as t
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from src.app import app
+from src.api.graphql import schemas
+from src.api.graphql.messages import summaries
+from src.api.graphql.users import stores
+from src.db.models import user as user_models
+
+QUERY = """
+    mutation TestMutation($payload: UpdateUserInput!) {
+        updateUser(payload: $payload) {
+            success
+            errors {
+                code
+                source {
+                    header
+                    pointer
+                }
+            }
+            data {
+                id
+                email
+            }
+        }
+    }
+"""
+
+
+def update_user(email: str, token: t.Optional[str] = None) -> dict[str, t.Any]:
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    variables = {"payload": {"email": email}}
+    json = {"query": QUERY, "variables": variables}
+
+    with TestClient(app) as client:
+        response = client.post("/graphql", json=json, headers=headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    return t.cast(dict[str, t.Any], response.json()["data"]["updateUser"])
+
+
+@pytest.mark.asyncio
+async def test_unauthenticated() -> None:
+    result_data = update_user("jon@example.com")
+    assert not result_data["success"]
+    error = result_data["errors"][0]
+    assert error["code"] == schemas.ErrorEnum.UNAUTHORIZED
+    assert error["source"]["header"] == "Authorization"
+
+
+@pytest.mark.asyncio
+async def test_invalid_email(jon_token: str) -> None:
+    result_data = update_user("jon", jon_token)
+    assert not result_data["success"]
+    error = result_data["errors"][0]
+    assert error["code"] == schemas.ErrorEnum.INVALID_EMAIL_ADDRESS
+    assert error["source"]["pointer"] == "/email"
+
+
+@pytest.mark.asyncio
+async def test_email_already_in_use(jon_token: str, mary: user_models.User) -> None:
+    result_data = update_user(mary.email, jon_token)
+    assert not result_data["success"]
+    error = result_data["errors"][0]
+    assert error["code"] == schemas.ErrorEnum.EMAIL_ALREADY_IN_USE
+    assert error["source"]["pointer"] == "/email"
+
+
+@pytest.mark.asyncio
+async def test_success(
+    jon: user_models.User,
+    jon_token: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    submitted_user_ids: list[str] = []
+    monkeypatch.setattr(
+        summaries.user_summary_worker, "submit", submitted_user_ids.append
+    )
+    result_data = update_user("jon@example.com", jon_token)
+    assert result_data["success"]
+    assert result_data["data"] == {"id": str(jon.id), "email": "jon@example.com"}
+    assert submitted_user_ids == [str(jon.id)]  # Summaries embed the email
+
+    user = await stores.UserStore().get_user(str(jon.id))
+    assert user
+    assert user.email == "jon@example.com"
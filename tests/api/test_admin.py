@@ -0,0 +1,27 @@
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from src import config
+from src.db import slow_queries
+
+
+def test_query_shapes(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    slow_queries.query_shapes.record("a", 0.001)
+    slow_queries.query_shapes.record("b", 0.002)
+
+    response = client.get("/admin/query-shapes")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "admin")
+    response = client.get(
+        "/admin/query-shapes", headers={"Authorization": "Bearer other"}
+    )
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    response = client.get(
+        "/admin/query-shapes",
+        params={"limit": 1},
+        headers={"Authorization": "Bearer admin"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert [shape["fingerprint"] for shape in response.json()] == ["b"]
@@ -0,0 +1,142 @@
+import os
+import typing as t
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.requests import Request
+from src.api import compression
+
+LARGE_DATA = {"messages": [{"content": "Hello there"}] * 100}
+
+
+async def get_large(request: Request) -> Response:
+    return JSONResponse(LARGE_DATA)
+
+
+async def get_public(request: Request) -> Response:
+    return JSONResponse(LARGE_DATA, headers={"Cache-Control": "public, max-age=60"})
+
+
+async def get_small(request: Request) -> Response:
+    return JSONResponse({"ok": True})
+
+
+async def get_binary(request: Request) -> Response:
+    return Response(b"0" * 2000, media_type="image/png")
+
+
+async def get_encoded(request: Request) -> Response:
+    headers = {"Content-Encoding": "identity"}  # Already encoded as it is
+    return Response(b"0" * 2000, media_type="text/plain", headers=headers)
+
+
+async def get_streamed(request: Request) -> Response:
+    async def get_chunks() -> t.AsyncGenerator[bytes, None]:
+        for _ in range(2):
+            yield b"0" * 2000
+
+    return StreamingResponse(get_chunks(), media_type="text/plain")
+
+
+app = compression.CompressionMiddleware(
+    Starlette(
+        routes=[
+            Route("/large", get_large),
+            Route("/public", get_public),
+            Route("/small", get_small),
+            Route("/binary", get_binary),
+            Route("/encoded", get_encoded),
+            Route("/streamed", get_streamed),
+        ]
+    ),
+    minimum_size=500,
+)
+
+
+@pytest.mark.parametrize(
+    ["accept_encoding", "encoding"],
+    [
+        ("gzip, deflate, br", "br"),
+        ("gzip;q=1, br;q=0.5", "gzip"),
+        ("br;q=0, gzip", "gzip"),
+        ("*", "br"),
+        ("*, br;q=0", "gzip"),
+        ("gzip;q=x", None),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_pick_encoding(accept_encoding: str, encoding: t.Optional[str]) -> None:
+    assert compression.pick_encoding(accept_encoding) == encoding
+
+
+@pytest.mark.parametrize(
+    ["encoding", "path", "hits"],
+    [("gzip", "/public", 1), ("br", "/public", 1), ("gzip", "/large", 0)],
+)
+def test_compressed_response(encoding: str, path: str, hits: int) -> None:
+    client = TestClient(app)
+
+    for _ in range(2):
+        response = client.get(path, headers={"Accept-Encoding": encoding})
+        assert response.headers["content-encoding"] == encoding
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert int(response.headers["content-length"]) < len(response.content)
+        assert response.json() == LARGE_DATA
+
+    # Only shared responses are kept
+    assert compression.compressed_body_hits.get() == hits
+    assert len(compression.compressed_bodies.bodies) == hits
+
+
+@pytest.mark.parametrize(
+    ["cache_control", "shared"],
+    [
+        ("public, max-age=60", True),
+        ("Public", True),
+        ("public, no-store", False),
+        ("private, max-age=60", False),
+        ("", False),
+    ],
+)
+def test_is_shared(cache_control: str, shared: bool) -> None:
+    headers = Headers({"Cache-Control": cache_control})
+    assert compression.is_shared(headers) is shared
+
+
+@pytest.mark.parametrize("path", ["/small", "/binary", "/encoded", "/streamed"])
+def test_uncompressed_response(path: str) -> None:
+    client = TestClient(app)
+    response = client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert response.headers.get("content-encoding") in [None, "identity"]
+    assert "vary" not in response.headers
+    assert compression.compressed_body_misses.get() == 0
+
+
+def test_without_accept_encoding() -> None:
+    client = TestClient(app)
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == LARGE_DATA
+
+
+@pytest.mark.asyncio
+async def test_compressed_bodies_eviction() -> None:
+    body_size = len(compression.compress_gzip(b"a"))
+    bodies = compression.CompressedBodies(max_bytes=body_size * 2)
+    bodies.compress("gzip", b"a")
+    bodies.compress("gzip", b"b")
+    bodies.compress("gzip", b"c")
+    assert [key[0] for key in bodies.bodies] == ["gzip", "gzip"]
+    assert bodies.size == body_size * 2
+    assert compression.compressed_body_misses.get() == 3
+
+    bodies.compress("gzip", os.urandom(body_size * 10))  # Larger than the whole cache
+    assert bodies.size == body_size * 2
+
+    compression.compressed_bodies.compress("gzip", b"a")
+    await compression.collect_compressed_bodies()
+    assert compression.compressed_body_size.get() == body_size
@@ -1,6 +1,14 @@
 import typing as t
+from pathlib import Path
 import pytest
-from src import db, config
+from src import db, config, metrics, tracing
+from src.api import compression
+from src.api.graphql.base import caches as base_caches
+from src.api.graphql.base import fanout
+from src.api.graphql.base import persisted_queries
+from src.api.graphql.base.singleflight import flights
+from src.api.graphql.messages import caches as message_caches
+from src.db import slow_queries
 
 
 @pytest.fixture(scope="function", autouse=True)
@@ -12,3 +20,33 @@ async def create_test_db() -> t.AsyncGenerator[None, None]:
     await client.drop_database(config.DB_NAME)
     prefix_size = len(prefix)
     config.DB_NAME = config.DB_NAME[prefix_size:]
+
+
+@pytest.fixture(autouse=True)
+async def clear_caches() -> t.AsyncGenerator[None, None]:
+    yield
+    message_caches.recent_messages.clear()
+    message_caches.channel_members.clear()
+    flights.clear()
+    fanout.shared_results.clear()
+    compression.compressed_bodies.clear()
+    metrics.registry.clear()
+    slow_queries.query_shapes.clear()
+    await persisted_queries.persisted_queries.backend.clear()
+
+    for cache in base_caches.entity_caches.values():
+        await cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def trace_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Apps started with tracing on write their spans away from the working directory
+    monkeypatch.setattr(tracing.exporter, "path", str(tmp_path / "traces.jsonl"))
+
+
+@pytest.fixture
+def sampled_spans(monkeypatch: pytest.MonkeyPatch) -> t.Iterator[list[tracing.Span]]:
+    # Every trace is sampled, and its finished spans are kept queued for inspection
+    monkeypatch.setattr(tracing.tracer, "sample_rate", 1.0)
+    yield tracing.exporter.spans
+    tracing.exporter.spans.clear()
@@ -0,0 +1,39 @@
+import pytest
+from src.db.models import base as base_models
+from src.db.models import user as user_models
+from src.db.models import message as message_models
+
+
+@pytest.mark.asyncio
+async def test_message_from_db() -> None:
+    jon = await user_models.User(email="jon@doe.com").save()
+    channel = await message_models.Channel.from_users([jon]).save()
+    message = await message_models.Message(
+        sender=jon, channel=channel, content="Hi", sequence=1
+    ).save()
+    messages = await base_models.find_raw(message_models.Message.find())
+
+    db_message = message_models.Message.from_db(messages[0])
+
+    validated_message = await message_models.Message.get(message.id)
+    assert validated_message
+    assert db_message.model_dump() == validated_message.model_dump()
+    assert db_message.sender_snapshot == user_models.UserSummary.from_user(jon)
+
+
+@pytest.mark.asyncio
+async def test_message_from_db_without_snapshot() -> None:
+    jon = await user_models.User(email="jon@doe.com").save()
+    channel = await message_models.Channel.from_users([jon]).save()
+    message = await message_models.Message(
+        sender=jon, channel=channel, content="Hi", sequence=1
+    ).save()
+    await message_models.Message.find().update({"$unset": {"sender_snapshot": ""}})
+    messages = await base_models.find_raw(message_models.Message.find())
+
+    db_message = message_models.Message.from_db(messages[0])
+
+    assert db_message.sender_snapshot is None
+    assert message_models.get_link_id(db_message.sender) == jon.id
+    assert message_models.get_link_id(db_message.channel) == channel.id
+    assert db_message.sequence == message.sequence
@@ -0,0 +1,15 @@
+import pytest
+from src.db.models import base as base_models
+from src.db.models import user as user_models
+
+
+@pytest.mark.asyncio
+async def test_user_from_db() -> None:
+    jon = await user_models.User(email="jon@doe.com").save()
+    users = await base_models.find_raw(user_models.User.find())
+
+    user = user_models.User.from_db(users[0])
+
+    validated_user = await user_models.User.get(jon.id)
+    assert validated_user
+    assert user.model_dump() == validated_user.model_dump()
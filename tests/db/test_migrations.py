@@ -0,0 +1,52 @@
+import typing as t
+import pytest
+from bson import DBRef
+from src.db import migrations
+from src.db.models import user as user_models
+from src.db.models import message as message_models
+
+
+@pytest.mark.asyncio
+async def test_backfill_user_channel_ids() -> None:
+    jon = await user_models.User(email="jon@doe.com").save()
+    channel = await message_models.Channel.from_users([jon]).save()
+    await user_models.User.find().update({"$set": {"channel_ids": []}})
+
+    await migrations.backfill_user_channel_ids()
+    await migrations.backfill_user_channel_ids()  # Runs again without duplicates
+
+    db_user = await user_models.User.get(jon.id)
+    assert db_user
+    assert db_user.channel_ids == [channel.id]
+
+
+@pytest.mark.asyncio
+async def test_backfill_sender_snapshots() -> None:
+    jon = await user_models.User(email="jon@doe.com").save()
+    channel = await message_models.Channel.from_users([jon]).save()
+    message = await message_models.Message(
+        sender=jon, channel=channel, content="Hi", sequence=1
+    ).save()
+    await message_models.Message.find().update({"$unset": {"sender_snapshot": ""}})
+
+    await migrations.backfill_sender_snapshots()
+
+    db_message = await message_models.Message.get(message.id)
+    assert db_message
+    assert db_message.sender_snapshot
+    assert db_message.sender_snapshot.email == jon.email
+
+
+@pytest.mark.asyncio
+async def test_backfill_channel_members() -> None:
+    jon = await user_models.User(email="jon@doe.com").save()
+    collection: t.Any = message_models.Channel.get_motor_collection()
+    result = await collection.insert_one({"members": [DBRef("users", jon.id)]})
+    await collection.insert_one({})
+
+    await migrations.backfill_channel_members()
+
+    channel = await message_models.Channel.get(result.inserted_id)
+    assert channel
+    assert channel.member_ids == [jon.id]
+    assert [member.email for member in channel.members] == [jon.email]
@@ -0,0 +1,184 @@
+from datetime import timedelta
+import pytest
+from pymongo import monitoring as pymongo_monitoring
+from src import config, tracing
+from src.db import monitoring, query_budgets, slow_queries
+
+ADDRESS = ("localhost", 27017)
+
+
+def test_command_listener() -> None:
+    listener = monitoring.CommandListener()
+    commands: list[str] = []
+    token = monitoring.operation_commands.set(commands)
+
+    try:
+        listener.started(
+            pymongo_monitoring.CommandStartedEvent(
+                {"find": "messages"}, "chatql", 1, ADDRESS, None
+            )
+        )
+    finally:
+        monitoring.operation_commands.reset(token)
+
+    # Outside of operations
+    listener.started(
+        pymongo_monitoring.CommandStartedEvent(
+            {"insert": "messages"}, "chatql", 2, ADDRESS, None
+        )
+    )
+    listener.succeeded(
+        pymongo_monitoring.CommandSucceededEvent(
+            timedelta(microseconds=1500), {"ok": 1}, "find", 1, ADDRESS, None
+        )
+    )
+    listener.failed(
+        pymongo_monitoring.CommandFailedEvent(
+            timedelta(microseconds=500), {"ok": 0}, "insert", 2, ADDRESS, None
+        )
+    )
+
+    assert commands == ["find"]
+    assert monitoring.mongo_commands.get("find") == 1
+    assert monitoring.mongo_commands.get("insert") == 1
+    assert monitoring.mongo_command_failures.get("insert") == 1
+    find_seconds = monitoring.mongo_command_seconds.get("find")
+    assert find_seconds
+    assert find_seconds.sum == 0.0015
+
+
+def test_command_spans(sampled_spans: list[tracing.Span]) -> None:
+    listener = monitoring.CommandListener()
+
+    with tracing.tracer.start_span("operation") as operation_span:
+        listener.started(
+            pymongo_monitoring.CommandStartedEvent(
+                {"find": "messages"}, "chatql", 1, ADDRESS, None
+            )
+        )
+        listener.started(
+            pymongo_monitoring.CommandStartedEvent(
+                {"insert": "messages"}, "chatql", 2, ADDRESS, None
+            )
+        )
+
+    listener.succeeded(
+        pymongo_monitoring.CommandSucceededEvent(
+            timedelta(microseconds=1500), {"ok": 1}, "find", 1, ADDRESS, None
+        )
+    )
+    listener.failed(
+        pymongo_monitoring.CommandFailedEvent(
+            timedelta(microseconds=500),
+            {"errmsg": "Failed"},
+            "insert",
+            2,
+            ADDRESS,
+            None,
+        )
+    )
+    # Started before tracing
+    listener.succeeded(
+        pymongo_monitoring.CommandSucceededEvent(
+            timedelta(microseconds=1500), {"ok": 1}, "find", 3, ADDRESS, None
+        )
+    )
+
+    find_span, insert_span = sampled_spans[1:]
+    assert find_span.name == "mongo.find"
+    assert find_span.parent_span_id == operation_span.span_id
+    assert find_span.attributes["db.name"] == "chatql"
+    assert find_span.error is None
+    assert insert_span.name == "mongo.insert"
+    assert insert_span.error
+    assert not listener.spans
+
+
+def test_query_shapes(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "SLOW_QUERY_THRESHOLD_MS", 1)
+    submitted: list[slow_queries.SlowQuery] = []
+    monkeypatch.setattr(slow_queries.slow_query_log, "submit", submitted.append)
+    listener = monitoring.CommandListener()
+
+    for request_id, sequence in enumerate([1, 2, 3]):
+        command = {"find": "messages", "filter": {"sequence": sequence}}
+        listener.started(
+            pymongo_monitoring.CommandStartedEvent(
+                command, "chatql", request_id, ADDRESS, None
+            )
+        )
+        listener.succeeded(
+            pymongo_monitoring.CommandSucceededEvent(
+                timedelta(milliseconds=request_id),
+                {"ok": 1},
+                "find",
+                request_id,
+                ADDRESS,
+                None,
+            )
+        )
+
+    listener.started(
+        pymongo_monitoring.CommandStartedEvent(
+            {"find": "messages"}, "chatql", 3, ADDRESS, None
+        )
+    )
+    listener.failed(
+        pymongo_monitoring.CommandFailedEvent(
+            timedelta(microseconds=500), {"errmsg": "Failed"}, "find", 3, ADDRESS, None
+        )
+    )
+
+    [shape] = slow_queries.query_shapes.top(10)
+    assert shape["count"] == 3
+    assert shape["totalMs"] == 3
+    # Over the threshold
+    assert [slow_query.seconds for slow_query in submitted] == [0.001, 0.002]
+    assert submitted[0].database_name == "chatql"
+    assert not listener.commands
+
+
+def test_query_budgets() -> None:
+    listener = monitoring.CommandListener()
+
+    with query_budgets.query_budget(max_commands=10, max_repeats=10) as budget:
+        listener.started(
+            pymongo_monitoring.CommandStartedEvent(
+                {"find": "messages", "filter": {"sequence": 1}},
+                "chatql",
+                1,
+                ADDRESS,
+                None,
+            )
+        )
+        listener.started(
+            pymongo_monitoring.CommandStartedEvent(
+                {"getMore": 1, "collection": "messages"}, "chatql", 2, ADDRESS, None
+            )
+        )
+
+    assert budget.commands == [
+        (
+            "find",
+            slow_queries.get_fingerprint(
+                "find", {"find": "messages", "filter": {"sequence": 1}}
+            ),
+        ),
+        ("getMore", None),
+    ]
+
+
+def test_capture_commands() -> None:
+    listener = monitoring.CommandListener()
+    command = {"find": "messages", "filter": {"sequence": 1}}
+    listener.started(
+        pymongo_monitoring.CommandStartedEvent(command, "chatql", 1, ADDRESS, None)
+    )
+
+    with monitoring.capture_commands() as commands:
+        listener.started(
+            pymongo_monitoring.CommandStartedEvent(command, "chatql", 2, ADDRESS, None)
+        )
+
+    assert commands == [monitoring.CapturedCommand("chatql", "find", command)]
+    assert monitoring.captured_commands.get() is None
@@ -0,0 +1,53 @@
+import logging
+import pytest
+from src.db import query_budgets
+
+
+def test_violations() -> None:
+    budget = query_budgets.QueryBudget(
+        max_commands=3, max_repeats=1, log_only=False, label="block"
+    )
+    budget.record("find", "a")
+    budget.record("getMore", None)
+    budget.record("getMore", None)
+    assert budget.get_violations() == []
+
+    budget.record("find", "a")
+    budget.record("find", "b")
+    assert budget.get_violations() == [
+        "5 commands issued, over the budget of 3",
+        "Same query issued 2 times, over the budget of 1: a",
+    ]
+
+
+def test_query_budget(caplog: pytest.LogCaptureFixture) -> None:
+    with query_budgets.query_budget(max_commands=1, max_repeats=1) as outer_budget:
+        with pytest.raises(query_budgets.QueryBudgetExceeded) as error:
+            with query_budgets.query_budget(
+                max_commands=0, max_repeats=1, label="inner"
+            ) as inner_budget:
+                assert query_budgets.active_budgets.get() == (
+                    outer_budget,
+                    inner_budget,
+                )
+
+                for budget in query_budgets.active_budgets.get():
+                    budget.record("find", "a")
+
+        assert str(error.value) == (
+            "Query budget exceeded by inner: 1 commands issued, over the budget of 0"
+        )
+
+    assert query_budgets.active_budgets.get() == ()
+
+    with caplog.at_level(logging.WARNING, logger=query_budgets.__name__):
+        with query_budgets.query_budget(max_commands=0, max_repeats=1, log_only=True):
+            query_budgets.active_budgets.get()[0].record("find", "a")
+
+    assert caplog.records[0].getMessage().startswith("Query budget exceeded by block")
+
+    # Failing blocks keep their own error
+    with pytest.raises(ValueError):
+        with query_budgets.query_budget(max_commands=0, max_repeats=1) as budget:
+            budget.record("find", "a")
+            raise ValueError()
@@ -0,0 +1,278 @@
+import itertools
+import json
+import os
+import typing as t
+from pathlib import Path
+import pytest
+from motor.core import AgnosticDatabase
+from pymongo.errors import OperationFailure
+from src.api.graphql.messages import caches, inboxes
+from src.api.graphql.messages import stores as message_stores
+from src.api.graphql.users import stores as user_stores
+from src.db import monitoring, slow_queries
+from src.db.models import base as base_models
+from src.db.models import message as message_models
+from src.db.models import user as user_models
+
+# Winning plans of every query shape. Run with UPDATE_QUERY_PLANS=1 to record new
+# or changed plans
+SNAPSHOTS_PATH = Path(__file__).parent / "snapshots" / "query_plans.json"
+MAX_KEYS_RATIO = 10  # Index keys examined per document returned
+MESSAGE_COUNT = 240
+EXTRA_USER_COUNT = 30
+SEARCH_TERM = "deploy"
+
+
+class Dataset(t.NamedTuple):
+    users: list[user_models.User]
+    channels: list[message_models.Channel]
+    messages: list[message_models.Message]
+
+
+class PlanCase(t.NamedTuple):
+    run: t.Callable[[Dataset], t.Awaitable[t.Any]]
+    sorted_stage: t.Optional[str] = None  # Whose output may be sorted in memory
+    max_keys_ratio: t.Optional[float] = MAX_KEYS_RATIO
+
+
+def get_messages_case(
+    channel: bool, sender: bool, content: bool, before: bool
+) -> PlanCase:
+    async def run(dataset: Dataset) -> t.Any:
+        store = message_stores.MessageStore()
+        return await store.get_messages(
+            user=dataset.users[0],
+            limit=20,
+            channel_id=str(dataset.channels[0].id) if channel else None,
+            sender_id=str(dataset.users[1].id) if sender else None,
+            content=SEARCH_TERM if content else None,
+            last_sequence=MESSAGE_COUNT // 2 if before else None,
+        )
+
+    if not content:
+        return PlanCase(run)
+
+    # Text searches read every document matching the terms, then filter and sort
+    # them, whatever the other filters. Text indexes can't return documents in any
+    # other order, so only the text matches are allowed to be sorted
+    return PlanCase(run, sorted_stage="TEXT_MATCH", max_keys_ratio=None)
+
+
+async def get_or_create_channel(dataset: Dataset) -> t.Any:
+    store = message_stores.MessageStore()
+    return await store.get_or_create_channel(dataset.users[:2])
+
+
+async def get_message(dataset: Dataset) -> t.Any:
+    store = message_stores.MessageStore()
+    return await store.get_message(
+        str(dataset.messages[0].id), str(dataset.users[0].id)
+    )
+
+
+async def get_or_create_user(dataset: Dataset) -> t.Any:
+    store = user_stores.UserStore()
+    return await store.get_or_create_user(dataset.users[3].email)
+
+
+async def get_users(dataset: Dataset) -> t.Any:
+    store = user_stores.UserStore()
+    return await store.get_users()
+
+
+def get_timeline_case(before: bool) -> PlanCase:
+    async def run(dataset: Dataset) -> t.Any:
+        store = message_stores.MessageStore()
+        return await store.get_timeline(
+            user=dataset.users[0],
+            limit=20,
+            last_sequence=MESSAGE_COUNT // 2 if before else None,
+        )
+
+    return PlanCase(run)
+
+
+def get_messages_case_name(filters: tuple[bool, ...]) -> str:
+    names = ("channel", "sender", "content", "before")
+    enabled_names = [name for name, enabled in zip(names, filters) if enabled]
+    return f"get_messages({', '.join(enabled_names)})"
+
+
+# Every combination of `get_messages` filters
+PLAN_CASES: dict[str, PlanCase] = {
+    get_messages_case_name(filters): get_messages_case(*filters)
+    for filters in itertools.product((False, True), repeat=4)
+}
+PLAN_CASES.update(
+    {
+        "get_or_create_channel": PlanCase(get_or_create_channel),
+        "get_message": PlanCase(get_message),
+        # Case insensitive regexes scan the whole email index
+        "get_or_create_user": PlanCase(get_or_create_user, max_keys_ratio=None),
+        "get_users": PlanCase(get_users),
+        "get_timeline": get_timeline_case(before=False),
+        "get_timeline(before)": get_timeline_case(before=True),
+    }
+)
+
+
+@pytest.fixture
+async def database() -> AgnosticDatabase:  # type: ignore[type-arg]
+    settings = user_models.User.get_settings()
+    database = t.cast(AgnosticDatabase, settings.motor_db)  # type: ignore[type-arg]
+
+    try:
+        await database.command(
+            {"explain": {"find": "users"}, "verbosity": "executionStats"}
+        )
+    except (NotImplementedError, OperationFailure) as error:
+        pytest.skip(f"Queries can't be explained by this database: {error}")
+
+    return database
+
+
+@pytest.fixture
+async def dataset() -> Dataset:
+    users = [user_models.User(email=f"user{i}@example.com") for i in range(6)]
+    users += [
+        user_models.User(email=f"extra{i}@example.com") for i in range(EXTRA_USER_COUNT)
+    ]
+
+    for user in users:
+        await user.insert()
+
+    channels: list[message_models.Channel] = []
+
+    for member_indexes in ((0, 1), (0, 2), (0, 3), (1, 2), (4, 5), (0, 1, 2, 3)):
+        channel = message_models.Channel.from_users(users[i] for i in member_indexes)
+        channels.append(await channel.insert())
+
+    messages: list[message_models.Message] = []
+
+    # Spread over channels, taking turns among their members to send them
+    for i in range(MESSAGE_COUNT):
+        channel = channels[i % len(channels)]
+        sender_id = channel.member_ids[(i // len(channels)) % len(channel.member_ids)]
+        sender = next(user for user in users if user.id == sender_id)
+        content = f"Message {i} {SEARCH_TERM}" if i % 10 == 0 else f"Message {i}"
+        messages.append(
+            message_models.Message(
+                sender=sender,
+                sender_snapshot=user_models.UserSummary.from_user(sender),
+                channel=channel,
+                content=content,
+                sequence=i + 1,
+            )
+        )
+
+    await message_models.Message.insert_many(messages)
+    messages = await message_models.Message.find().sort("sequence").to_list()
+    # Messages are in their members' inboxes, but for the newest ones the fan-out
+    # hasn't reached yet
+    channels_by_id = {channel.id: channel for channel in channels}
+    fanned_out_count = MESSAGE_COUNT - 5
+    entries = [
+        entry
+        for message in messages[:fanned_out_count]
+        for entry in inboxes.make_entries(
+            message,
+            caches.get_member_ids(
+                channels_by_id[message_models.get_link_id(message.channel)]
+            ),
+        )
+    ]
+    await message_models.InboxEntry.insert_many(entries)
+    await base_models.Counter(
+        type=base_models.CounterType.INBOX, next_value=fanned_out_count + 1
+    ).insert()
+    # Channel IDs were added to members by the channels' insertion
+    users = [
+        t.cast(user_models.User, await user_models.User.get(user.id)) for user in users
+    ]
+    return Dataset(users, channels, messages)
+
+
+def get_execution_stats(explain_result: t.Mapping[str, t.Any]) -> t.Any:
+    if "executionStats" in explain_result:
+        return explain_result["executionStats"]
+
+    # Aggregations report the stats of their first stage's cursor
+    return explain_result["stages"][0]["$cursor"]["executionStats"]
+
+
+def check_snapshot(name: str, plans: list[str]) -> None:
+    snapshots: dict[str, list[str]] = {}
+
+    if SNAPSHOTS_PATH.exists():
+        snapshots = json.loads(SNAPSHOTS_PATH.read_text())
+
+    if not os.getenv("UPDATE_QUERY_PLANS"):
+        assert name in snapshots, (
+            f"No recorded query plans for {name}. Run with UPDATE_QUERY_PLANS=1 "
+            "to record them"
+        )
+        assert plans == snapshots[name], (
+            f"Query plans of {name} changed. Run with UPDATE_QUERY_PLANS=1 "
+            "if it's expected"
+        )
+        return
+
+    snapshots[name] = plans
+    SNAPSHOTS_PATH.parent.mkdir(exist_ok=True)
+    SNAPSHOTS_PATH.write_text(json.dumps(snapshots, indent=2, sort_keys=True) + "\n")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name", PLAN_CASES)
+async def test_query_plans(
+    name: str,
+    database: AgnosticDatabase,  # type: ignore[type-arg]
+    dataset: Dataset,
+) -> None:
+    case = PLAN_CASES[name]
+
+    with monitoring.capture_commands() as commands:
+        await case.run(dataset)
+
+    plans: dict[str, str] = {}
+
+    for command in commands:
+        if command.command_name not in slow_queries.EXPLAINABLE_COMMANDS:
+            continue
+
+        fingerprint = slow_queries.get_fingerprint(
+            command.command_name, command.command
+        )
+
+        if fingerprint in plans:
+            continue
+
+        result = await database.command(
+            {
+                "explain": slow_queries.get_explain_command(command.command),
+                "verbosity": "executionStats",
+            }
+        )
+        plan = slow_queries.get_winning_plan(result)
+        stage_names = [stage["stage"] for stage in slow_queries.get_plan_stages(plan)]
+        plans[fingerprint] = slow_queries.get_plan_summary(plan)
+
+        assert "COLLSCAN" not in stage_names, f"Unindexed query: {fingerprint}"
+
+        for stage in slow_queries.get_plan_stages(plan):
+            if stage["stage"] == "SORT":
+                input_stage = stage.get("inputStage", {}).get("stage")
+                assert (
+                    input_stage == case.sorted_stage
+                ), f"Sorted in memory: {fingerprint}"
+
+        if case.max_keys_ratio is not None:
+            stats = get_execution_stats(result)
+            keys_ratio = stats["totalKeysExamined"] / max(stats["nReturned"], 1)
+            assert keys_ratio <= case.max_keys_ratio, (
+                f"{stats['totalKeysExamined']} keys examined for "
+                f"{stats['nReturned']} documents: {fingerprint}"
+            )
+
+    assert plans, f"No queries issued by {name}"
+    check_snapshot(name, [f"{key}: {value}" for key, value in plans.items()])
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import logging
+import typing as t
+import pytest
+from src.db import slow_queries
+
+SBE_EXPLAIN = {
+    "queryPlanner": {
+        "winningPlan": {
+            "queryPlan": {
+                "stage": "LIMIT",
+                "inputStage": {
+                    "stage": "FETCH",
+                    "inputStage": {"stage": "IXSCAN", "indexName": "sequence_-1"},
+                },
+            }
+        }
+    }
+}
+AGGREGATE_EXPLAIN = {
+    "stages": [
+        {"$cursor": {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}},
+        {"$lookup": {}},
+    ]
+}
+
+
+class MockDatabase:
+    def __init__(self, result: t.Optional[dict[str, t.Any]]) -> None:
+        self.result = result
+        self.commands: list[dict[str, t.Any]] = []
+
+    async def command(self, command: dict[str, t.Any]) -> dict[str, t.Any]:
+        self.commands.append(command)
+
+        if self.result is None:
+            raise ValueError("Unsupported")
+
+        return self.result
+
+
+class MockClient:
+    def __init__(self, database: MockDatabase) -> None:
+        self.database = database
+
+    def __getitem__(self, name: str) -> MockDatabase:
+        return self.database
+
+
+def make_slow_query(
+    command_name: str = "find", fingerprint: str = "a"
+) -> slow_queries.SlowQuery:
+    command = {
+        command_name: "messages",
+        "filter": {"sequence": {"$lt": 10}},
+        "lsid": {"id": "1"},
+        "$db": "chatql",
+    }
+    shape = slow_queries.QueryShape(fingerprint, sample_size=10)
+    return slow_queries.SlowQuery("chatql", command_name, command, shape, 0.25)
+
+
+def test_get_fingerprint() -> None:
+    def find(channel_ids: list[str], sequence: int) -> dict[str, t.Any]:
+        return {
+            "find": "messages",
+            "filter": {
+                "channel.$id": {"$in": channel_ids},
+                "sequence": {"$lt": sequence},
+            },
+            "sort": {"sequence": -1},
+            "limit": 100,
+        }
+
+    fingerprint = slow_queries.get_fingerprint("find", find(["a", "b"], 10))
+    assert fingerprint == slow_queries.get_fingerprint("find", find(["c"], 20))
+    assert json.loads(fingerprint) == {
+        "command": "find",
+        "collection": "messages",
+        "filter": {"channel.$id": {"$in": ["?"]}, "sequence": {"$lt": "?"}},
+        "sort": {"sequence": -1},
+    }
+
+    aggregate = {
+        "aggregate": "channels",
+        "pipeline": [
+            {"$match": {"member_ids": {"$all": ["a", "b"]}, "$where": "1"}},
+            {
+                "$lookup": {
+                    "from": "users",
+                    "localField": "member_ids",
+                    "foreignField": "_id",
+                    "as": "members",
+                }
+            },
+            {
+                "$lookup": {
+                    "from": "users",
+                    "let": {"id": "$_id"},
+                    "pipeline": [{"$match": {"_id": "a"}}],
+                    "as": "owner",
+                }
+            },
+            {"$sort": {"_id": 1}},
+            {"$limit": 1},
+        ],
+    }
+    assert json.loads(slow_queries.get_fingerprint("aggregate", aggregate)) == {
+        "command": "aggregate",
+        "collection": "channels",
+        "pipeline": [
+            {"$match": {"member_ids": {"$all": ["?"]}, "$where": "?"}},
+            {
+                "$lookup": {
+                    "from": "users",
+                    "localField": "member_ids",
+                    "foreignField": "_id",
+                    "as": "members",
+                }
+            },
+            {
+                "$lookup": {
+                    "from": "users",
+                    "pipeline": [{"$match": {"_id": "?"}}],
+                    "as": "owner",
+                }
+            },
+            {"$sort": {"_id": 1}},
+            {"$limit": "?"},
+        ],
+    }
+
+    update = {"update": "users", "updates": [{"q": {"_id": "a"}, "u": {"$set": {}}}]}
+    assert json.loads(slow_queries.get_fingerprint("update", update)) == {
+        "command": "update",
+        "collection": "users",
+        "filter": [{"_id": "?"}],
+    }
+    count = {"count": "messages", "query": {"sequence": 1}}
+    assert json.loads(slow_queries.get_fingerprint("count", count))["filter"] == {
+        "sequence": "?"
+    }
+
+
+def test_get_plan_summary() -> None:
+    plan = slow_queries.get_winning_plan(SBE_EXPLAIN)
+    assert slow_queries.get_plan_summary(plan) == ("LIMIT < FETCH < IXSCAN sequence_-1")
+
+    plan = slow_queries.get_winning_plan(AGGREGATE_EXPLAIN)
+    assert slow_queries.get_plan_summary(plan) == "COLLSCAN"
+
+    plan = {"stage": "OR", "inputStages": [{"stage": "IXSCAN", "indexName": "a"}]}
+    assert slow_queries.get_plan_summary(plan) == "OR < IXSCAN a"
+    plan = {
+        "stage": "SORT_MERGE",
+        "inputStages": [
+            {"stage": "IXSCAN", "indexName": "a"},
+            {"stage": "IXSCAN", "indexName": "b"},
+        ],
+    }
+    assert slow_queries.get_plan_summary(plan) == "SORT_MERGE < IXSCAN a < IXSCAN b"
+    assert slow_queries.get_winning_plan({}) == {}
+
+
+def test_get_plan_stages() -> None:
+    plan = {
+        "stage": "LIMIT",
+        "inputStage": {
+            "stage": "SORT_MERGE",
+            "inputStages": [
+                {"stage": "IXSCAN", "indexName": "a"},
+                {"stage": "IXSCAN", "indexName": "b"},
+            ],
+        },
+    }
+    stages = slow_queries.get_plan_stages(plan)
+    assert [stage["stage"] for stage in stages] == [
+        "LIMIT",
+        "SORT_MERGE",
+        "IXSCAN",
+        "IXSCAN",
+    ]
+
+    plan = {
+        "stage": "EQ_LOOKUP",
+        "outerStage": {"stage": "COLLSCAN"},
+        "innerStage": {"stage": "IXSCAN"},
+    }
+    stages = slow_queries.get_plan_stages(plan)
+    assert [stage["stage"] for stage in stages] == ["EQ_LOOKUP", "COLLSCAN", "IXSCAN"]
+    assert slow_queries.get_plan_stages({}) == []
+
+
+def test_query_shapes() -> None:
+    shapes = slow_queries.QueryShapes(max_size=2, sample_size=100)
+    assert slow_queries.QueryShape("a", sample_size=1).get_p99_seconds() == 0
+
+    for index in range(1, 101):
+        shapes.record("a", index / 1000)
+
+    shapes.record("b", 10)
+    shapes.record("a", 0.001)
+    shapes.record("c", 1)  # Evicts b, the least recently run
+
+    assert shapes.top(10) == [
+        {
+            "fingerprint": "a",
+            "count": 101,
+            "totalMs": pytest.approx(5051),
+            "p99Ms": pytest.approx(99),
+            "plan": None,
+        },
+        {"fingerprint": "c", "count": 1, "totalMs": 1000, "p99Ms": 1000, "plan": None},
+    ]
+    assert [shape["fingerprint"] for shape in shapes.top(1)] == ["a"]
+
+    shapes.clear()
+    assert shapes.top(10) == []
+
+
+@pytest.mark.asyncio
+async def test_slow_query_log(caplog: pytest.LogCaptureFixture) -> None:
+    slow_query_log = slow_queries.SlowQueryLog(max_queue_size=1)
+    database = MockDatabase(SBE_EXPLAIN)
+    slow_query = make_slow_query()
+
+    slow_query_log.submit(slow_query)  # Not running
+    assert slow_queries.dropped_slow_queries.get() == 1
+
+    task = asyncio.create_task(slow_query_log.run(MockClient(database)))  # type: ignore[arg-type]
+    await asyncio.sleep(0)
+    queue = slow_query_log.queue
+
+    with caplog.at_level(logging.WARNING, logger=slow_queries.__name__):
+        # From the driver's threads, the second one explained through the first
+        for _ in range(2):
+            await asyncio.to_thread(slow_query_log.submit, slow_query)
+            await t.cast(asyncio.Queue[slow_queries.SlowQuery], queue).join()
+
+    assert database.commands == [
+        {
+            "explain": {"find": "messages", "filter": {"sequence": {"$lt": 10}}},
+            "verbosity": "queryPlanner",
+        }
+    ]
+    assert slow_query.shape.plan == "LIMIT < FETCH < IXSCAN sequence_-1"
+    assert len(caplog.records) == 2
+    assert "Slow query took 250.0 ms" in caplog.records[0].getMessage()
+
+    slow_query_log.enqueue(slow_query)
+    slow_query_log.enqueue(slow_query)  # Past the queue size
+    assert slow_queries.logged_slow_queries.get() == 2
+    assert slow_queries.dropped_slow_queries.get() == 2
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert slow_query_log.queue is None
+
+
+@pytest.mark.asyncio
+async def test_collect_slow_query_log(monkeypatch: pytest.MonkeyPatch) -> None:
+    await slow_queries.collect_slow_query_log()
+    assert slow_queries.queued_slow_queries.get() == 0  # Not running
+
+    queue: asyncio.Queue[slow_queries.SlowQuery] = asyncio.Queue()
+    queue.put_nowait(make_slow_query())
+    monkeypatch.setattr(slow_queries.slow_query_log, "queue", queue)
+    await slow_queries.collect_slow_query_log()
+    assert slow_queries.queued_slow_queries.get() == 1
+
+
+@pytest.mark.asyncio
+async def test_explain() -> None:
+    slow_query_log = slow_queries.SlowQueryLog()
+    client = MockClient(MockDatabase(None))
+
+    assert await slow_query_log.explain(client, make_slow_query()) == (  # type: ignore[arg-type]
+        "explain failed: Unsupported"
+    )
+    assert await slow_query_log.explain(client, make_slow_query("update")) == (  # type: ignore[arg-type]
+        "not explained"
+    )
@@ -0,0 +1,28 @@
+import asyncio
+import pytest
+from src import app, config, tracing
+from src.api.graphql.messages import inboxes, summaries
+
+
+@pytest.mark.asyncio
+async def test_inbox_worker(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "INBOX_TIMELINE_ENABLED", True)
+    await app.start_app()
+    await asyncio.sleep(0)
+    assert len(app.background_tasks) == 5
+    assert summaries.user_summary_worker.queue
+
+    await app.stop_app()
+    assert not app.background_tasks
+    assert inboxes.inbox_worker.next_sequence is None
+    assert summaries.user_summary_worker.queue is None
+
+
+@pytest.mark.asyncio
+async def test_trace_exporter(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(tracing.tracer, "sample_rate", 0.1)
+    await app.start_app()
+    assert len(app.background_tasks) == 5
+
+    await app.stop_app()
+    assert not app.background_tasks
@@ -0,0 +1,92 @@
+import pytest
+from src import metrics
+
+
+def test_counter() -> None:
+    counter = metrics.Counter("requests_total", "Requests", ["path"], max_series=2)
+    counter.inc("/a")
+    counter.inc("/a", amount=2)
+    counter.inc('/"b"\n\\')
+    counter.inc("/c")  # Past the series limit
+
+    assert counter.get("/a") == 3
+    assert counter.get("/c") == 0
+    assert counter.get(metrics.OTHER_LABEL) == 1
+    assert counter.render() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{path="/a"} 3.0',
+        'requests_total{path="/\\"b\\"\\n\\\\"} 1.0',
+        'requests_total{path="other"} 1.0',
+    ]
+
+    counter.clear()
+    assert counter.get("/a") == 0
+
+
+def test_histogram() -> None:
+    histogram = metrics.Histogram("latency_seconds", "Latency", buckets=(1, 0.5))
+    histogram.observe(0.5)
+    histogram.observe(0.75)
+    histogram.observe(2)
+
+    series = histogram.get()
+    assert series
+    assert series.count == 3
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.5"} 1',
+        'latency_seconds_bucket{le="1.0"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3',
+        "latency_seconds_sum 3.25",
+        "latency_seconds_count 3",
+    ]
+
+    histogram.clear()
+    assert histogram.get() is None
+
+
+def test_gauge() -> None:
+    gauge = metrics.Gauge("queue_size", "Queue size", ["queue"], max_series=1)
+    gauge.set(3, "a")
+    gauge.set(2, "a")
+    gauge.set(1, "b")  # Past the series limit
+
+    assert gauge.get("a") == 2
+    assert gauge.get("b") is None
+    assert gauge.render() == [
+        "# HELP queue_size Queue size",
+        "# TYPE queue_size gauge",
+        'queue_size{queue="a"} 2.0',
+        'queue_size{queue="other"} 1.0',
+    ]
+
+    gauge.clear()
+    assert gauge.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_collect() -> None:
+    registry = metrics.Registry()
+    gauge = registry.register(metrics.Gauge("size", "Size"))
+
+    @registry.add_collector
+    async def collect_size() -> None:
+        gauge.set(5)
+
+    await registry.collect()
+    assert gauge.get() == 5
+
+
+def test_registry() -> None:
+    registry = metrics.Registry()
+    counter = registry.register(metrics.Counter("a_total", "A"))
+    counter.inc()
+
+    assert (
+        registry.render() == "# HELP a_total A\n# TYPE a_total counter\na_total 1.0\n"
+    )
+
+    registry.clear()
+    assert counter.get() == 0
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import random
+import typing as t
+from pathlib import Path
+import pytest
+from src import config, tracing
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+SPAN_ID = "00f067aa0ba902b7"
+
+
+@pytest.mark.parametrize(
+    ["value", "parsed"],
+    [
+        (f"00-{TRACE_ID}-{SPAN_ID}-01", (TRACE_ID, SPAN_ID, True)),
+        (f" 00-{TRACE_ID.upper()}-{SPAN_ID}-00 ", (TRACE_ID, SPAN_ID, False)),
+        (f"00-{tracing.INVALID_TRACE_ID}-{SPAN_ID}-01", None),
+        (f"00-{TRACE_ID}-{tracing.INVALID_SPAN_ID}-01", None),
+        (f"01-{TRACE_ID}-{SPAN_ID}-01", None),
+        ("", None),
+    ],
+)
+def test_parse_traceparent(
+    value: str, parsed: t.Optional[tuple[str, str, bool]]
+) -> None:
+    assert tracing.parse_traceparent(value) == parsed
+
+
+def test_encode_attribute_value() -> None:
+    assert tracing.encode_attribute_value(True) == {"boolValue": True}
+    assert tracing.encode_attribute_value(1) == {"intValue": "1"}
+    assert tracing.encode_attribute_value(0.5) == {"doubleValue": 0.5}
+    assert tracing.encode_attribute_value("a") == {"stringValue": "a"}
+
+
+def test_spans(tmp_path: Path) -> None:
+    exporter = tracing.FileExporter(str(tmp_path / "traces.jsonl"), max_queue_size=10)
+    tracer = tracing.Tracer(exporter, sample_rate=1)
+
+    with tracer.start_span("parent", {"a": 1}) as parent:
+        assert tracing.get_traceparent() == parent.traceparent
+
+        with pytest.raises(ValueError):
+            with tracer.start_span("child") as child:
+                child.set_attribute("b", "c")
+                raise ValueError("Failed")
+
+    assert tracing.get_traceparent() is None
+    assert exporter.spans == [child, parent]
+    assert child.trace_id == parent.trace_id
+    assert child.parent_span_id == parent.span_id
+    assert parent.parent_span_id is None
+    assert child.to_otlp()["status"] == {
+        "code": tracing.STATUS_ERROR,
+        "message": "ValueError: Failed",
+    }
+    assert child.to_otlp()["attributes"] == [
+        {"key": "b", "value": {"stringValue": "c"}}
+    ]
+    assert parent.to_otlp()["status"] == {"code": tracing.STATUS_UNSET}
+
+    tracer.end(parent)  # Already ended
+    exporter.flush()
+    exporter.flush()  # Nothing left to write
+    lines = (tmp_path / "traces.jsonl").read_text().splitlines()
+    assert len(lines) == 1
+    resource_spans = json.loads(lines[0])["resourceSpans"]
+    spans = resource_spans[0]["scopeSpans"][0]["spans"]
+    assert [span["name"] for span in spans] == ["child", "parent"]
+    assert spans[0]["parentSpanId"] == parent.span_id
+    assert "parentSpanId" not in spans[1]
+    assert tracing.exported_spans.get() == 2
+    assert not tracing.dropped_spans.get()
+
+
+def test_remote_parent(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    exporter = tracing.FileExporter(str(tmp_path / "traces.jsonl"), max_queue_size=1)
+    tracer = tracing.Tracer(exporter, sample_rate=0)
+    assert not tracer.is_recording()
+
+    # Not exported while tracing is off, so not recorded either
+    with tracer.start_span("remote", traceparent=f"00-{TRACE_ID}-{SPAN_ID}-01") as span:
+        assert span is tracing.NON_RECORDING_SPAN
+        assert not tracer.is_recording()
+
+    tracer.sample_rate = 0.1
+    monkeypatch.setattr(random, "random", lambda: 0.5)  # Roots unsampled
+
+    with tracer.start_span("remote", traceparent=f"00-{TRACE_ID}-{SPAN_ID}-01") as span:
+        assert tracer.is_recording()
+        assert span.trace_id == TRACE_ID
+        assert span.parent_span_id == SPAN_ID
+
+    # Unsampled by the publisher
+    with tracer.start_span("remote", traceparent=f"00-{TRACE_ID}-{SPAN_ID}-00") as span:
+        assert span is tracing.NON_RECORDING_SPAN
+        assert not tracer.is_recording()
+
+        with tracer.start_span("child") as child:
+            child.set_attribute("a", 1)
+            child.set_error("Failed")
+
+        assert child is tracing.NON_RECORDING_SPAN
+        assert span.traceparent is None
+        assert not span.attributes
+        assert span.error is None
+
+    with tracer.start_span("root"):
+        pass
+
+    with tracer.start_span("remote", traceparent=f"00-{TRACE_ID}-{SPAN_ID}-01"):
+        pass  # Past the queue size
+
+    assert not tracing.exported_spans.get()
+    assert tracing.dropped_spans.get() == 1
+    assert len(exporter.spans) == 1
+
+
+@pytest.mark.asyncio
+async def test_trace_methods(sampled_spans: list[tracing.Span]) -> None:
+    @tracing.trace_methods
+    class Store:
+        async def get(self) -> int:
+            return 1
+
+        async def _load(self) -> int:
+            return 2
+
+        def count(self) -> int:
+            return 3
+
+    store = Store()
+    assert await store.get() == 1
+    assert await store._load() == 2
+    assert store.count() == 3
+    assert [span.name for span in sampled_spans] == ["Store.get"]
+
+
+@pytest.mark.asyncio
+async def test_traced_unsampled() -> None:
+    calls = 0
+
+    @tracing.traced("call")
+    async def call() -> None:
+        nonlocal calls
+        calls += 1
+
+    await call()
+    assert calls == 1
+    assert not tracing.exporter.spans
+
+
+@pytest.mark.asyncio
+async def test_exporter_run(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "TRACING_FLUSH_SECONDS", 0)
+    exporter = tracing.FileExporter(str(tmp_path / "traces.jsonl"), max_queue_size=10)
+    tracer = tracing.Tracer(exporter, sample_rate=1)
+    task = asyncio.create_task(exporter.run())
+
+    with tracer.start_span("flushed"):
+        pass
+
+    while not tracing.exported_spans.get():
+        await asyncio.sleep(0)
+
+    with tracer.start_span("flushed on stop"):
+        pass
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert tracing.exported_spans.get() == 2
+
+
+@pytest.mark.asyncio
+async def test_collect_exporter(sampled_spans: list[tracing.Span]) -> None:
+    with tracing.tracer.start_span("queued"):
+        pass
+
+    await tracing.collect_exporter()
+    assert tracing.queued_spans.get() == 1